@@ -0,0 +1,82 @@
+'''
+Micro-benchmark of the JSON decoding backends on
+payloads shaped like the ENT responses.
+
+Usage: python benchmarks/json_decode.py [--rounds N] [--json]
+'''
+
+import sys
+import json
+import timeit
+import argparse
+
+import payloads as synthetic
+
+try:
+    import orjson
+
+except ImportError:
+    orjson = None
+
+
+payloads = {
+    'zimbra/list (10 mails)': synthetic.mails(10),
+    'zimbra/list (100 mails)': synthetic.mails(100),
+    'rack/list (500 files)': synthetic.racks(500),
+    'exercizer/subjects-copy (500)': synthetic.exercises(500),
+}
+
+backends = {
+    # What requests' Response.json() does: decode to str, then parse
+    'requests': lambda raw: json.loads(raw.decode('utf-8')),
+    'json': json.loads,
+}
+
+if orjson is not None:
+    backends['orjson'] = orjson.loads
+
+
+def run(rounds: int) -> list[dict]:
+    '''
+    Time every backend on every payload.
+    '''
+    
+    results = []
+    
+    for name, payload in payloads.items():
+        raw = json.dumps(payload, ensure_ascii = False).encode()
+        
+        for backend, loads in backends.items():
+            assert loads(raw) == payload
+            
+            best = min(timeit.repeat(lambda: loads(raw), number = rounds, repeat = 5))
+            
+            results.append(dict(payload = name, backend = backend, bytes = len(raw),
+                                usec = best / rounds * 1e6))
+    
+    return results
+
+def main() -> None:
+    
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[1])
+    parser.add_argument('--rounds', type = int, default = 200)
+    parser.add_argument('--json', action = 'store_true', help = 'Print results as JSON')
+    args = parser.parse_args()
+    
+    results = run(args.rounds)
+    
+    if args.json:
+        json.dump(results, sys.stdout, indent = 2)
+        return
+    
+    base = {r['payload']: r['usec'] for r in results if r['backend'] == 'requests'}
+    
+    print(f'{"payload":<32}{"backend":<10}{"bytes":>9}{"usec":>11}{"speedup":>9}')
+    for r in results:
+        print(f'{r["payload"]:<32}{r["backend"]:<10}{r["bytes"]:>9}'
+              f'{r["usec"]:>11.1f}{base[r["payload"]] / r["usec"]:>8.1f}x')
+
+if __name__ == '__main__':
+    main()
+
+# EOF
@@ -0,0 +1,130 @@
+'''
+Synthetic ENT payloads, shaped like the real responses.
+'''
+
+import json
+
+names = ['Élève Dupont', 'Mme Martin', 'M. Bernard', 'Léa Petit', 'Hugo Robert',
+         'Chloé Richard', 'Lucas Durand', 'Emma Moreau', 'Louis Laurent', 'Jade Simon']
+
+
+def uid(i: int) -> str:
+    return f'{i:08x}-4b1c-4e2a-9f3d-{i * 7919:012x}'
+
+def mail(i: int) -> dict:
+    return {
+        'id': str(i),
+        'date': 1700000000000 - i * 60000,
+        'subject': f'Re: Conseil de classe n°{i} - compte rendu',
+        'from': uid(i % 50),
+        'to': [uid(i % 7), uid(i % 11)],
+        'cc': [], 'bcc': [],
+        'displayNames': [[uid(i % 50), names[i % 10]],
+                         [uid(i % 7), names[(i + 1) % 10]],
+                         [uid(i % 11), names[(i + 2) % 10]]],
+        'unread': i % 3 == 0,
+        'hasAttachment': i % 5 == 0,
+        'systemFolder': 'INBOX',
+        'state': 'SENT'
+    }
+
+def mails(n: int) -> list[dict]:
+    return [mail(i) for i in range(n)]
+
+def message(id: str, size: int = 4096) -> dict:
+    paragraph = '<p>Bonjour, veuillez trouver ci-joint le <b>compte rendu</b> du conseil.</p>'
+    
+    return {
+        'id': id,
+        'subject': f'Message {id}',
+        'body': '<div>' + paragraph * (size // len(paragraph) + 1) + '</div>',
+        'attachments': [{'id': '2', 'filename': 'compte_rendu.pdf',
+                         'contentType': 'application/pdf', 'size': 250000}]
+    }
+
+def folders(n: int) -> list[dict]:
+    '''
+    A folder tree of n folders, 5 subfolders per folder.
+    '''
+    
+    def folder(i: int, path: str) -> dict:
+        children = [folder(j, f'{path}/Dossier {j}') for j in range(i * 5 + 1, min(n, i * 5 + 6))]
+        return {'folderName': path.rsplit('/', 1)[1], 'id': str(i + 10), 'path': path,
+                'unread': str(i % 4), 'folders': children}
+    
+    return [folder(0, '/Inbox')] if n else []
+
+def zimbra_page(n: int, padding: int = 150_000) -> bytes:
+    '''
+    The zimbra app page, with the folder tree inlined
+    in a script among a lot of markup.
+    '''
+    
+    markup = '<div class="row"><span>zimbra</span></div>\n' * (padding // 84)
+    script = f'<script>var model = {{"folders": \'{json.dumps(folders(n))}\'}};</script>'
+    
+    return f'<html><head>{markup}</head><body>{script}{markup}</body></html>'.encode()
+
+def rack(i: int) -> dict:
+    return {
+        '_id': f'{i:024x}',
+        'name': f'devoir_{i}.pdf',
+        'from': uid(i % 50), 'fromName': names[i % 10],
+        'to': uid(0), 'toName': names[0],
+        'sent': '2023-09-04T08:30+0200',
+        'file': f'{i:032x}',
+        'metadata': {'filename': f'devoir_{i}.pdf', 'content-type': 'application/pdf',
+                     'size': 120000 + i, 'charset': 'binary'}
+    }
+
+def racks(n: int) -> list[dict]:
+    return [rack(i) for i in range(n)]
+
+def exercise(i: int) -> dict:
+    return {
+        'id': i, 'owner': uid(i % 50),
+        'created': '2023-09-04T08:30:00.000', 'modified': '2023-09-05T10:00:00.000',
+        'submitted_date': None, 'final_score': 12.5, 'calculated_score': 11,
+        'comment': 'Bon travail, attention aux unités.',
+        'has_been_started': True, 'is_deleted': False, 'is_archived': False,
+        'is_corrected': i % 2 == 0, 'is_training_copy': False,
+        'is_correction_on_going': False
+    }
+
+def exercises(n: int) -> list[dict]:
+    return [exercise(i) for i in range(n)]
+
+def notification(i: int) -> dict:
+    return {
+        '_id': f'{i:024x}',
+        'type': 'WORKSPACE', 'event-type': 'SHARE',
+        'sender': uid(i % 50),
+        'params': {'username': names[i % 10], 'uri': f'/workspace/workspace#/shared/{i}'},
+        'message': f'{names[i % 10]} a partagé un document avec vous : devoir {i}.',
+        'date': {'$date': 1700000000000 - i * 60000}
+    }
+
+def notifications(n: int) -> dict:
+    return {'status': 'ok', 'number': n, 'results': [notification(i) for i in range(n)]}
+
+def visible(n: int) -> dict:
+    return {
+        'users': [{'id': uid(i), 'displayName': names[i % 10], 'profile': 'Student'}
+                  for i in range(n)],
+        'groups': [{'id': f'group-{i}', 'name': f'2nde {i}', 'groupDisplayName': f'Élèves 2nde {i}',
+                    'nbUsers': 35, 'profile': 'Student', 'sortName': f'2nde {i}'}
+                   for i in range(n // 10)]
+    }
+
+def person(id: str) -> dict:
+    return {'status': 'ok', 'result': [{
+        'id': id, 'mood': 'happy', 'health': '', 'motto': 'Carpe diem',
+        'address': '1 rue de la Paix', 'tel': None, 'email': f'{id[:8]}@example.org',
+        'mobile': None, 'hobbies': [{'visibility': 'PUBLIC', 'category': 'sport', 'values': 'tennis'}]
+    }]}
+
+def userinfo() -> dict:
+    return {'userId': uid(0), 'username': names[0], 'type': 'Student',
+            'groupsIds': [], 'classes': [], 'structures': []}
+
+# EOF
@@ -0,0 +1,292 @@
+'''
+Benchmark suite, run against an in-process stub of the ENT.
+
+Usage: python benchmarks/run.py [--filter TEXT] [--quick]
+                                [--output FILE] [--compare FILE]
+
+Times the parse-only code paths and end-to-end client calls
+at several data sizes, and writes the results as JSON so that
+runs can be compared.
+'''
+
+import os
+import sys
+import json
+import time
+import timeit
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from dataclasses import dataclass
+from typing import Callable
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import ent
+from ent import transfer
+from ent.cache import Cache
+from ent.apps import mails
+
+import payloads
+from server import StubENT
+
+
+@dataclass
+class Bench:
+    name: str
+    sizes: tuple[int]
+    setup: Callable[[StubENT, int], Callable[[], object]]
+
+suite: list[Bench] = []
+
+def bench(name: str, *sizes: int) -> Callable:
+    '''
+    Register a benchmark. The decorated function gets the
+    stub and a size, and returns the callable to time.
+    '''
+    
+    def wrap(setup: Callable) -> Callable:
+        suite.append(Bench(name, sizes, setup))
+        return setup
+    
+    return wrap
+
+def client(stub: StubENT, login: bool = True) -> ent.ENT:
+    '''
+    Build a client of the stub, without response cache.
+    '''
+    
+    return ent.ENT('bench', 'bench', login = login, root = stub.root,
+                   cache = Cache(policy = {}))
+
+def upload(size: int) -> str:
+    '''
+    Get a temporary file of size KiB.
+    '''
+    
+    path = os.path.join(tempfile.gettempdir(), f'ent-bench-{size}.bin')
+    
+    if not os.path.exists(path) or os.path.getsize(path) != size * 1024:
+        with open(path, 'wb') as file:
+            file.write(os.urandom(size * 1024))
+    
+    return path
+
+
+# Parse only
+
+@bench('parse/mails', 10, 100, 1000)
+def parse_mails(stub, size):
+    c, data = client(stub, False), payloads.mails(size)
+    
+    def run():
+        for raw in data:
+            mail = mails.Mail.parse(raw, c)
+            mail.id, mail.date, mail.subject, mail.user
+    
+    return run
+
+@bench('parse/folders', 10, 100, 1000)
+def parse_folders(stub, size):
+    c, page = client(stub, False), payloads.zimbra_page(size).decode()
+    return lambda: c.mail._parse_folders(page)
+
+@bench('parse/rack', 10, 100, 1000)
+def parse_rack(stub, size):
+    c, data = client(stub, False), payloads.racks(size)
+    
+    def run():
+        for item in c.rack._parse_rack(data):
+            item.date, item.sender, item.receiver, item.file
+    
+    return run
+
+@bench('parse/exercises', 10, 100, 1000)
+def parse_exercises(stub, size):
+    c, data = client(stub, False), payloads.exercises(size)
+    
+    def run():
+        for item in c.exercises._parse(data):
+            item.id, item.owner, item.date, item.result
+    
+    return run
+
+@bench('parse/feed', 10, 100, 1000)
+def parse_feed(stub, size):
+    c, data = client(stub, False), payloads.notifications(size)
+    
+    def run():
+        for item in c.feed._parse(data):
+            item.sender, item.date, item.url
+    
+    return run
+
+@bench('parse/users', 10, 100, 1000)
+def parse_users(stub, size):
+    c, data = client(stub, False), payloads.visible(size)
+    return lambda: (c.userbase._parse_users(data), c.userbase._parse_groups(data))
+
+@bench('frame/deposit', 64, 1024, 16384)
+def frame_deposit(stub, size):
+    path = upload(size)
+    return lambda: sum(map(len, transfer.Multipart(path, fields = {'users': 'a,b'})))
+
+
+# End to end
+
+@bench('e2e/login', 1)
+def e2e_login(stub, size):
+    return lambda: client(stub)
+
+@bench('e2e/get_mails', 10, 100, 500)
+def e2e_get_mails(stub, size):
+    c = client(stub)
+    return lambda: c.mail.get_mails(limit = size, workers = 8)
+
+@bench('e2e/get_folders', 10, 100, 1000)
+def e2e_get_folders(stub, size):
+    c = client(stub)
+    return c.mail.get_folders
+
+@bench('e2e/refresh_unread', 10, 100, 1000)
+def e2e_refresh_unread(stub, size):
+    index = client(stub).mail.get_folder_index()
+    return index.refresh_unread
+
+@bench('e2e/fetch_mail', 1024, 65536)
+def e2e_fetch_mail(stub, size):
+    c = client(stub)
+    mail = mails.Mail.parse(payloads.mail(1), c)
+    return mail.fetch
+
+@bench('e2e/get_rack', 10, 100, 1000)
+def e2e_get_rack(stub, size):
+    return client(stub).rack.get_rack
+
+@bench('e2e/deposit', 64, 1024, 16384)
+def e2e_deposit(stub, size):
+    c, path = client(stub), upload(size)
+    user = c.users.get(payloads.uid(1), payloads.names[1])
+    return lambda: c.rack.deposit(user, path, ftype = 'application/octet-stream')
+
+@bench('e2e/exercises', 10, 100, 1000)
+def e2e_exercises(stub, size):
+    return client(stub).exercises.get
+
+@bench('e2e/feed', 10, 100, 1000)
+def e2e_feed(stub, size):
+    return client(stub).feed.fetch
+
+@bench('e2e/search_users', 10, 100, 1000)
+def e2e_search_users(stub, size):
+    return client(stub).userbase.search_users
+
+
+def measure(func: Callable, repeat: int, budget: float) -> dict:
+    '''
+    Time a callable. Each sample runs it enough times to
+    last about budget / repeat seconds.
+    '''
+    
+    timer = timeit.Timer(func)
+    loops, elapsed = timer.autorange()
+    loops = max(1, int(loops * budget / repeat / max(elapsed, 1e-9)))
+    
+    samples = [t / loops for t in timer.repeat(repeat, loops)]
+    
+    return dict(loops = loops,
+                best = min(samples),
+                median = statistics.median(samples),
+                mean = statistics.fmean(samples),
+                stdev = statistics.stdev(samples) if len(samples) > 1 else 0)
+
+def metadata() -> dict:
+    
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                capture_output = True, text = True,
+                                cwd = os.path.dirname(__file__)).stdout.strip()
+    
+    except OSError:
+        commit = None
+    
+    return dict(commit = commit or None,
+                date = time.strftime('%Y-%m-%dT%H:%M:%S'),
+                python = platform.python_version(),
+                platform = platform.platform(),
+                decoder = 'orjson' if ent.utils.orjson else 'json')
+
+def compare(results: list[dict], path: str) -> None:
+    '''
+    Print the speed of results relative to a previous run.
+    '''
+    
+    with open(path) as file:
+        base = {(r['name'], r['size']): r for r in json.load(file)['results']}
+    
+    print(f'\n{"benchmark":<22}{"size":>7}{"before":>12}{"after":>12}{"change":>9}', file = sys.stderr)
+    
+    for r in results:
+        old = base.get((r['name'], r['size']))
+        if old is None: continue
+        
+        change = (r['best'] - old['best']) / old['best'] * 100
+        print(f'{r["name"]:<22}{r["size"]:>7}{fmt(old["best"]):>12}{fmt(r["best"]):>12}{change:>+8.1f}%',
+              file = sys.stderr)
+
+def fmt(seconds: float) -> str:
+    
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale: return f'{seconds / scale:.2f}{unit}'
+    
+    return f'{seconds / 1e-9:.0f}ns'
+
+def main() -> None:
+    
+    parser = argparse.ArgumentParser(description = 'ENT client benchmark suite.')
+    parser.add_argument('--filter', default = '', help = 'Only run benchmarks whose name contains this')
+    parser.add_argument('--quick', action = 'store_true', help = 'Only run the smallest size, briefly')
+    parser.add_argument('--repeat', type = int, default = 5, help = 'Samples per benchmark')
+    parser.add_argument('--budget', type = float, default = 1, help = 'Seconds per benchmark')
+    parser.add_argument('--output', help = 'Write results to this file (default: stdout)')
+    parser.add_argument('--compare', help = 'Previous results file to compare with')
+    args = parser.parse_args()
+    
+    if args.quick:
+        args.repeat, args.budget = 3, .2
+    
+    results = []
+    
+    with StubENT() as stub:
+        for bench in suite:
+            if args.filter not in bench.name: continue
+            
+            for size in bench.sizes[:1] if args.quick else bench.sizes:
+                stub.size = size
+                func = bench.setup(stub, size)
+                func() # Warm up (and check it works)
+                
+                result = dict(name = bench.name, size = size) | measure(func, args.repeat, args.budget)
+                results.append(result)
+                
+                print(f'{bench.name:<22}{size:>7}{fmt(result["best"]):>12} '
+                      f'(median {fmt(result["median"])}, {result["loops"]} loops)', file = sys.stderr)
+    
+    report = dict(meta = metadata(), results = results)
+    
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent = 2)
+    
+    else:
+        json.dump(report, sys.stdout, indent = 2)
+    
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
+
+# EOF
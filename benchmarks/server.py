@@ -0,0 +1,242 @@
+'''
+In-process stub of the ENT, serving synthetic payloads.
+'''
+
+import sys
+import json
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import payloads
+
+
+class Handler(BaseHTTPRequestHandler):
+    
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    
+    def log_message(self, *_) -> None:
+        pass
+    
+    @property
+    def stub(self) -> 'StubENT':
+        return self.server.stub
+    
+    def reply(self, body: object, status: int = 200, type: str = 'application/json',
+              headers: dict = None) -> None:
+        
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        
+        self.send_response(status)
+        self.send_header('Content-Type', type)
+        self.send_header('Content-Length', str(len(body)))
+        
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def ranged(self, body: bytes, etag: str) -> None:
+        '''
+        Reply with a body, or the requested range of it.
+        '''
+        
+        headers = {'ETag': etag, 'Accept-Ranges': 'bytes'}
+        requested = self.headers.get('Range')
+        
+        # A range of another version gets the whole body
+        if not requested or self.headers.get('If-Range') not in (None, etag):
+            return self.reply(body, type = 'application/octet-stream', headers = headers)
+        
+        start = int(requested.removeprefix('bytes=').split('-')[0])
+        
+        if start >= len(body):
+            return self.reply(b'', 416, headers = {'Content-Range': f'bytes */{len(body)}'})
+        
+        headers['Content-Range'] = f'bytes {start}-{len(body) - 1}/{len(body)}'
+        self.reply(body[start:], 206, 'application/octet-stream', headers)
+    
+    def body(self) -> bytes:
+        
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            data = b''
+            while size := int(self.rfile.readline().strip(), 16):
+                data += self.rfile.read(size)
+                self.rfile.readline()
+            
+            self.rfile.readline()
+            return data
+        
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+    
+    def do_POST(self) -> None:
+        
+        body = self.body()
+        path = urlsplit(self.path).path
+        
+        if path == '/auth/login':
+            return self.reply(b'', 302, 'text/html', {'Set-Cookie': 'XSRF-TOKEN=token; Path=/',
+                                                      'Location': '/timeline/timeline'})
+        
+        if path == '/rack':
+            return self.reply({'success': True, 'size': len(body)})
+        
+        if path == '/communication/visible':
+            return self.reply(self.stub.payload('visible'))
+        
+        self.reply({}, 404)
+    
+    def do_GET(self) -> None:
+        
+        url = urlsplit(self.path)
+        path = url.path.strip('/')
+        query = parse_qs(url.query)
+        
+        if path == 'timeline/timeline':
+            return self.reply(b'<html></html>', type = 'text/html')
+        
+        if path == 'auth/oauth2/userinfo':
+            return self.reply(payloads.userinfo())
+        
+        if path == 'zimbra/list':
+            page = int(query.get('page', ['0'])[0])
+            return self.reply(self.stub.payload('page', page))
+        
+        if path == 'zimbra/zimbra':
+            etag = f'"zimbra-{self.stub.size}"'
+            
+            if self.headers.get('If-None-Match') == etag:
+                return self.reply(b'', 304, 'text/html', {'ETag': etag})
+            
+            return self.reply(self.stub.payload('zimbra'), type = 'text/html', headers = {'ETag': etag})
+        
+        if path.startswith('zimbra/count/'):
+            return self.reply({'count': len(path) % 7})
+        
+        if path.startswith('zimbra/message/'):
+            return self.reply(self.stub.payload('message', path.split('/')[2]))
+        
+        if path.startswith('files/'):
+            return self.ranged(self.stub.payload('file', int(path.split('/')[1]), self.stub.version),
+                               f'"file-{path.split("/")[1]}-{self.stub.version}"')
+        
+        if path == 'userbook/api/person':
+            id = query.get('id', [''])[0]
+            
+            # Only ids starting with user have a userbook
+            if not id.startswith('user'): return self.reply({}, 404)
+            return self.reply(payloads.person(id))
+        
+        if path == 'flaky':
+            with self.stub.lock:
+                failing, self.stub.failures = self.stub.failures > 0, max(0, self.stub.failures - 1)
+            
+            return self.reply({}, 503) if failing else self.reply({'ok': True})
+        
+        if path == 'rack/list':
+            return self.reply(self.stub.payload('racks'))
+        
+        if path == 'exercizer/subjects-copy':
+            return self.reply(self.stub.payload('exercises'))
+        
+        if path == 'timeline/lastNotifications':
+            return self.reply(self.stub.payload('notifications'))
+        
+        self.reply({}, 404)
+
+
+class Server(ThreadingHTTPServer):
+    
+    daemon_threads = True
+    
+    def handle_error(self, request, address) -> None:
+        
+        # Clients may hang up early (e.g. when scanning the zimbra page)
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, address)
+
+
+class StubENT:
+    
+    def __init__(self, size: int = 100, mailbox: int = 1000) -> None:
+        '''
+        Represents a local ENT serving synthetic payloads.
+        Payloads are generated once per size and cached.
+        
+        Arguments
+            size: Amount of records (folders, rack files,
+                  exercises, notifications, users) per response,
+                  and approximate mail body size in bytes.
+            mailbox: Amount of mails listed in zimbra/list.
+        '''
+        
+        self.size = size
+        self.mailbox = mailbox
+        self.version = 1 # Of the files served under files/{size}
+        self.failures = 0 # Next requests to flaky answered with 503
+        self.lock = threading.Lock()
+        self.payloads: dict[tuple, bytes] = {}
+        
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.server.stub = self
+        self.thread: threading.Thread = None
+    
+    @property
+    def root(self) -> str:
+        return 'http://127.0.0.1:{}/'.format(self.server.server_address[1])
+    
+    def payload(self, name: str, *args) -> bytes:
+        '''
+        Get an encoded payload (see the payloads module) for
+        the current size, so that serving it is cheap.
+        '''
+        
+        key = (name, self.size, *args)
+        
+        if key not in self.payloads:
+            self.payloads[key] = self.make(name, *args)
+        
+        return self.payloads[key]
+    
+    def make(self, name: str, *args) -> bytes:
+        
+        if name == 'zimbra':
+            return payloads.zimbra_page(self.size)
+        
+        if name == 'file':
+            size, version = args
+            return bytes((i * 7 + version) % 251 for i in range(size))
+        
+        if name == 'page':
+            first = args[0] * 10
+            data = [payloads.mail(i) for i in range(first, min(first + 10, self.mailbox))]
+        
+        elif name == 'message':
+            data = payloads.message(args[0], self.size)
+        
+        else:
+            data = getattr(payloads, name)(self.size)
+        
+        return json.dumps(data).encode()
+    
+    def start(self) -> 'StubENT':
+        
+        self.thread = threading.Thread(target = self.server.serve_forever, args = (.05,), daemon = True)
+        self.thread.start()
+        return self
+    
+    def stop(self) -> None:
+        
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def __enter__(self) -> 'StubENT':
+        return self.start()
+    
+    def __exit__(self, *_) -> None:
+        self.stop()
+
+# EOF
@@ -0,0 +1,1016 @@
+'''
+Asyncio version of the ENT client.
+
+Requires aiohttp (pip install monlycee[async]).
+Apps share their parsing code with the sync client,
+only the network calls are awaited.
+'''
+
+from __future__ import annotations
+
+import json
+import time
+import hashlib
+import asyncio
+import inspect
+import itertools
+import contextlib
+from datetime import datetime
+from typing import Any, Self, Callable, Awaitable, AsyncIterator
+
+import requests
+
+try:
+    import aiohttp
+    from yarl import URL
+
+except ImportError:
+    aiohttp = None
+
+from ent import utils
+from ent import consts
+from ent import sessions
+from ent import transfer
+from ent.cache import Cache, Entry
+from ent.metrics import Metrics, size
+from ent.throttle import RetryPolicy, TokenBucket
+from ent.apps import (
+    base,
+    mails,
+    user,
+    userbase,
+    exercises,
+    rack,
+    userbook,
+    feed
+)
+
+
+class AsyncENT:
+    
+    def __init__(self,
+                 username: str,
+                 password: str,
+                 cache: Cache = None,
+                 store: sessions.SessionStore = None,
+                 root: str = consts.root,
+                 limit: int = 100,
+                 limit_per_host: int = 20,
+                 decoder: Callable[[bytes], Any] = utils.loads,
+                 retry: RetryPolicy = None,
+                 limiter: TokenBucket = None,
+                 metrics: Metrics = None) -> None:
+        '''
+        Represents an asynchronous ENT session.
+        Use as an async context manager, or call start()
+        and close() yourself.
+        
+        Arguments
+            username: ENT login.
+            password: ENT password.
+            cache: Response cache to use (a new one by default).
+            store: Where to save and restore the session cookies.
+            root: Base url of the ENT.
+            limit: Maximum amount of simultaneous connections.
+            limit_per_host: Maximum amount of simultaneous
+                            connections to a single host.
+            decoder: JSON decoder of response bodies.
+            retry: When to retry failed requests.
+            limiter: Rate limiter of the requests. Can be shared
+                     with other clients, sync or async.
+            metrics: Collector of request metrics (off if not set).
+        '''
+        
+        if aiohttp is None:
+            raise ImportError('AsyncENT requires aiohttp (pip install monlycee[async])')
+        
+        # Check credentials
+        assert len(username) and len(password), 'Empty credentials'
+        
+        self.root = root
+        self.username = username
+        self.payload = {'email': username, 'password': password}
+        
+        self.cache = Cache() if cache is None else cache
+        self.store = store
+        self.users = base.Users(self, User)
+        self.decoder = decoder
+        self.retry = RetryPolicy() if retry is None else retry
+        self.limiter = limiter
+        self.metrics = metrics
+        
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.session: aiohttp.ClientSession = None
+        
+        # Build apps
+        self.mail      = Mail_app(self)
+        self.account   = User_app(self)
+        self.userbase  = Userbase_App(self)
+        self.exercises = Exercises_App(self)
+        self.rack      = Rack_App(self)
+        self.userbook  = Userbook_App(self)
+        self.feed      = Feed_App(self)
+    
+    async def __aenter__(self) -> Self:
+        await self.start()
+        return self
+    
+    async def __aexit__(self, *_) -> None:
+        await self.close()
+    
+    async def start(self, login: bool = True) -> None:
+        '''
+        Open the connection pool and login (or restore
+        the stored session).
+        '''
+        
+        if self.session is None:
+            
+            # Unsafe jar to accept cookies from IP hosts (e.g. local test servers)
+            self.session = aiohttp.ClientSession(
+                connector = aiohttp.TCPConnector(limit = self.limit,
+                                                 limit_per_host = self.limit_per_host),
+                cookie_jar = aiohttp.CookieJar(unsafe = True)
+            )
+        
+        if login and not await self.restore():
+            await self.login()
+    
+    async def close(self) -> None:
+        '''
+        Close the connection pool.
+        '''
+        
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+    
+    async def get(self,
+                  path: str,
+                  method: str = 'GET',
+                  data: dict = None,
+                  headers: dict = None,
+                  cache: bool = True,
+                  complete_path = True,
+                  dump: bool = False,
+                  inject_token: bool = False,
+                  stream: bool = False
+                  ) -> requests.Response:
+        '''
+        Make a request to the target. The response is
+        fully read and returned as a requests.Response,
+        so that it can be parsed by the sync apps code.
+        
+        If stream is set, the body is not read (nor cached):
+        it is left in response.raw, an aiohttp response the
+        caller must release.
+        '''
+        
+        url = (self.root if complete_path else '') + path
+        
+        # Only GET requests are ever cached
+        ttl = self.cache.ttl(path) if cache and method == 'GET' and not stream else 0
+        
+        # Get from cache
+        entry = None
+        if ttl:
+            key = self.cache.key(self.username, method, url, data, headers)
+            entry = self.cache.get(key)
+            
+            if entry and not entry.expired:
+                if self.metrics is not None: self.metrics.cache(path, 'hit')
+                return entry.to_response()
+            
+            # Expired, ask the server if it changed
+            if entry:
+                headers = entry.validators | (headers or {})
+        
+        # Inject XRSF
+        if inject_token:
+            end = {'X-XSRF-TOKEN': self.xsrf}
+            headers = end if headers is None else headers | end
+        
+        # Send the request
+        if dump: data = json.dumps(data)
+        
+        response = await self._send(method, url, path, data, headers, stream)
+        
+        if ttl and self.metrics is not None:
+            self.metrics.cache(path, 'revalidated' if entry and response.status_code == 304 else 'miss')
+        
+        if not response.ok:
+            raise ConnectionError('Failed to send request', f'{method}:{path}', 'Got response:', response.content, 'with code', response)
+        
+        if entry and response.status_code == 304:
+            self.cache.refresh(key, entry, response, ttl)
+            return entry.to_response()
+        
+        if ttl:
+            self.cache.set(key, Entry.from_response(path, response, ttl, self.username))
+        
+        # Mutating calls make the cached data of their app stale
+        elif method != 'GET':
+            self.cache.invalidate(path.split('?')[0].strip('/').split('/')[0], self.username)
+        
+        return response
+    
+    async def _send(self,
+                    method: str,
+                    url: str,
+                    path: str,
+                    data: Any,
+                    headers: dict,
+                    stream: bool = False) -> requests.Response:
+        '''
+        Send a request, waiting for the rate limiter and
+        retrying transient failures.
+        '''
+        
+        for attempt in itertools.count():
+            
+            if self.limiter is not None:
+                await asyncio.sleep(self.limiter.reserve())
+            
+            start = time.perf_counter()
+            
+            try:
+                raw = await self.session.request(method, url, data = data, headers = headers)
+                
+                # Failed responses are always read, for their error message
+                streamed = stream and raw.ok
+                
+                try:
+                    response = Entry(path, str(raw.url), raw.status,
+                                     b'' if streamed else await raw.read(), 0,
+                                     dict(raw.headers)).to_response()
+                
+                finally:
+                    if not streamed: raw.release()
+                
+                if streamed: response.raw = raw
+                
+                if self.metrics is not None:
+                    self.metrics.response(method, path, response, time.perf_counter() - start,
+                                          size(data), streamed)
+                
+                if response.ok: return response
+                delay = self.retry.wait(method, attempt, response)
+                
+                if delay is None: return response
+            
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if self.metrics is not None:
+                    self.metrics.request(method, path, 0, time.perf_counter() - start)
+                
+                delay = self.retry.wait(method, attempt)
+                if delay is None: raise
+            
+            if self.metrics is not None: self.metrics.retry(method, path)
+            await asyncio.sleep(delay)
+    
+    def decode(self, response: requests.Response) -> Any:
+        '''
+        Decode a JSON response body with the client decoder.
+        '''
+        
+        return self.decoder(response.content)
+    
+    async def get_json(self, path: str, *args, **kwargs) -> Any:
+        '''
+        Make a request (see get) and decode its JSON response.
+        '''
+        
+        return self.decode(await self.get(path, *args, **kwargs))
+    
+    @property
+    def xsrf(self) -> str | None:
+        '''
+        The XSRF token of the session.
+        '''
+        
+        for cookie in self.session.cookie_jar:
+            if cookie.key == 'XSRF-TOKEN':
+                return cookie.value
+    
+    async def login(self) -> None:
+        '''
+        Attempts to login to the ENT.
+        '''
+        
+        # Send credentials
+        await self.get('auth/login', 'POST', self.payload)
+        
+        # Check if authentificated
+        if not self.xsrf:
+            raise ConnectionRefusedError('Invalid credentials.')
+        
+        self.save_session()
+    
+    def save_session(self) -> None:
+        '''
+        Save the session cookies to the store.
+        '''
+        
+        if self.store is None: return
+        
+        self.store.save(self.username, [
+            dict(name = cookie.key,
+                 value = cookie.value,
+                 domain = cookie['domain'],
+                 path = cookie['path'] or '/')
+            for cookie in self.session.cookie_jar
+        ])
+    
+    async def restore(self) -> bool:
+        '''
+        Attempts to reuse the session saved in the store.
+        Returns whether the session is still valid.
+        '''
+        
+        if self.store is None: return False
+        
+        cookies = self.store.load(self.username)
+        if not cookies: return False
+        
+        for cookie in cookies:
+            self.session.cookie_jar.update_cookies({cookie['name']: cookie['value']},
+                                                   URL(self.root))
+        
+        try:
+            if self.xsrf:
+                await self.account.refresh()
+                return True
+        
+        except (ConnectionError, ValueError):
+            pass
+        
+        # Session was rejected
+        self.session.cookie_jar.clear()
+        self.store.delete(self.username)
+        return False
+
+
+async def download(client: AsyncENT,
+                   url: str,
+                   path: str,
+                   complete_path: bool = True,
+                   resume: bool = True,
+                   progress: transfer.Progress = None,
+                   algorithm: str = 'sha256') -> str:
+    '''
+    Download a remote file chunk by chunk, resuming an
+    interrupted download if it did not change since (see
+    transfer.download). Returns the hex digest of the file.
+    '''
+    
+    digest = hashlib.new(algorithm)
+    offset, headers = transfer.resume_request(path, resume)
+    
+    try:
+        response = await client.get(url, headers = headers, cache = False,
+                                    complete_path = complete_path, stream = True)
+    
+    except ConnectionError as err:
+        
+        # Range not satisfiable, the partial file is stale or complete
+        if offset and getattr(err.args[-1], 'status_code', None) == 416:
+            return await download(client, url, path, complete_path, False, progress, algorithm)
+        
+        raise
+    
+    try:
+        offset = transfer.resume_response(path, offset, response, digest)
+        
+        if offset is None:
+            return await download(client, url, path, complete_path, False, progress, algorithm)
+        
+        length = response.headers.get('Content-Length')
+        total = offset + int(length) if length else None
+        done = offset
+        
+        with open(path + '.part', 'ab' if offset else 'wb') as file:
+            async for chunk in response.raw.content.iter_chunked(transfer.chunk_size):
+                file.write(chunk)
+                digest.update(chunk)
+                
+                done += len(chunk)
+                if progress: progress(done, total)
+    
+    finally:
+        response.raw.release()
+    
+    return transfer.complete(path, digest)
+
+@contextlib.asynccontextmanager
+async def open_stream(client: AsyncENT, url: str, complete_path: bool = True) -> AsyncIterator[aiohttp.StreamReader]:
+    '''
+    Open a remote file as a readable binary stream (async with).
+    '''
+    
+    response = await client.get(url, cache = False, complete_path = complete_path, stream = True)
+    
+    try:
+        yield response.raw.content
+    
+    finally:
+        response.raw.release()
+
+
+class User(base.User):
+    
+    @property
+    def book(self) -> Awaitable[userbook.UserbookData]:
+        '''
+        The userbook content of the user (awaitable).
+        '''
+        
+        async def fetch():
+            if self.userbook is None: await self.client.userbook.fetch(self)
+            return self.userbook
+        
+        return fetch()
+
+class Attachment(mails.Attachment):
+    
+    async def download(self,
+                       path: str,
+                       resume: bool = True,
+                       progress: transfer.Progress = None) -> str:
+        '''
+        Download the ressource to a file, or to a directory
+        under its own name. Returns the file sha256.
+        '''
+        
+        return await download(self.client, self.url, transfer.target(path, self.name),
+                              resume = resume, progress = progress)
+    
+    def open(self) -> contextlib.AbstractAsyncContextManager[aiohttp.StreamReader]:
+        '''
+        Open the ressource as a readable stream (async with).
+        '''
+        
+        return open_stream(self.client, self.url)
+
+class Mail(mails.Mail):
+    
+    __slots__ = ()
+    
+    async def fetch(self) -> None:
+        '''
+        Fetch the content of the mail.
+        '''
+        
+        await self.client.mail.fetch(self)
+    
+    @property
+    def attachments(self) -> Awaitable[list[Attachment]]:
+        '''
+        Get the mail attachments (awaitable).
+        '''
+        
+        async def fetch():
+            if not self.content_data: await self.fetch()
+            return [Attachment.parse(data, self)
+                    for data in self.content_data.get('attachments')]
+        
+        return fetch()
+    
+    @property
+    def content(self) -> Awaitable[str]:
+        '''
+        Get raw content of the mail (awaitable).
+        '''
+        
+        async def fetch():
+            if not self.content_data: await self.fetch()
+            return self.content_data.get('body')
+        
+        return fetch()
+    
+    async def reply(self, mail: mails.PreparedMail, force_redirect = False) -> requests.Response:
+        '''
+        Reply to this message with a prepared mail.
+        '''
+        
+        return await self.client.mail.reply(self, mail, force_redirect)
+    
+    async def transfer(self, to: list[User] | User) -> None:
+        '''
+        Transfer a mail to another user.
+        '''
+        
+        new = mails.PreparedMail.new(subject = self.subject,
+                                     content = await self.content,
+                                     to = to)
+        
+        await self.client.mail.send(new) # TODO attachments
+
+class RacKFile(rack.RacKFile):
+    
+    async def download(self,
+                       path: str = '.',
+                       resume: bool = True,
+                       progress: transfer.Progress = None) -> str:
+        '''
+        Download the file to a location, or to a directory
+        under its own name. Returns the file sha256.
+        '''
+        
+        return await download(self.client, self.url, transfer.target(path, self.name),
+                              complete_path = False, resume = resume, progress = progress)
+    
+    def open(self) -> contextlib.AbstractAsyncContextManager[aiohttp.StreamReader]:
+        '''
+        Open the file as a readable stream (async with).
+        '''
+        
+        return open_stream(self.client, self.url, complete_path = False)
+
+class Rack(rack.Rack):
+    
+    __slots__ = ()
+    
+    @base.lazy
+    def file(self) -> RacKFile:
+        '''
+        The deposited file.
+        '''
+        
+        return RacKFile(**vars(rack.Rack.file.decode(self)))
+
+
+class Mail_app(mails.Mail_app):
+    
+    @property
+    def unread_amount(self) -> int:
+        '''
+        Fetch the amount of unread messages (awaitable).
+        '''
+        
+        async def fetch():
+            url = 'zimbra/count/INBOX?unread=true'
+            return (await self.client.get_json(url))['count']
+        
+        return fetch()
+    
+    async def get_folders(self) -> list[mails.Folder]:
+        '''
+        Get all folders from the ENT account.
+        '''
+        
+        raw = await self.client.get('zimbra/zimbra')
+        return self._parse_folders(raw.text)
+    
+    async def get_folder_index(self) -> mails.FolderIndex:
+        '''
+        Get all folders from the ENT account, indexed by
+        id and path.
+        '''
+        
+        return mails.FolderIndex(self, await self.get_folders())
+    
+    async def refresh_unread(self, folders: list[mails.Folder], workers: int = None) -> dict[str, Exception]:
+        '''
+        Fetch the unread amount of many folders concurrently,
+        and only update their unread field. workers is ignored:
+        concurrency is bounded by the connection pool.
+        '''
+        
+        async def count(folder):
+            return (await self.client.get_json(self._count_url(folder), cache = False))['count']
+        
+        results = await asyncio.gather(*map(count, folders), return_exceptions = True)
+        return self._set_unread(folders, results)
+    
+    async def get_mails(self,
+                        unread: bool = False,
+                        folder: mails.Folder = None,
+                        limit: int = 10,
+                        workers: int = 8,
+                        with_content: bool = False) -> list[mails.Mail]:
+        '''
+        Get a list of mails. Pages are fetched concurrently,
+        by waves of `workers` pages, until a page is short.
+        Contents (if with_content is set) are fetched
+        concurrently, bounded by the connection pool.
+        '''
+        
+        u = self._list_url(unread, folder)
+        pages = -(-limit // consts.mail_page_size)
+        
+        result = []
+        full = True
+        
+        for start in range(0, pages, workers):
+            if not full: break
+            
+            wave = await asyncio.gather(*[self.client.get_json(u.format(page))
+                                          for page in range(start, min(start + workers, pages))])
+            
+            for page in wave:
+                if not full: break
+                
+                result += page
+                full = len(page) == consts.mail_page_size
+        
+        result = [Mail.parse(mail, self.client) for mail in result]
+        
+        if with_content:
+            await self.fetch_contents(result)
+        
+        return result
+    
+    async def iter_mails(self,
+                         unread: bool = False,
+                         folder: mails.Folder = None,
+                         limit: int = None,
+                         since: datetime = None,
+                         until: Callable[[mails.Mail], bool] = None) -> AsyncIterator[mails.Mail]:
+        '''
+        Lazily iterate over mails, newest first (async for).
+        Pages are only requested when the previous one has
+        been consumed.
+        '''
+        
+        u = self._list_url(unread, folder)
+        left = limit
+        
+        for page in itertools.count():
+            if left == 0: return
+            data = await self.client.get_json(u.format(page))
+            
+            for raw in data:
+                mail = Mail.parse(raw, self.client)
+                
+                if since and mail.date < since: return
+                if until and until(mail): return
+                
+                yield mail
+                
+                if left is not None:
+                    left -= 1
+                    if left == 0: return
+            
+            if len(data) < consts.mail_page_size: return
+    
+    async def fetch(self, mail: mails.Mail) -> mails.Mail:
+        '''
+        Fetch the content of a mail, after which its content
+        and attachments properties can be used.
+        '''
+        
+        mail.content_data = await self.client.get_json(f'zimbra/message/{mail.id}')
+        return mail
+    
+    async def fetch_contents(self, mails: list[mails.Mail], workers: int = None) -> dict[int, Exception]:
+        '''
+        Fetch the content of many mails concurrently. Mails
+        that are already fetched are skipped, workers is ignored.
+        
+        Returns the errors of the mails that failed, by mail id.
+        '''
+        
+        todo = [mail for mail in mails if not mail.content_data]
+        results = await asyncio.gather(*map(self.fetch, todo), return_exceptions = True)
+        
+        return {mail.id: result for mail, result in zip(todo, results)
+                if isinstance(result, Exception)}
+    
+    async def reply(self,
+                    mail: mails.Mail,
+                    prepared: mails.PreparedMail,
+                    force_redirect = False) -> requests.Response:
+        '''
+        Reply to a message with a prepared mail.
+        '''
+        
+        users = prepared.user if force_redirect else mail.user
+        
+        return await self.client.get(f'zimbra/send?In-Reply-To={mail.id}', 'POST',
+                                     data = prepared.payload(users), dump = True)
+    
+    async def send(self, mail: mails.PreparedMail) -> None:
+        '''
+        Send a mail object to the ENT.
+        '''
+        
+        # Attribute an id for the mail by sending empty draft
+        draft = await self.client.get_json('zimbra/draft', 'POST', data = consts.mail_draft, dump = True)
+        mail.id = draft.get('id')
+        
+        url = f'zimbra/send?id={mail.id}'
+        
+        response = await self.client.get_json(url, 'POST', data = mail.payload(), dump = True)
+        
+        if not response.get('sent'):
+            raise ConnectionError('Failed to send email:', response)
+
+
+class User_app(user.User_app):
+    
+    async def refresh(self) -> None:
+        '''
+        Update the account data.
+        '''
+        
+        self.data = await self.client.get_json('auth/oauth2/userinfo', cache = False)
+    
+    @property
+    def user(self) -> User:
+        '''
+        The user account representation (awaitable).
+        '''
+        
+        async def fetch():
+            if not self.data: await self.refresh()
+            return self._parse(self.data)
+        
+        return fetch()
+
+
+class Userbase_App(userbase.Userbase_App):
+    
+    async def _base_search(self, **kwargs) -> dict:
+        
+        response = await self.client.get_json(
+            'communication/visible', 'POST',
+            data = kwargs,
+            headers = {'X-XSRF-TOKEN': self.client.xsrf},
+            dump = True
+        )
+        
+        return response
+    
+    async def search_users(self,
+                           query: str = '',
+                           classes: list[str] = None,
+                           schools: list[str] = None,
+                           functions: list[str] = None) -> list[User]:
+        '''
+        Search for users among the list the user has access to.
+        '''
+        
+        users = await self._base_search(**self._users_query(query, classes, schools, functions))
+        return self._parse_users(users)
+    
+    async def search_groups(self,
+                            query: str = '',
+                            classes: list[str] = None,
+                            schools: list[str] = None,
+                            functions: list[str] = None,
+                            group_type: str = 'Group') -> list[base.Group]:
+        '''
+        Search for groups among the list the groups has access to.
+        '''
+        
+        groups = await self._base_search(**self._groups_query(query, classes, schools,
+                                                              functions, group_type))
+        return self._parse_groups(groups)
+
+
+class Exercises_App(exercises.Exercises_App):
+    
+    async def get(self) -> list[exercises.Exercise]:
+        '''
+        Get all visible exercises.
+        '''
+        
+        response = await self.client.get_json('exercizer/subjects-copy')
+        return self._parse(response)
+
+
+class Rack_App(rack.Rack_App):
+    
+    async def get_rack(self) -> list[rack.Rack]:
+        '''
+        Get the content of the user rack.
+        '''
+        
+        response = await self.client.get_json('rack/list')
+        return self._parse_rack(response)
+    
+    def _parse_rack(self, data: list[dict]) -> list[Rack]:
+        '''
+        Parse the rack list.
+        '''
+        
+        return [Rack(obj, self.client) for obj in data]
+    
+    async def deposit(self,
+                      users: User | list[User],
+                      path: str,
+                      progress: transfer.Progress = None,
+                      ftype: str = None) -> None:
+        '''
+        Deposit a file to somebody's rack.
+        '''
+        
+        raw, headers = self._deposit_request(users, path, progress, ftype)
+        
+        async def chunks():
+            for chunk in raw: yield chunk
+        
+        response = await self.client.get_json('rack?thumbnail=120x120', 'POST', data = chunks(),
+                                              headers = headers | {'Content-Length': str(len(raw))})
+        
+        if not response.get('success'):
+            raise Exception(f'Failed to transmit {path}:', response)
+    
+    async def deposit_many(self,
+                           paths: list[str],
+                           users: User | list[User],
+                           workers: int = 4,
+                           skip_existing: bool = False,
+                           verify_hash: bool = True) -> list[rack.DepositResult]:
+        '''
+        Deposit many files to many users' racks (see the sync
+        deposit_many). At most `workers` files are read, hashed
+        or uploaded at once.
+        '''
+        
+        if not isinstance(users, list): users = [users]
+        
+        semaphore = asyncio.Semaphore(workers)
+        
+        async def bounded(func: Callable, items: list) -> list:
+            async def call(item):
+                async with semaphore: return await func(item)
+            
+            return await asyncio.gather(*map(call, items), return_exceptions = True)
+        
+        # Files are read in threads, not to block the loop
+        read = await asyncio.to_thread(utils.bounded_map, rack.RackUpload.from_path, paths, workers)
+        results, uploads = self._uploads(paths, users, read)
+        existing = self._existing(await self.get_rack()) if skip_existing else {}
+        
+        async def remote_hash(record: rack.Rack) -> str:
+            response = await self.client.get(record.file.url, cache = False, complete_path = False)
+            return hashlib.sha256(response.content).hexdigest()
+        
+        # Hash each candidate rack file once, before fanning out
+        hashes: dict[str, str | Exception] = {}
+        
+        if skip_existing and verify_hash:
+            candidates = self._candidates(uploads, users, existing)
+            hashes = dict(zip(candidates, await bounded(remote_hash, list(candidates.values()))))
+        
+        async def send(upload: rack.RackUpload) -> list[rack.DepositResult]:
+            done, todo = self._recipients(upload, users, existing, hashes, verify_hash)
+            report = [rack.DepositResult(upload.path, user, 'skipped') for user in done]
+            
+            if todo:
+                try:
+                    await self.deposit(todo, upload.path, ftype = upload.type)
+                    report += [rack.DepositResult(upload.path, user, 'sent') for user in todo]
+                
+                except Exception as err:
+                    report += [rack.DepositResult(upload.path, user, 'failed', err) for user in todo]
+            
+            return report
+        
+        reports = await bounded(send, list(uploads.values()))
+        return results + self._reports(uploads, users, reports)
+    
+    async def refresh_storage_usage(self) -> None:
+        '''
+        Refresh the allocated storage data.
+        '''
+        
+        uid = (await self.client.account.user).id
+        response = await self.client.get_json('workspace/quota/user/' + uid)
+        self._parse_storage(response)
+    
+    @property
+    def storage(self) -> rack.RackStorage:
+        '''
+        User' storage data (awaitable).
+        '''
+        
+        async def fetch():
+            if not self.rack_storage: await self.refresh_storage_usage()
+            return self.rack_storage
+        
+        return fetch()
+
+
+class Userbook_App(userbook.Userbook_App):
+    
+    async def fetch(self, user: User) -> User:
+        '''
+        Fetch the userbook data for a user.
+        '''
+        
+        user.userbook = self.cached(user.id) or await self._fetch_book(user)
+        return user
+    
+    async def fetch_many(self, users: list[User], workers: int = None) -> dict[str, Exception]:
+        '''
+        Fetch the userbook data of many users concurrently.
+        Each id is fetched at most once, workers is ignored.
+        
+        Returns the errors of the ids that failed.
+        '''
+        
+        by_id, missing = self._missing(users)
+        results = dict(zip([user.id for user in missing],
+                           await asyncio.gather(*map(self._fetch_book, missing),
+                                                return_exceptions = True)))
+        
+        return self._assign(by_id, results)
+    
+    async def _fetch_book(self, user: User) -> userbook.UserbookData:
+        '''
+        Fetch and cache the userbook of a user.
+        '''
+        
+        response = await self.client.get_json('userbook/api/person?id=' + user.id)
+        return self._store(user.id, self._parse(response))
+
+
+class Feed_App(feed.Feed_App):
+    
+    async def fetch(self, cache: bool = True, **filters) -> list[feed.Feed]:
+        '''
+        Fetch the last feed.
+        '''
+        
+        url = 'timeline/lastNotifications'
+        url += utils.build_feed_filters(filters)
+        
+        response = await self.client.get_json(url, cache = cache)
+        return self._parse(response)
+    
+    async def watch(self, **kwargs) -> AsyncIterator[feed.Feed]:
+        '''
+        Endlessly yield new feed items as they appear (async for).
+        See FeedWatcher for arguments.
+        '''
+        
+        async for _, item in FeedWatcher(self.client, **kwargs):
+            yield item
+
+
+class FeedWatcher(feed.FeedWatcher):
+    '''
+    Poller of new feed items for one or many AsyncENT
+    accounts (see the sync FeedWatcher). Iterate with
+    async for, at most `workers` accounts are polled at once.
+    '''
+    
+    asynchronous = True
+    
+    # Not iterable with a plain for
+    __iter__ = None
+    
+    async def __aiter__(self) -> AsyncIterator[tuple[AsyncENT, feed.Feed]]:
+        '''
+        Endlessly yield (client, feed) pairs for new items.
+        '''
+        
+        while True:
+            for news in await self.poll():
+                yield news
+            
+            wait = min(cursor.due for cursor in self.cursors) - time.time()
+            if wait > 0: await asyncio.sleep(wait)
+    
+    async def subscribe(self, callback: Callable[[AsyncENT, feed.Feed], Any]) -> None:
+        '''
+        Endlessly call a function (or coroutine function)
+        for each new item.
+        '''
+        
+        async for client, item in self:
+            result = callback(client, item)
+            if inspect.isawaitable(result): await result
+    
+    async def poll(self) -> list[tuple[AsyncENT, feed.Feed]]:
+        '''
+        Poll the accounts that are due once, and get their
+        new items (newest first, per account).
+        '''
+        
+        due = self._due()
+        semaphore = asyncio.Semaphore(self.workers)
+        
+        async def bounded(cursor: feed.Cursor) -> list[feed.Feed]:
+            async with semaphore: return await self._poll(cursor)
+        
+        return self._news(due, await asyncio.gather(*map(bounded, due), return_exceptions = True))
+    
+    async def _poll(self, cursor: feed.Cursor) -> list[feed.Feed]:
+        '''
+        Poll an account and update its cursor.
+        '''
+        
+        try:
+            feeds = await cursor.client.feed.fetch(cache = False, **self.filters)
+        
+        except Exception:
+            self._schedule(cursor, False)
+            raise
+        
+        return self._update(cursor, feeds)
+
+# EOF
\ No newline at end of file
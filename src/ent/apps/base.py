@@ -3,8 +3,12 @@ Basic structures shared between apps.
 '''
 
 from __future__ import annotations
+
+import sys
+import weakref
+import threading
 from dataclasses import dataclass
-from typing import Self, TYPE_CHECKING
+from typing import Any, Self, Callable, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from ent.apps.userbook import UserbookData
@@ -19,6 +23,72 @@ class App:
         self.client = client
 
 
+class lazy:
+    
+    def __init__(self, decode: Callable[[Record], Any]) -> None:
+        '''
+        Represents a Record field, decoded from the raw record
+        on first access then kept in the '_<name>' slot.
+        It can be assigned like a regular attribute.
+        '''
+        
+        self.decode = decode
+    
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = name
+        self.slot = '_' + name
+    
+    def __get__(self, record: Record, owner: type = None) -> Any:
+        
+        if record is None: return self
+        
+        try:
+            return getattr(record, self.slot)
+        
+        except AttributeError:
+            value = self.decode(record)
+            setattr(record, self.slot, value)
+            return value
+    
+    def __set__(self, record: Record, value: Any) -> None:
+        setattr(record, self.slot, value)
+
+class Record:
+    '''
+    Compact model over a raw ENT record. Subclasses declare
+    their fields with lazy() and a matching '_<name>' slot,
+    so only the fields that are actually read get decoded.
+    '''
+    
+    __slots__ = ('client', 'data')
+    fields: tuple[str] = ()
+    
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        
+        # Fields overridden by subclasses keep their place
+        cls.fields = tuple(dict.fromkeys(name for klass in reversed(cls.__mro__)
+                                         for name, value in vars(klass).items()
+                                         if isinstance(value, lazy)))
+    
+    def __init__(self, data: dict, client: Core = None) -> None:
+        
+        self.data = data
+        self.client = client
+    
+    def __eq__(self, other: object) -> bool:
+        
+        if type(other) is not type(self): return NotImplemented
+        return self.data == other.data
+    
+    __hash__ = None
+    
+    def __repr__(self) -> str:
+        
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.fields)
+        return f'{type(self).__name__}({fields})'
+
+
 @dataclass
 class User:
     id: int = None
@@ -51,6 +121,51 @@ class User:
         
         return self.userbook
 
+class Users:
+    
+    def __init__(self, client: Core, cls: type[User] = User) -> None:
+        '''
+        Represents the identity map of a client: one User
+        instance per id, shared by all apps. Users are only
+        weakly referenced, and forgotten when no longer used.
+        
+        Arguments
+            client: Client the users belong to.
+            cls: Class of the users to build.
+        '''
+        
+        self.client = client
+        self.cls = cls
+        self.users: weakref.WeakValueDictionary[str, User] = weakref.WeakValueDictionary()
+        self.lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self.users)
+    
+    def get(self, id: str, name: str = None, **fields) -> User:
+        '''
+        Get the User of an id, merging newly seen fields into it.
+        '''
+        
+        if name is not None: name = sys.intern(name)
+        
+        # Anonymous users can't be shared
+        if id is None:
+            return self.cls(id = id, name = name, client = self.client, **fields)
+        
+        with self.lock:
+            user = self.users.get(id)
+            
+            if user is None:
+                user = self.users[id] = self.cls(id = id, client = self.client)
+            
+            if name is not None: user.name = name
+            
+            for key, value in fields.items():
+                if value is not None: setattr(user, key, value)
+            
+            return user
+
 @dataclass
 class Group:
     id: str = None
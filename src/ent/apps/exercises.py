@@ -28,19 +28,32 @@ class ExerciseResult:
     auto_score: float = None
     comment:    str = None
 
-@dataclass
-class Exercise:
-    id:     int = None
-    owner:  User = None
-    date:   ExerciseDate = None
-    result: ExerciseResult = None
+class Exercise(base.Record):
+    
+    __slots__ = ('_id', '_owner', '_date', '_result', '_started', '_deleted',
+                 '_archived', '_corrected', '_is_training', '_is_correcting')
+    
+    id: int = base.lazy(lambda self: int(self.data.get('id')))
+    owner: User = base.lazy(lambda self: self.client.users.get(self.data.get('owner')))
+    
+    date: ExerciseDate = base.lazy(lambda self: ExerciseDate(
+        created    = utils.try_parse_exercise_date(self.data.get('created')),
+        modified   = utils.try_parse_exercise_date(self.data.get('modified')),
+        submited   = utils.try_parse_exercise_date(self.data.get('submitted_date')),
+    ))
     
-    started:       bool = None
-    deleted:       bool = None
-    archived:      bool = None
-    corrected:     bool = None
-    is_training:   bool = None
-    is_correcting: bool = None
+    result: ExerciseResult = base.lazy(lambda self: ExerciseResult(
+        score      = self.data.get('final_score'),
+        auto_score = self.data.get('calculated_score'),
+        comment    = self.data.get('comment')
+    ))
+    
+    started:       bool = base.lazy(lambda self: self.data.get('has_been_started'))
+    deleted:       bool = base.lazy(lambda self: self.data.get('is_deleted'))
+    archived:      bool = base.lazy(lambda self: self.data.get('is_archived'))
+    corrected:     bool = base.lazy(lambda self: self.data.get('is_corrected'))
+    is_training:   bool = base.lazy(lambda self: self.data.get('is_training_copy'))
+    is_correcting: bool = base.lazy(lambda self: self.data.get('is_correction_on_going'))
 
 
 class Exercises_App(base.App):
@@ -49,39 +62,19 @@ class Exercises_App(base.App):
         
         self.client = client
     
-    def get(self) -> None:
+    def get(self) -> list[Exercise]:
         '''
         Get all visible exercises.
         '''
         
-        data = self.client.get('exercizer/subjects-copy').json()
+        data = self.client.get_json('exercizer/subjects-copy')
+        return self._parse(data)
+    
+    def _parse(self, data: list[dict]) -> list[Exercise]:
+        '''
+        Parse the exercises list.
+        '''
         
-        return [
-            Exercise(
-                id             = int(obj.get('id')),
-                owner          = User.from_id(obj.get('owner')),
-                
-                date = ExerciseDate(
-                    created    = utils.try_parse_exercise_date(obj.get('created')),
-                    modified   = utils.try_parse_exercise_date(obj.get('modified')),
-                    submited   = utils.try_parse_exercise_date(obj.get('submitted_date')),
-                ),
-                
-                result = ExerciseResult(
-                    score      = obj.get('final_score'),
-                    auto_score = obj.get('calculated_score'),
-                    comment    = obj.get('comment')
-                ),
-                
-                started        = obj.get('has_been_started'),
-                deleted        = obj.get('is_deleted'),
-                archived       = obj.get('is_archived'),
-                corrected      = obj.get('is_corrected'),
-                is_training    = obj.get('is_training_copy'),
-                is_correcting  = obj.get('is_correction_on_going')
-            )
-            
-            for obj in data
-        ]
+        return [Exercise(obj, self.client) for obj in data]
 
 # EOF
\ No newline at end of file
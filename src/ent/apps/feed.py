@@ -5,8 +5,11 @@ Home feed app.
 
 from __future__ import annotations
 
+import time
+import inspect
+from datetime import datetime
 from dataclasses import dataclass
-from typing import TYPE_CHECKING
+from typing import Callable, Iterator, TYPE_CHECKING
 
 from ent import utils
 from ent.apps import base
@@ -15,15 +18,21 @@ from ent.apps.base import User
 if TYPE_CHECKING:
     from ent.core import ENT as Core
 
-@dataclass
-class Feed:
-    id: str = None
-    type: str = None
-    event: str = None
-    sender: User = None
-    date: str = None
-    content: str = None
-    url: str = None
+class Feed(base.Record):
+    
+    __slots__ = ('_id', '_type', '_event', '_sender', '_date', '_content', '_url')
+    
+    id: str = base.lazy(lambda self: self.data.get('_id'))
+    type: str = base.lazy(lambda self: self.data.get('type'))
+    event: str = base.lazy(lambda self: self.data.get('event-type'))
+    sender: User = base.lazy(lambda self: self.client.users.get(
+        id = self.data.get('sender'),
+        name = self.data.get('params', {}).get('username')
+    ))
+    date: datetime = base.lazy(lambda self: utils.try_parse_feed_date(self.data.get('date'))) # why do they never use the same format >_<
+    content: str = base.lazy(lambda self: self.data.get('message'))
+    url: str = base.lazy(lambda self: self.data.get('params', {}).get('uri') or \
+                                      self.data.get('params', {}).get('resssourceUri'))
 
 
 class Feed_App(base.App):
@@ -32,7 +41,7 @@ class Feed_App(base.App):
         
         self.client = client
     
-    def fetch(self, **filters) -> list[Feed]:
+    def fetch(self, cache: bool = True, **filters) -> list[Feed]:
         '''
         Fetch the last feed.
         '''
@@ -41,24 +50,184 @@ class Feed_App(base.App):
         url = 'timeline/lastNotifications'
         url += utils.build_feed_filters(filters)
         
-        response = self.client.get(url).json()
-        
-        return [
-            Feed(
-                id = obj.get('_id'),
-                type = obj.get('type'),
-                event = obj.get('event-type'),
-                sender = User(
-                    id = obj.get('sender'),
-                    name = obj.get('params', {}).get('username')
-                ),
-                content = obj.get('message'),
-                url = obj.get('params', {}).get('uri') or \
-                      obj.get('params', {}).get('resssourceUri'),
-                date = utils.try_parse_exercise_date(obj.get('date')) # why do they never use the same format >_<
-            )
-            for obj in response.get('results', [])
-        ]
+        response = self.client.get_json(url, cache = cache)
+        return self._parse(response)
+    
+    def watch(self, **kwargs) -> Iterator[Feed]:
+        '''
+        Endlessly yield new feed items as they appear.
+        See FeedWatcher for arguments.
+        '''
+        
+        for _, feed in FeedWatcher(self.client, **kwargs):
+            yield feed
+    
+    def _parse(self, response: dict) -> list[Feed]:
+        '''
+        Parse the feed notifications.
+        '''
+        
+        return [Feed(obj, self.client) for obj in response.get('results', [])]
+
+
+@dataclass
+class Cursor:
+    client: Core
+    interval: float
+    due: float = 0
+    seen: set[str] = None
+    mark: tuple[float, str] = None
+
+
+class FeedWatcher:
+    
+    # Whether the watched clients are async ones
+    asynchronous = False
+    
+    def __init__(self,
+                 clients: Core | list[Core],
+                 min_interval: float = 15,
+                 max_interval: float = 600,
+                 backoff: float = 1.5,
+                 skip_existing: bool = True,
+                 workers: int = 8,
+                 **filters) -> None:
+        '''
+        Represents a poller yielding only new feed items, for
+        one or many accounts. Each account is polled at its own
+        interval, which grows while nothing happens and drops
+        back to the minimum as soon as there is activity.
+        
+        Arguments
+            clients: Account(s) to watch.
+            min_interval: Shortest delay between two polls (seconds).
+            max_interval: Longest delay between two polls (seconds).
+            backoff: Interval growth factor on idle polls.
+            skip_existing: Don't yield the items present at start.
+            workers: Maximum amount of accounts polled at once.
+            filters: Feed filters (see Feed_App.fetch).
+        '''
+        
+        if not isinstance(clients, list): clients = [clients]
+        
+        for client in clients:
+            if inspect.iscoroutinefunction(client.feed.fetch) != self.asynchronous:
+                raise TypeError('Watch sync clients with ent.apps.feed.FeedWatcher, '
+                                'and AsyncENT clients with ent.aio.FeedWatcher')
+        
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.skip_existing = skip_existing
+        self.workers = workers
+        self.filters = filters
+        
+        self.cursors = [Cursor(client, min_interval) for client in clients]
+    
+    def __iter__(self) -> Iterator[tuple[Core, Feed]]:
+        '''
+        Endlessly yield (client, feed) pairs for new items.
+        '''
+        
+        while True:
+            yield from self.poll()
+            
+            wait = min(cursor.due for cursor in self.cursors) - time.time()
+            if wait > 0: time.sleep(wait)
+    
+    def subscribe(self, callback: Callable[[Core, Feed], None]) -> None:
+        '''
+        Endlessly call a function for each new item.
+        '''
+        
+        for client, feed in self:
+            callback(client, feed)
+    
+    def poll(self) -> list[tuple[Core, Feed]]:
+        '''
+        Poll the accounts that are due once, and get their
+        new items (newest first, per account).
+        '''
+        
+        due = self._due()
+        return self._news(due, utils.bounded_map(self._poll, due, self.workers))
+    
+    def _due(self) -> list[Cursor]:
+        '''
+        Get the cursors of the accounts to poll now.
+        '''
+        
+        now = time.time()
+        return [cursor for cursor in self.cursors if cursor.due <= now]
+    
+    def _news(self, due: list[Cursor], results: list[list[Feed] | Exception]) -> list[tuple[Core, Feed]]:
+        '''
+        Pair the new items of polled accounts with their client.
+        '''
+        
+        news = []
+        for cursor, result in zip(due, results):
+            
+            # Failures count as idle polls, retried later
+            if isinstance(result, Exception): result = []
+            
+            news += [(cursor.client, feed) for feed in result]
+        
+        return news
+    
+    def _poll(self, cursor: Cursor) -> list[Feed]:
+        '''
+        Poll an account and update its cursor.
+        '''
+        
+        try:
+            feeds = cursor.client.feed.fetch(cache = False, **self.filters)
+        
+        except Exception:
+            self._schedule(cursor, False)
+            raise
+        
+        return self._update(cursor, feeds)
+    
+    def _update(self, cursor: Cursor, feeds: list[Feed]) -> list[Feed]:
+        '''
+        Get the new items of a poll and update the cursor.
+        '''
+        
+        def key(feed: Feed) -> tuple[float, str] | None:
+            if feed.date is not None: return (feed.date.timestamp(), feed.id)
+        
+        def is_new(feed: Feed) -> bool:
+            
+            # Items that slid back into the window are older than the mark
+            if key(feed) and cursor.mark: return key(feed) > cursor.mark
+            return feed.id not in cursor.seen
+        
+        first = cursor.seen is None
+        new = [feed for feed in feeds if not first and is_new(feed)]
+        
+        if first and not self.skip_existing:
+            new = feeds
+        
+        # Undated items can only be told apart by the current window
+        cursor.seen = {feed.id for feed in feeds}
+        
+        # The mark only moves forward, even if the newest items get deleted
+        keys = [key(feed) for feed in feeds if key(feed)]
+        if cursor.mark: keys.append(cursor.mark)
+        if keys: cursor.mark = max(keys)
+        
+        self._schedule(cursor, bool(new))
+        return new
+    
+    def _schedule(self, cursor: Cursor, active: bool) -> None:
+        '''
+        Adapt the polling interval of an account.
+        '''
+        
+        if active: cursor.interval = self.min_interval
+        else: cursor.interval = min(cursor.interval * self.backoff, self.max_interval)
         
+        cursor.due = time.time() + cursor.interval
 
 # EOF   
\ No newline at end of file
@@ -4,17 +4,22 @@ Mail app (zimbra)
 
 from __future__ import annotations
 
-import json
-from copy import deepcopy
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dataclasses import dataclass
-from typing import Self, TYPE_CHECKING
+from itertools import count
+from typing import IO, Self, Callable, Iterable, Iterator, TYPE_CHECKING
 
+from ent import utils
 from ent import consts
+from ent import transfer
+from ent.cache import Entry
 from ent.apps import base
 from ent.apps.base import User
 
 if TYPE_CHECKING:
+    import requests
     from ent.core import ENT as Core
 
 @dataclass
@@ -28,14 +33,111 @@ class Folder:
     
     def get_mails(self,
                   unread: bool = False,
-                  limit: int = 10) -> list['Mail']:
+                  limit: int = 10,
+                  workers: int = 1,
+                  with_content: bool = False) -> list['Mail']:
         '''
-        Get all mails for this folder.
+        Get all mails for this folder (awaitable with AsyncENT).
         '''
         
         return self.parent.get_mails(unread = unread,
                                      folder = self,
-                                     limit = limit)
+                                     limit = limit,
+                                     workers = workers,
+                                     with_content = with_content)
+    
+    def iter_mails(self,
+                   unread: bool = False,
+                   limit: int = None,
+                   since: datetime = None,
+                   until: Callable[['Mail'], bool] = None) -> Iterator['Mail']:
+        '''
+        Lazily iterate over the mails of this folder
+        (async for with AsyncENT).
+        '''
+        
+        return self.parent.iter_mails(unread = unread,
+                                      folder = self,
+                                      limit = limit,
+                                      since = since,
+                                      until = until)
+
+
+class FolderIndex:
+    
+    def __init__(self, mail: Mail_app, folders: list[Folder]) -> None:
+        '''
+        Represents a flat index of a folder tree, with lookup
+        by id or path and parent links.
+        
+        Arguments
+            mail: Mails app the folders belong to.
+            folders: Root folders (see Mail_app.get_folders).
+        '''
+        
+        self.mail = mail
+        self.roots = folders
+        
+        self.by_id: dict[int, Folder] = {}
+        self.by_path: dict[str, Folder] = {}
+        self.parents: dict[int, Folder | None] = {}
+        
+        def walk(folders: list[Folder], parent: Folder | None) -> None:
+            for folder in folders:
+                self.by_id[folder.id] = folder
+                self.by_path[folder.path] = folder
+                self.parents[folder.id] = parent
+                walk(folder.subfolders, folder)
+        
+        walk(folders, None)
+    
+    def __len__(self) -> int:
+        return len(self.by_id)
+    
+    def __iter__(self) -> Iterator[Folder]:
+        return iter(self.by_id.values())
+    
+    def __contains__(self, key: int | str) -> bool:
+        return key in (self.by_path if isinstance(key, str) else self.by_id)
+    
+    def __getitem__(self, key: int | str) -> Folder:
+        '''
+        Get a folder by path (str) or id (int).
+        '''
+        
+        return (self.by_path if isinstance(key, str) else self.by_id)[key]
+    
+    def get(self, key: int | str, default: Folder = None) -> Folder | None:
+        return self[key] if key in self else default
+    
+    def parent(self, folder: Folder) -> Folder | None:
+        '''
+        Get the parent of a folder (None for root folders).
+        '''
+        
+        return self.parents[folder.id]
+    
+    def ancestors(self, folder: Folder) -> list[Folder]:
+        '''
+        Get the parents of a folder, from the root.
+        '''
+        
+        chain = []
+        while folder := self.parents[folder.id]:
+            chain.append(folder)
+        
+        return chain[::-1]
+    
+    def refresh_unread(self, folders: Iterable[Folder] = None, workers: int = 8) -> dict[str, Exception]:
+        '''
+        Update the unread amount of some folders (all by
+        default) with one count request each, in parallel
+        (awaitable with the async client).
+        
+        Returns the errors of the folders that failed, by path.
+        '''
+        
+        return self.mail.refresh_unread(list(self) if folders is None else list(folders), workers)
 
 
 @dataclass
@@ -53,12 +155,13 @@ class usersMailGroup:
         
         names = {k: v for k, v in data.get('displayNames')}
         sender = data.get('from')
+        users = client.users
         
         return cls(
-            sender = User(id = sender, name = names[sender]),
-            to = [User(id = id, name = names[id]) for id in data.get('to')],
-            cc = [User(id = id, name = names[id]) for id in data.get('cc')],
-            bcc = [User(id = id, name = names[id]) for id in data.get('bcc')],
+            sender = users.get(sender, names[sender]),
+            to = [users.get(id, names[id]) for id in data.get('to')],
+            cc = [users.get(id, names[id]) for id in data.get('cc')],
+            bcc = [users.get(id, names[id]) for id in data.get('bcc')],
         )
     
     def serialize(self, keys = ['to', 'cc', 'bcc']) -> None:
@@ -95,16 +198,24 @@ class Attachment:
             size = data.get('size')
         )
     
-    def download(self, path: str) -> None:
+    def download(self,
+                 path: str,
+                 resume: bool = True,
+                 progress: transfer.Progress = None) -> str:
         '''
-        Download the ressource.
+        Download the ressource to a file, or to a directory
+        under its own name. Returns the file sha256.
         '''
         
-        if path[-1] != '/': path += '/'
+        return transfer.download(self.client, self.url, transfer.target(path, self.name),
+                                 resume = resume, progress = progress)
+    
+    def open(self) -> IO[bytes]:
+        '''
+        Open the ressource as a readable stream.
+        '''
         
-        with open(path + self.name, 'wb') as output:
-            raw = self.client.get(self.url)
-            output.write(raw.content)
+        return transfer.open_stream(self.client, self.url)
 
 
 @dataclass
@@ -139,20 +250,40 @@ class PreparedMail:
             attachments = attachments,
             user = usersMailGroup(None, to, cc, bcc) # TODO fetch client data
         )
+    
+    def payload(self, users: usersMailGroup = None) -> dict:
+        '''
+        Build the ENT dict to send the mail.
+        '''
+        
+        return dict(
+            attachments = self.attachments,
+            body = self.content,
+            subject = self.subject,
+            **(users or self.user).serialize()
+        )
 
 
-@dataclass
-class Mail:
-    client: Core
+class Mail(base.Record):
     
-    id: int
-    date: datetime
-    subject: str
-    unread: bool
-    user: usersMailGroup
-    has_attachment: bool
-    data: dict = None
-    content_data: dict = None
+    __slots__ = ('content_data', '_id', '_date', '_subject',
+                 '_unread', '_user', '_has_attachment')
+    
+    id: int = base.lazy(lambda self: int(self.data.get('id')))
+    date: datetime = base.lazy(lambda self: datetime.fromtimestamp(self.data.get('date') / 1000))
+    subject: str = base.lazy(lambda self: self.data.get('subject'))
+    unread: bool = base.lazy(lambda self: self.data.get('unread'))
+    user: usersMailGroup = base.lazy(lambda self: usersMailGroup.parse(self.data, self.client))
+    has_attachment: bool = base.lazy(lambda self: self.data.get('hasAttachment'))
+    
+    def __init__(self, data: dict, client: Core = None, content_data: dict = None) -> None:
+        '''
+        Represents a mail header, decoded from its ENT
+        dict on first access of each field.
+        '''
+        
+        super().__init__(data, client)
+        self.content_data = content_data
     
     @classmethod
     def parse(cls, data: dict, client: Core) -> Self:
@@ -160,18 +291,7 @@ class Mail:
         Build mail from ENT dict.
         '''
         
-        mail_date = datetime.fromtimestamp(data.get('date') / 1000)
-        
-        return cls(
-            client = client,
-            id = int(data.get('id')),
-            date = mail_date,
-            subject = data.get('subject'),
-            unread = data.get('unread'),
-            has_attachment = data.get('hasAttachment'),
-            user = usersMailGroup.parse(data, client),
-            data = data
-        )
+        return cls(data, client)
 
     def fetch(self) -> None:
         '''
@@ -179,7 +299,7 @@ class Mail:
         '''
         
         url = f'zimbra/message/{self.id}'
-        self.content_data = self.client.get(url).json()
+        self.content_data = self.client.get_json(url)
 
     @property
     def attachments(self) -> list[Attachment]:
@@ -219,12 +339,8 @@ class Mail:
         
         users = mail.user if force_redirect else self.user
         
-        response = self.client.get(f'zimbra/send?In-Reply-To={self.id}', 'POST', data = dict(
-            attachments = mail.attachments,
-            body = mail.content,
-            subject = mail.subject,
-            **users.serialize()
-        ), dump = True)
+        response = self.client.get(f'zimbra/send?In-Reply-To={self.id}', 'POST',
+                                   data = mail.payload(users), dump = True)
         
         return response
 
@@ -233,9 +349,12 @@ class Mail:
         Transfer a mail to another user.
         '''
         
-        new = deepcopy(self)
-        new.user.to = to if isinstance(to, list) else [to]
-        self.client.mail.send(new) # TODO body not working
+        # Users are shared by the client, so don't copy the mail
+        new = PreparedMail.new(subject = self.subject,
+                               content = self.content,
+                               to = to)
+        
+        self.client.mail.send(new) # TODO attachments
 
 
 class Mail_app(base.App):
@@ -246,6 +365,9 @@ class Mail_app(base.App):
         '''
         
         self.client = client
+        
+        # Last folder tree, with the blob it was built from
+        self._folders: tuple[bytes, list[Folder]] = None
     
     @property
     def unread_amount(self) -> int:
@@ -254,21 +376,142 @@ class Mail_app(base.App):
         '''
         
         url = 'zimbra/count/INBOX?unread=true'
-        return self.client.get(url).json()['count']
+        return self.client.get_json(url)['count']
     
-    def get_folders(self) -> list[Folder]:
+    def refresh_unread(self, folders: list[Folder], workers: int = 8) -> dict[str, Exception]:
         '''
-        Get all folders from the ENT account.
+        Fetch the unread amount of many folders in parallel,
+        and only update their unread field.
+        
+        Returns the errors of the folders that failed, by path.
         '''
         
-        # Get raw body
-        raw = self.client.get('zimbra/zimbra').text
+        def count(folder: Folder) -> int:
+            return self.client.get_json(self._count_url(folder), cache = False)['count']
+        
+        results = utils.bounded_map(count, folders, workers)
+        
+        return self._set_unread(folders, results)
+    
+    def _count_url(self, folder: Folder) -> str:
+        return 'zimbra/count/{}?unread=true'.format(folder.path.replace('/', consts.slash))
+    
+    def _set_unread(self, folders: list[Folder], results: list[int | Exception]) -> dict[str, Exception]:
+        
+        errors = {}
+        
+        for folder, result in zip(folders, results):
+            if isinstance(result, Exception): errors[folder.path] = result
+            else: folder.unread = int(result)
+        
+        return errors
+    
+    def get_folders(self, refresh: bool = False) -> list[Folder]:
+        '''
+        Get all folders from the ENT account. The tree is
+        cached like the zimbra page (see consts.cache_policy)
+        unless refresh is set.
+        '''
+        
+        client = self.client
+        key = client.cache.key(client.username, 'folders')
+        ttl = client.cache.ttl('zimbra/zimbra')
+        
+        entry = None if refresh or not ttl else client.cache.get(key)
+        outcome = 'hit' if entry and not entry.expired else 'miss'
+        
+        if outcome == 'miss':
+            
+            # Expired, ask the server if the page changed
+            response = client.get('zimbra/zimbra', cache = False, stream = True,
+                                  headers = entry.validators if entry else None)
+            
+            if entry and response.status_code == 304:
+                response.close()
+                client.cache.refresh(key, entry, response, ttl)
+                outcome = 'revalidated'
+            
+            else:
+                entry = Entry(path = 'zimbra/zimbra',
+                              url = response.url,
+                              status = 200,
+                              body = self._scan_folders(response),
+                              expires = time.time() + ttl,
+                              headers = {k: v for k, v in response.headers.items()
+                                         if k.lower() in ('etag', 'last-modified')},
+                              account = client.username)
+                
+                # Stored under the page path, so zimbra changes drop it.
+                # Not through Cache.set, which would take the lack of
+                # validators of this entry for the endpoint's.
+                if ttl: client.cache.backend.set(key, entry)
+        
+        if client.metrics is not None and ttl and not refresh:
+            client.metrics.cache('zimbra/zimbra', outcome)
+        
+        if self._folders is None or self._folders[0] != entry.body:
+            self._folders = (entry.body, self._build_folders(client.decoder(entry.body)))
+        
+        return self._folders[1]
+    
+    def get_folder_index(self, refresh: bool = False) -> FolderIndex:
+        '''
+        Get all folders from the ENT account, indexed by
+        id and path.
+        '''
+        
+        return FolderIndex(self, self.get_folders(refresh))
+    
+    def _scan_folders(self, response: requests.Response) -> bytes:
+        '''
+        Read a streamed zimbra page until the end of the folder
+        tree blob, without reading (or decoding) the rest.
+        '''
+        
+        marker = consts.mail_folders_marker
+        
+        buffer = bytearray()
+        scanned = None # Offset of the blob end search, once the marker is found
+        
+        try:
+            for chunk in response.iter_content(consts.mail_scan_chunk):
+                buffer += chunk
+                
+                if scanned is None:
+                    index = buffer.find(marker)
+                    
+                    if index < 0:
+                        # Only keep what could be the start of the marker
+                        del buffer[:-len(marker)]
+                        continue
+                    
+                    del buffer[:index + len(marker)]
+                    scanned = 0
+                
+                end = buffer.find(b"'", scanned)
+                if end >= 0: return bytes(buffer[:end])
+                
+                scanned = len(buffer)
+        
+        finally:
+            response.close()
+        
+        raise ValueError('Folder tree not found in the zimbra page')
+    
+    def _parse_folders(self, raw: str) -> list[Folder]:
+        '''
+        Parse folders from the zimbra page.
+        '''
         
-        # Parse folders
+        # Decoders take bytes, like response bodies
         js = consts.re.mail_get_folder_data.findall(raw)[0]
-        folders = json.loads(js)
+        return self._build_folders(self.client.decoder(js.encode()))
+    
+    def _build_folders(self, folders: list[dict]) -> list[Folder]:
+        '''
+        Recursively build folders structure.
+        '''
         
-        # Recursively build folders structure
         def rec(data: dict) -> Folder:
             return Folder(parent = self,
                           name = data['folderName'],
@@ -283,22 +526,108 @@ class Mail_app(base.App):
     def get_mails(self,
                   unread: bool = False,
                   folder: Folder = None,
-                  limit: int = 10) -> list[Mail]:
+                  limit: int = 10,
+                  workers: int = 1,
+                  with_content: bool = False) -> list[Mail]:
         '''
         Get a list of mails.
+        
+        Arguments
+            unread: Only get unread mails.
+            folder: Folder to list (defaults to the inbox).
+            limit: Amount of mails to get (rounded up to a full page).
+            workers: Maximum amount of requests sent in parallel.
+            with_content: Also fetch the mails content (see fetch_contents).
         '''
         
-        folder = folder.path.replace('/', consts.slash) if folder else '%2FInbox'
-        u = f'zimbra/list?folder={folder}&page={{}}&unread={str(unread).lower()}'
+        u = self._list_url(unread, folder)
+        pages = -(-limit // consts.mail_page_size)
         
         mails = []
-        
-        # Fetch mails
-        for i in range(0, limit, 10):    
-            mails += self.client.get(u.format(i // 10)).json()
+        full = True
+        
+        # Fetch mails by waves of pages, until a page is short
+        with ThreadPoolExecutor(workers) as pool:
+            for start in range(0, pages, workers):
+                if not full: break
+                
+                wave = pool.map(lambda page: self.client.get_json(u.format(page)),
+                                range(start, min(start + workers, pages)))
+                
+                for page in wave:
+                    if not full: break
+                    
+                    mails += page
+                    full = len(page) == consts.mail_page_size
         
         # Parse mails
-        return [Mail.parse(mail, self.client) for mail in mails]
+        mails = [Mail.parse(mail, self.client) for mail in mails]
+        
+        if with_content:
+            self.fetch_contents(mails, workers = workers)
+        
+        return mails
+    
+    def fetch_contents(self, mails: list[Mail], workers: int = 8) -> dict[int, Exception]:
+        '''
+        Fetch the content of many mails in parallel. Mails
+        that are already fetched are skipped.
+        
+        Returns the errors of the mails that failed, by mail id.
+        '''
+        
+        todo = [mail for mail in mails if not mail.content_data]
+        results = utils.bounded_map(Mail.fetch, todo, workers)
+        
+        return {mail.id: result for mail, result in zip(todo, results)
+                if isinstance(result, Exception)}
+    
+    def iter_mails(self,
+                   unread: bool = False,
+                   folder: Folder = None,
+                   limit: int = None,
+                   since: datetime = None,
+                   until: Callable[[Mail], bool] = None) -> Iterator[Mail]:
+        '''
+        Lazily iterate over mails, newest first. Pages are only
+        requested when the previous one has been consumed.
+        
+        Arguments
+            unread: Only get unread mails.
+            folder: Folder to list (defaults to the inbox).
+            limit: Maximum amount of mails to yield.
+            since: Stop at the first mail older than this date.
+            until: Stop at the first mail for which this returns True.
+        '''
+        
+        u = self._list_url(unread, folder)
+        left = limit
+        
+        for page in count():
+            if left == 0: return
+            data = self.client.get_json(u.format(page))
+            
+            for raw in data:
+                mail = Mail.parse(raw, self.client)
+                
+                if since and mail.date < since: return
+                if until and until(mail): return
+                
+                yield mail
+                
+                if left is not None:
+                    left -= 1
+                    if left == 0: return
+            
+            if len(data) < consts.mail_page_size: return
+    
+    def _list_url(self, unread: bool, folder: Folder | None) -> str:
+        '''
+        Build the mail list url template (to format with the page).
+        '''
+        
+        folder = folder.path.replace('/', consts.slash) if folder else '%2FInbox'
+        return f'zimbra/list?folder={folder}&page={{}}&unread={str(unread).lower()}'
 
     def send(self, mail: PreparedMail) -> None:
         '''
@@ -306,18 +635,12 @@ class Mail_app(base.App):
         '''
         
         # Attribute an id for the mail by sending empty draft
-        mail.id = self.client.get('zimbra/draft', 'POST', data = dict(
-            body = 'New Prepared request', to = [], cc = [], bcc = [], attachments = []
-        ), dump = True).json().get('id')
+        mail.id = self.client.get_json('zimbra/draft', 'POST', data = consts.mail_draft,
+                                       dump = True).get('id')
         
         url = f'zimbra/send?id={mail.id}'
         
-        response = self.client.get(url, 'POST', data = dict(
-            attachments = mail.attachments,
-            body = mail.content,
-            subject = mail.subject,
-            **mail.user.serialize()
-        ), dump = True).json()
+        response = self.client.get_json(url, 'POST', data = mail.payload(), dump = True)
         
         if not response.get('sent'):
             raise ConnectionError('Failed to send email:', response)
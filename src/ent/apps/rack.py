@@ -4,13 +4,14 @@ Rack app (casier)
 
 from __future__ import annotations
 
+import hashlib
 import filetype
 from datetime import datetime
-from typing import TYPE_CHECKING
+from typing import IO, Self, TYPE_CHECKING
 from dataclasses import dataclass
 
 from ent import utils
-from ent import consts
+from ent import transfer
 from ent.apps import base
 from ent.apps.base import User
 
@@ -37,23 +38,96 @@ class RacKFile:
     type: str = None
     size: int = None
     charset: str = None
+    client: Core = None
+    name: str = None
+    
+    def download(self,
+                 path: str = '.',
+                 resume: bool = True,
+                 progress: transfer.Progress = None) -> str:
+        '''
+        Download the file to a location, or to a directory
+        under its own name. Returns the file sha256.
+        '''
+        
+        return transfer.download(self.client, self.url, transfer.target(path, self.name),
+                                 complete_path = False, resume = resume, progress = progress)
+    
+    def open(self) -> IO[bytes]:
+        '''
+        Open the file as a readable stream.
+        '''
+        
+        return transfer.open_stream(self.client, self.url, complete_path = False)
+
+class Rack(base.Record):
+    
+    __slots__ = ('_id', '_name', '_date', '_sender', '_receiver', '_file')
+    
+    id: str = base.lazy(lambda self: self.data.get('_id'))
+    name: str = base.lazy(lambda self: self.data.get('name'))
+    date: datetime = base.lazy(lambda self: utils.try_parse_rack_date(self.data.get('sent')))
+    
+    sender: User = base.lazy(lambda self: self.client.users.get(self.data.get('from'),
+                                                               self.data.get('fromName')))
+    receiver: User = base.lazy(lambda self: self.client.users.get(self.data.get('to'),
+                                                                 self.data.get('toName')))
     
-    def download(self, path: str) -> None:
+    @base.lazy
+    def file(self) -> RacKFile:
         '''
-        Download the file to a location.
+        The deposited file.
         '''
         
-        pass # TODO
+        meta = self.data.get('metadata') or {}
+        
+        return RacKFile(
+            client  = self.client,
+            url     = self.client.root + 'rack/get/' + self.data.get('file', 'unknown'),
+            name    = meta.get('filename') or self.data.get('name'),
+            type    = meta.get('content-type'),
+            size    = meta.get('size'),
+            charset = meta.get('charset')
+        )
 
 @dataclass
-class Rack:
-    id: str = None
+class RackUpload:
+    path: str = None
     name: str = None
-    date: datetime = None
+    size: int = None
+    type: str = None
+    hash: str = None
     
-    sender: User = None
-    receiver: User = None
-    file: RacKFile = None
+    @classmethod
+    def from_path(cls, path: str) -> Self:
+        '''
+        Sniff and hash a local file in a single read.
+        '''
+        
+        digest = hashlib.sha256()
+        ftype, size = None, 0
+        
+        with open(path, 'rb') as file:
+            while chunk := file.read(transfer.chunk_size):
+                if not size: ftype = filetype.guess(chunk)
+                
+                digest.update(chunk)
+                size += len(chunk)
+        
+        return cls(
+            path = path,
+            name = utils.get_filename(path),
+            size = size,
+            type = ftype.mime if ftype else 'text/plain',
+            hash = digest.hexdigest()
+        )
+
+@dataclass
+class DepositResult:
+    path: str = None
+    user: User = None
+    status: str = None # sent, skipped or failed
+    error: Exception = None
 
 
 class Rack_App(base.App):
@@ -66,79 +140,240 @@ class Rack_App(base.App):
         self.client = client
         self.rack_storage: RackStorage = None
     
-    def get_rack(self) -> None:
+    def get_rack(self) -> list[Rack]:
         '''
         Get the content of the user rack.
         '''
         
-        data = self.client.get('rack/list').json()
-        meta = [obj.get('metadata') or {} for obj in data]
+        data = self.client.get_json('rack/list')
+        return self._parse_rack(data)
+    
+    def _parse_rack(self, data: list[dict]) -> list[Rack]:
+        '''
+        Parse the rack list.
+        '''
         
-        return [
-            Rack(
-                id          = obj.get('_id'),
-                name        = obj.get('name'),
-                date        = utils.try_parse_rack_date(obj.get('sent')),
-                sender      = User(obj.get('from'), obj.get('fromName')),
-                receiver    = User(obj.get('to'), obj.get('toName')),
-                
-                file = RacKFile(
-                    url     = consts.root + 'rack/get/' + obj.get('file', 'unknown'),
-                    type    = meta.get('content-type'),
-                    size    = meta.get('size'),
-                    charset = meta.get('charset')
-                )
-            )
-            
-            for obj, meta in zip(data, meta)
-        ]
+        return [Rack(obj, self.client) for obj in data]
     
-    def deposit(self, users: User | list[User], path: str) -> None:
+    def deposit(self,
+                users: User | list[User],
+                path: str,
+                progress: transfer.Progress = None,
+                ftype: str = None) -> None:
         '''
         Deposit a file to somebody's rack.
         '''
         
-        if not isinstance(users, list): users = [users]
+        raw, headers = self._deposit_request(users, path, progress, ftype)
         
-        # Fetch file data
-        filename = utils.get_filename(path)
-        ftype = filetype.guess(path)
-        ftype = ftype.mime if ftype else 'text/plain' 
-        
-        with open(path, 'rb') as file:
-            filebody = file.read()
-        
-        xsrf = self.client.session.cookies['XSRF-TOKEN']
-        bound = utils.gen_rack_boundary()
-        
-        raw = consts.rack_file_template.format(
-            name = 'file',
-            filename = filename,
-            boundary = bound,
-            content = filebody,
-            filetype = ftype,
-            users = ','.join([u.id for u in users])
-        )
-        
-        response = self.client.get(
+        response = self.client.get_json(
             'rack?thumbnail=120x120', 'POST',
             data = raw,
-            headers = {
-                'X-XSRF-TOKEN': xsrf,
-                'Content-Type': f'multipart/form-data; boundary=---------------------------{bound}'
-            }
-        ).json()
+            headers = headers
+        )
         
         if not response.get('success'):
             raise Exception(f'Failed to transmit {path}:', response)
     
+    def _deposit_request(self,
+                         users: User | list[User],
+                         path: str,
+                         progress: transfer.Progress = None,
+                         ftype: str = None) -> tuple[transfer.Multipart, dict]:
+        '''
+        Build the body and headers of a deposit request.
+        The file is streamed from the disk when sent.
+        '''
+        
+        if not isinstance(users, list): users = [users]
+        
+        # Fetch file type
+        if ftype is None:
+            ftype = filetype.guess(path)
+            ftype = ftype.mime if ftype else 'text/plain' 
+        
+        raw = transfer.Multipart(
+            path,
+            content_type = ftype,
+            fields = {'users': ','.join([u.id for u in users])},
+            progress = progress
+        )
+        
+        return raw, {
+            'X-XSRF-TOKEN': self.client.xsrf,
+            'Content-Type': raw.content_type
+        }
+    
+    def deposit_many(self,
+                     paths: list[str],
+                     users: User | list[User],
+                     workers: int = 4,
+                     skip_existing: bool = False,
+                     verify_hash: bool = True) -> list[DepositResult]:
+        '''
+        Deposit many files to many users' racks.
+        
+        Each file is read once to get its type and hash, then
+        uploaded once for all its recipients. Files with the same
+        name and content are only sent once.
+        
+        Arguments
+            paths: Files to deposit.
+            users: Users to deposit the files to.
+            workers: Maximum amount of simultaneous uploads.
+            skip_existing: Don't send a file to a user whose rack
+                           already holds a file with the same name
+                           and size.
+            verify_hash: With skip_existing, also download the
+                         matching rack files to compare contents.
+        
+        Returns a result for each file and user.
+        '''
+        
+        if not isinstance(users, list): users = [users]
+        
+        results, uploads = self._uploads(paths, users, utils.bounded_map(RackUpload.from_path, paths, workers))
+        existing = self._existing(self.get_rack()) if skip_existing else {}
+        
+        def remote_hash(rack: Rack) -> str:
+            with rack.file.open() as stream:
+                return hashlib.file_digest(stream, 'sha256').hexdigest()
+        
+        # Hash each candidate rack file once, before fanning out
+        hashes: dict[str, str | Exception] = {}
+        
+        if skip_existing and verify_hash:
+            candidates = self._candidates(uploads, users, existing)
+            hashes = dict(zip(candidates, utils.bounded_map(remote_hash, candidates.values(), workers)))
+        
+        def send(upload: RackUpload) -> list[DepositResult]:
+            done, todo = self._recipients(upload, users, existing, hashes, verify_hash)
+            report = [DepositResult(upload.path, user, 'skipped') for user in done]
+            
+            if todo:
+                try:
+                    self.deposit(todo, upload.path, ftype = upload.type)
+                    report += [DepositResult(upload.path, user, 'sent') for user in todo]
+                
+                except Exception as err:
+                    report += [DepositResult(upload.path, user, 'failed', err) for user in todo]
+            
+            return report
+        
+        reports = utils.bounded_map(send, uploads.values(), workers)
+        return results + self._reports(uploads, users, reports)
+    
+    def _uploads(self,
+                 paths: list[str],
+                 users: list[User],
+                 read: list[RackUpload | Exception]) -> tuple[list[DepositResult], dict[tuple, RackUpload]]:
+        '''
+        Dedupe the read files by name and content. Returns the
+        results of the files that won't be sent, and the uploads.
+        '''
+        
+        results: list[DepositResult] = []
+        uploads: dict[tuple, RackUpload] = {}
+        
+        for path, upload in zip(paths, read):
+            
+            if isinstance(upload, Exception):
+                results += [DepositResult(path, user, 'failed', upload) for user in users]
+            
+            elif (upload.name, upload.hash) in uploads:
+                results += [DepositResult(path, user, 'skipped') for user in users]
+            
+            else:
+                uploads[upload.name, upload.hash] = upload
+        
+        return results, uploads
+    
+    def _existing(self, racks: list[Rack]) -> dict[tuple, list[Rack]]:
+        '''
+        Index what users already received by receiver, file
+        name and size.
+        '''
+        
+        existing: dict[tuple, list[Rack]] = {}
+        
+        for rack in racks:
+            key = (rack.receiver.id, rack.file.name, rack.file.size)
+            existing.setdefault(key, []).append(rack)
+        
+        return existing
+    
+    def _candidates(self,
+                    uploads: dict[tuple, RackUpload],
+                    users: list[User],
+                    existing: dict[tuple, list[Rack]]) -> dict[str, Rack]:
+        '''
+        Get the rack files whose hash must be checked, by id.
+        '''
+        
+        return {rack.id: rack
+                for upload in uploads.values() for user in users
+                for rack in existing.get((user.id, upload.name, upload.size), [])}
+    
+    def _recipients(self,
+                    upload: RackUpload,
+                    users: list[User],
+                    existing: dict[tuple, list[Rack]],
+                    hashes: dict[str, str | Exception],
+                    verify_hash: bool) -> tuple[list[User], list[User]]:
+        '''
+        Split users into those who already received a file and
+        those it must be sent to. Raises the error of a failed
+        hash check.
+        '''
+        
+        def received(user: User) -> bool:
+            racks = existing.get((user.id, upload.name, upload.size), [])
+            
+            if not verify_hash: return bool(racks)
+            
+            for rack in racks:
+                digest = hashes[rack.id]
+                if isinstance(digest, Exception): raise digest
+                if digest == upload.hash: return True
+            
+            return False
+        
+        done = [user for user in users if received(user)]
+        return done, [user for user in users if user not in done]
+    
+    def _reports(self,
+                 uploads: dict[tuple, RackUpload],
+                 users: list[User],
+                 reports: list[list[DepositResult] | Exception]) -> list[DepositResult]:
+        '''
+        Flatten the reports of the sent files.
+        '''
+        
+        results: list[DepositResult] = []
+        
+        for upload, report in zip(uploads.values(), reports):
+            
+            # Could not check what users already received
+            if isinstance(report, Exception):
+                report = [DepositResult(upload.path, user, 'failed', report) for user in users]
+            
+            results += report
+        
+        return results
+    
     def refresh_storage_usage(self) -> None:
         '''
         Refresh the allocated storage data.
         '''
         
         uid = self.client.account.user.id
-        data = self.client.get('workspace/quota/user/' + uid).json()
+        data = self.client.get_json('workspace/quota/user/' + uid)
+        self._parse_storage(data)
+    
+    def _parse_storage(self, data: dict) -> None:
+        '''
+        Parse the allocated storage data.
+        '''
         
         self.rack_storage = RackStorage(
             used = data.get('quota'),
@@ -28,7 +28,7 @@ class User_app(base.App):
         Update the account data.
         '''
     
-        self.data = self.client.get('auth/oauth2/userinfo', cache = False).json()
+        self.data = self.client.get_json('auth/oauth2/userinfo', cache = False)
     
     @property
     def user(self) -> User:
@@ -37,13 +37,20 @@ class User_app(base.App):
         '''
         
         if not self.data: self.refresh()
-        return User(
-            id = self.data['userId'],
-            name = self.data['username'],
-            type = self.data['type'],
-            groups = self.data['groupsIds'], # TODO classify
-            classes = self.data['classes'], # &
-            schools = self.data['structures'] # &
+        return self._parse(self.data)
+    
+    def _parse(self, data: dict) -> User:
+        '''
+        Build the user from the account data.
+        '''
+        
+        return self.client.users.get(
+            id = data['userId'],
+            name = data['username'],
+            type = data['type'],
+            groups = data['groupsIds'], # TODO classify
+            classes = data['classes'], # &
+            schools = data['structures'] # &
         )
 
 # EOF
\ No newline at end of file
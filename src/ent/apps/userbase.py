@@ -27,14 +27,12 @@ class Userbase_App(base.App):
         to search for groups or users.
         '''
         
-        xsrf = self.client.session.cookies['XSRF-TOKEN']
-        
-        response = self.client.get(
+        response = self.client.get_json(
             'communication/visible', 'POST',
             data = kwargs,
-            headers = {'X-XSRF-TOKEN': xsrf},
+            headers = {'X-XSRF-TOKEN': self.client.xsrf},
             dump = True
-        ).json()
+        )
         
         return response
     
@@ -47,17 +45,31 @@ class Userbase_App(base.App):
         Search for users among the list the user has access to.
         '''
         
-        users = self._base_search(
+        users = self._base_search(**self._users_query(query, classes, schools, functions))
+        return self._parse_users(users)
+    
+    def _users_query(self, query, classes, schools, functions) -> dict:
+        '''
+        Build the users search arguments.
+        '''
+        
+        return dict(
             search = query,
             classes = classes,
             structures = schools,
             functions = functions,
             types = ['User']
-        )['users']
+        )
+    
+    def _parse_users(self, response: dict) -> list[User]:
+        '''
+        Parse users from a search response.
+        '''
         
-        return [User(data['id'],
-                     data['displayName'],
-                     data['profile']) for data in users]
+        return [self.client.users.get(data['id'],
+                                      data['displayName'],
+                                      type = data['profile'])
+                for data in response['users']]
     
     def search_groups(self,
                      query: str = '',
@@ -69,7 +81,16 @@ class Userbase_App(base.App):
         Search for groups among the list the groups has access to.
         '''
         
-        groups = self._base_search(
+        groups = self._base_search(**self._groups_query(query, classes, schools,
+                                                        functions, group_type))
+        return self._parse_groups(groups)
+    
+    def _groups_query(self, query, classes, schools, functions, group_type) -> dict:
+        '''
+        Build the groups search arguments.
+        '''
+        
+        return dict(
             search = query,
             classes = classes,
             structures = schools,
@@ -77,7 +98,12 @@ class Userbase_App(base.App):
             types = group_type,
             groupType = True,
             nbUsersInGroups = True
-        )['groups']
+        )
+    
+    def _parse_groups(self, response: dict) -> list[Group]:
+        '''
+        Parse groups from a search response.
+        '''
         
         return [Group(data.get('id'),
                       data.get('name'),
@@ -85,6 +111,6 @@ class Userbase_App(base.App):
                       data.get('nbUsers'),
                       data.get('profile'),
                       data.get('sortName'))
-                for data in groups]
+                for data in response['groups']]
 
 # EOF
\ No newline at end of file
@@ -4,6 +4,10 @@ Userbooks app.
 
 from __future__ import annotations
 
+import time
+import threading
+from collections import OrderedDict
+from ent import utils
 from ent.apps import base
 from typing import TYPE_CHECKING
 from dataclasses import dataclass
@@ -40,26 +44,125 @@ class UserbookData:
 
 class Userbook_App(base.App):
     
-    def __init__(self, client: Core) -> None:
+    def __init__(self, client: Core, ttl: float = 3600, max_entries: int = 1024) -> None:
         '''
         Represents an instance of the ENT userbook app.
+        Fetched userbooks are kept `ttl` seconds, by user id,
+        with at most `max_entries` least recently used ones.
         '''
         
         self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        
+        self.books: OrderedDict[str, tuple[float, UserbookData]] = OrderedDict()
+        self.lock = threading.Lock()
     
     def fetch(self, user: User) -> User:
         '''
         Fetch the userbook data for a user.
         '''
         
+        user.userbook = self.cached(user.id) or self._fetch_book(user)
+        return user
+    
+    def fetch_many(self, users: list[User], workers: int = 8) -> dict[str, Exception]:
+        '''
+        Fetch the userbook data of many users in parallel.
+        Each id is fetched at most once, and every given
+        user with that id gets the data.
+        
+        Returns the errors of the ids that failed.
+        '''
+        
+        by_id, missing = self._missing(users)
+        results = dict(zip([user.id for user in missing],
+                           utils.bounded_map(self._fetch_book, missing, workers)))
+        
+        return self._assign(by_id, results)
+    
+    def _missing(self, users: list[User]) -> tuple[dict[str, list[User]], list[User]]:
+        '''
+        Group users by id, and get one user per id whose
+        userbook is not cached.
+        '''
+        
+        by_id: dict[str, list[User]] = {}
+        for user in users:
+            by_id.setdefault(user.id, []).append(user)
+        
+        return by_id, [same[0] for id, same in by_id.items() if not self.cached(id)]
+    
+    def _assign(self, by_id: dict[str, list[User]], results: dict) -> dict[str, Exception]:
+        '''
+        Give the fetched (or cached) userbooks to the users,
+        and get the errors of the ids that failed.
+        '''
+        
+        for id, same in by_id.items():
+            book = results.get(id) or self.cached(id)
+            if isinstance(book, Exception): continue
+            
+            for user in same: user.userbook = book
+        
+        return {id: err for id, err in results.items() if isinstance(err, Exception)}
+    
+    def cached(self, id: str) -> UserbookData | None:
+        '''
+        Get the userbook of a user id if it was fetched recently.
+        '''
+        
+        with self.lock:
+            date, book = self.books.get(id, (0, None))
+            
+            if book is None: return
+            
+            if time.time() - date >= self.ttl:
+                del self.books[id]
+                return
+            
+            self.books.move_to_end(id)
+            return book
+    
+    def _fetch_book(self, user: User) -> UserbookData:
+        '''
+        Fetch and cache the userbook of a user.
+        '''
+        
         # data = self.client.get('directory/userbook/' + user.id).json()
         
-        raw = self.client.get('userbook/api/person?id=' + user.id)
+        raw = self.client.get_json('userbook/api/person?id=' + user.id)
+        return self._store(user.id, self._parse(raw))
+    
+    def _store(self, id: str, book: UserbookData) -> UserbookData:
+        '''
+        Cache the userbook of a user id.
+        '''
+        
+        now = time.time()
+        
+        with self.lock:
+            self.books[id] = (now, book)
+            self.books.move_to_end(id)
+            
+            # Drop expired entries from the least recently used end, then the overflow
+            while self.books:
+                oldest, (date, _) = next(iter(self.books.items()))
+                
+                if now - date < self.ttl and len(self.books) <= self.max_entries: break
+                del self.books[oldest]
         
-        relations = raw.json()['result']
+        return book
+    
+    def _parse(self, response: dict) -> UserbookData:
+        '''
+        Parse userbook data.
+        '''
+        
+        relations = response['result']
         data = relations[0]
         
-        user.userbook = UserbookData(
+        return UserbookData(
             mood = data.get('mood'),
             health = data.get('health'),
             motto = data.get('motto'),
@@ -78,15 +181,12 @@ class Userbook_App(base.App):
                 for hobby in data.get('hobbies', [])
             ],
             relations = [
-                User(
+                self.client.users.get(
                     rel.get('relatedId'),
-                    rel.get('relatedName'),
-                    client = self.client
+                    rel.get('relatedName')
                 ) for rel in relations
             ] if data.get('relatedId') is not None else [],
             pfp_url = data.get('photo')
         )
-        
-        return user
 
 # EOF
\ No newline at end of file
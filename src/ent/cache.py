@@ -0,0 +1,460 @@
+'''
+Response cache for the ENT client.
+'''
+
+from __future__ import annotations
+
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from typing import Self
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from ent import consts
+
+
+@dataclass
+class Entry:
+    path: str
+    url: str
+    status: int
+    body: bytes
+    expires: float
+    headers: dict = field(default_factory = dict)
+    account: str = None
+    
+    @classmethod
+    def from_response(cls,
+                      path: str,
+                      response: requests.Response,
+                      ttl: float,
+                      account: str = None) -> Self:
+        '''
+        Build an entry from a server response.
+        '''
+        
+        return cls(
+            path = path,
+            url = response.url,
+            status = response.status_code,
+            body = response.content,
+            expires = time.time() + ttl,
+            headers = dict(response.headers),
+            account = account
+        )
+    
+    @property
+    def size(self) -> int:
+        '''
+        Weight of the entry, in bytes.
+        '''
+        
+        return len(self.body)
+    
+    @property
+    def expired(self) -> bool:
+        '''
+        Whether the entry outlived its TTL.
+        '''
+        
+        return time.time() >= self.expires
+    
+    @property
+    def validators(self) -> dict[str, str]:
+        '''
+        Conditional request headers to revalidate the entry.
+        '''
+        
+        headers = CaseInsensitiveDict(self.headers)
+        validators = {}
+        
+        if etag := headers.get('ETag'):
+            validators['If-None-Match'] = etag
+        
+        if modified := headers.get('Last-Modified'):
+            validators['If-Modified-Since'] = modified
+        
+        return validators
+    
+    def to_response(self) -> requests.Response:
+        '''
+        Rebuild a response object from the entry.
+        '''
+        
+        response = requests.Response()
+        response.url = self.url
+        response.status_code = self.status
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = self.body
+        
+        return response
+
+
+class Backend:
+    '''
+    Storage interface for cache entries.
+    '''
+    
+    def get(self, key: str) -> Entry | None:
+        '''
+        Get an entry (expired or not).
+        '''
+        
+        raise NotImplementedError
+    
+    def set(self, key: str, entry: Entry) -> None:
+        '''
+        Store an entry, evicting old ones if needed.
+        '''
+        
+        raise NotImplementedError
+    
+    def delete(self, key: str) -> None:
+        '''
+        Drop an entry.
+        '''
+        
+        raise NotImplementedError
+    
+    def invalidate(self, prefix: str = '', account: str = None) -> None:
+        '''
+        Drop all entries whose path starts with a prefix,
+        optionally only for one account.
+        '''
+        
+        raise NotImplementedError
+    
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class MemoryBackend(Backend):
+    
+    def __init__(self,
+                 max_entries: int = 512,
+                 max_bytes: int = 32 * 1024 ** 2) -> None:
+        '''
+        Represents an in-process LRU storage, bounded by entry
+        count and total size.
+        '''
+        
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        
+        self.size = 0
+        self.entries: OrderedDict[str, Entry] = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def get(self, key: str) -> Entry | None:
+        
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None: self.entries.move_to_end(key)
+            return entry
+    
+    def set(self, key: str, entry: Entry) -> None:
+        
+        # Don't let a single entry flush the whole cache
+        if entry.size > self.max_bytes // 8: return
+        
+        with self.lock:
+            if key in self.entries: self._pop(key)
+            
+            self.entries[key] = entry
+            self.size += entry.size
+            
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self._pop(next(iter(self.entries)))
+    
+    def delete(self, key: str) -> None:
+        
+        with self.lock:
+            if key in self.entries: self._pop(key)
+    
+    def invalidate(self, prefix: str = '', account: str = None) -> None:
+        
+        with self.lock:
+            for key in [k for k, e in self.entries.items()
+                        if e.path.startswith(prefix)
+                        and account in (None, e.account)]:
+                self._pop(key)
+    
+    def _pop(self, key: str) -> None:
+        self.size -= self.entries.pop(key).size
+
+
+class SQLiteBackend(Backend):
+    
+    schema = '''
+        CREATE TABLE IF NOT EXISTS entries (
+            key     TEXT PRIMARY KEY,
+            account TEXT,
+            path    TEXT,
+            expires REAL,
+            used    REAL,
+            size    INTEGER,
+            meta    TEXT,
+            body    BLOB
+        );
+        CREATE INDEX IF NOT EXISTS entries_used ON entries (used);
+    '''
+    
+    def __init__(self,
+                 path: str,
+                 max_entries: int = 10_000,
+                 max_bytes: int = 256 * 1024 ** 2,
+                 timeout: float = 30,
+                 touch: float = 60) -> None:
+        '''
+        Represents a storage in a SQLite database file, that
+        can be shared by several threads and processes.
+        Bodies are stored zlib-compressed.
+
+        Arguments
+            path: database file path.
+            max_entries: maximum amount of stored entries.
+            max_bytes: maximum total size of stored (compressed) bodies.
+            timeout: how long to wait for other processes' locks.
+            touch: how old (in seconds) the last use time of an entry
+                   must be for a hit to update it, so that most hits
+                   don't write.
+        '''
+        
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.touch = touch
+        
+        self.local = threading.local()
+        
+        with self.db as db:
+            db.executescript(self.schema)
+    
+    @property
+    def db(self) -> sqlite3.Connection:
+        '''
+        Connection of the current thread.
+        '''
+        
+        if not hasattr(self.local, 'db'):
+            self.local.db = sqlite3.connect(self.path, timeout = self.timeout)
+            self.local.db.execute('PRAGMA journal_mode = WAL')
+            self.local.db.execute('PRAGMA synchronous = NORMAL')
+        
+        return self.local.db
+    
+    def __len__(self) -> int:
+        return self.db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+    
+    def get(self, key: str) -> Entry | None:
+        
+        row = self.db.execute('SELECT path, account, expires, used, meta, body FROM entries WHERE key = ?',
+                              (key,)).fetchone()
+        if row is None: return
+        
+        path, account, expires, used, meta, body = row
+        meta = json.loads(meta)
+        
+        # Reads stay read-only, unless the LRU time is getting old
+        now = time.time()
+        if now - used >= self.touch:
+            with self.db as db:
+                db.execute('UPDATE entries SET used = ? WHERE key = ?', (now, key))
+        
+        return Entry(
+            path = path,
+            url = meta['url'],
+            status = meta['status'],
+            body = zlib.decompress(body),
+            expires = expires,
+            headers = meta['headers'],
+            account = account
+        )
+    
+    def set(self, key: str, entry: Entry) -> None:
+        
+        body = zlib.compress(entry.body)
+        if len(body) > self.max_bytes // 8: return
+        
+        meta = json.dumps(dict(url = entry.url,
+                               status = entry.status,
+                               headers = entry.headers),
+                          separators = (',', ':'))
+        
+        with self.db as db:
+            db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                       (key, entry.account, entry.path, entry.expires,
+                        time.time(), len(body), meta, body))
+            
+            count, size = db.execute('SELECT COUNT(*), TOTAL(size) FROM entries').fetchone()
+            
+            # Evict least recently used entries
+            if count > self.max_entries or size > self.max_bytes:
+                db.execute('''
+                    DELETE FROM entries WHERE key IN (
+                        SELECT key FROM (
+                            SELECT key,
+                                   SUM(size) OVER (ORDER BY used DESC) AS total,
+                                   ROW_NUMBER() OVER (ORDER BY used DESC) AS rank
+                            FROM entries
+                        ) WHERE total > ? OR rank > ?
+                    )
+                ''', (self.max_bytes, self.max_entries))
+    
+    def delete(self, key: str) -> None:
+        
+        with self.db as db:
+            db.execute('DELETE FROM entries WHERE key = ?', (key,))
+    
+    def invalidate(self, prefix: str = '', account: str = None) -> None:
+        
+        query = 'DELETE FROM entries WHERE substr(path, 1, ?) = ?'
+        args = [len(prefix), prefix]
+        
+        if account is not None:
+            query += ' AND account = ?'
+            args.append(account)
+        
+        with self.db as db:
+            db.execute(query, args)
+
+
+class Cache:
+    
+    def __init__(self,
+                 max_entries: int = 512,
+                 max_bytes: int = 32 * 1024 ** 2,
+                 policy: dict[str, float] = None,
+                 revalidate: bool = False,
+                 backend: Backend = None) -> None:
+        '''
+        Represents a response cache with per-endpoint TTLs.
+
+        Arguments
+            max_entries: maximum amount of cached responses.
+            max_bytes: maximum total size of cached bodies.
+            policy: endpoint prefix to TTL (in seconds) mapping.
+                    Endpoints without policy are never cached.
+            revalidate: Keep expired entries that have validators
+                        (ETag/Last-Modified) and refresh them with
+                        conditional requests.
+            backend: Entries storage (in memory LRU by default,
+                     in which case max_entries and max_bytes apply).
+        '''
+        
+        self.policy = consts.cache_policy if policy is None else policy
+        self.revalidate = revalidate
+        self.backend = MemoryBackend(max_entries, max_bytes) if backend is None else backend
+        
+        # Whether each endpoint sends validators
+        self.conditional: dict[str, bool] = {}
+        
+        self.lock = threading.Lock()
+        self.stats = dict(hits = 0, misses = 0, revalidated = 0, bytes_saved = 0)
+    
+    def __len__(self) -> int:
+        return len(self.backend)
+    
+    @staticmethod
+    def key(*parts) -> str:
+        '''
+        Build a canonical key from request parts.
+        '''
+        
+        raw = json.dumps(parts, sort_keys = True, default = str)
+        return hashlib.sha1(raw.encode()).hexdigest()
+    
+    def endpoint(self, path: str) -> str | None:
+        '''
+        Get the policy prefix matching a path (longest wins).
+        '''
+        
+        return max((prefix for prefix in self.policy if path.startswith(prefix)),
+                   key = len, default = None)
+    
+    def ttl(self, path: str) -> float:
+        '''
+        Get the TTL of an endpoint.
+        '''
+        
+        return self.policy.get(self.endpoint(path), 0)
+    
+    def get(self, key: str) -> Entry | None:
+        '''
+        Get an entry from the cache. Expired entries are only
+        returned if they can be revalidated, and are dropped
+        otherwise.
+        '''
+        
+        entry = self.backend.get(key)
+        
+        if entry is not None and entry.expired:
+            
+            # Endpoints not seen yet by this process (shared backends) get a chance
+            if not (self.revalidate
+                    and self.conditional.get(self.endpoint(entry.path), True)
+                    and entry.validators):
+                self.backend.delete(key)
+                entry = None
+        
+        with self.lock:
+            if entry is None: self.stats['misses'] += 1
+            elif not entry.expired: self.stats['hits'] += 1
+        
+        return entry
+    
+    def set(self, key: str, entry: Entry) -> None:
+        '''
+        Store an entry.
+        '''
+        
+        # Endpoints that never send validators fall back to TTL only
+        self.conditional[self.endpoint(entry.path)] = bool(entry.validators)
+        
+        self.backend.set(key, entry)
+    
+    def refresh(self, key: str, entry: Entry, response: requests.Response, ttl: float) -> None:
+        '''
+        Renew an entry after the server confirmed it did
+        not change (304).
+        '''
+        
+        entry.expires = time.time() + ttl
+        entry.headers |= {k: v for k, v in response.headers.items()
+                          if k.lower() in ('etag', 'last-modified')}
+        
+        self.backend.set(key, entry)
+        
+        with self.lock:
+            self.stats['revalidated'] += 1
+            self.stats['bytes_saved'] += entry.size
+    
+    def invalidate(self, prefix: str = '', account: str = None) -> None:
+        '''
+        Drop all entries whose path starts with a prefix,
+        optionally only for one account.
+        '''
+        
+        self.backend.invalidate(prefix, account)
+    
+    def clear(self) -> None:
+        '''
+        Drop all entries.
+        '''
+        
+        self.invalidate()
+
+# EOF
\ No newline at end of file
@@ -8,6 +8,29 @@ root = 'https://ent.iledefrance.fr/'
 
 slash = '%2F'
 
+# Amount of mails per zimbra/list page.
+mail_page_size = 10
+
+# Read size when scanning the zimbra page for the folder tree.
+mail_scan_chunk = 16 * 1024
+
+# Start of the folder tree blob in the zimbra page.
+mail_folders_marker = b'"folders": \''
+
+# Response cache lifetime (in seconds) per endpoint prefix.
+# Endpoints that are not listed here are never cached.
+cache_policy = {
+    'zimbra/count': 15,
+    'zimbra/list': 15,
+    'zimbra/zimbra': 120,
+    'zimbra/message/': 600,
+    'rack/list': 60,
+    'workspace/quota': 300,
+    'exercizer/subjects-copy': 300,
+    'timeline/lastNotifications': 10,
+    'userbook/api/person': 3600
+}
+
 class re:
     '''
     Useful compiled regexes for fast web scrapping.
@@ -16,17 +39,7 @@ class re:
     mail_get_folder_data = regex.compile(r"\"folders\": '(.*?)\'")
 
 
-# Template for uploading files with the rack app.
-rack_file_template = '''-----------------------------{boundary}
-Content-Disposition: form-data; name="file"; filename="{filename}"
-Content-Type: {filetype}
-
-{content}
------------------------------{boundary}
-Content-Disposition: form-data; name="users"
-
-{users}
------------------------------{boundary}--
-'''
+# Empty draft, sent to get an id for new mails.
+mail_draft = dict(body = 'New Prepared request', to = [], cc = [], bcc = [], attachments = [])
 
 # EOF
\ No newline at end of file
@@ -3,30 +3,78 @@ Core module of the API.
 '''
 
 import json
+import time
+import itertools
+from typing import Any, Callable
+
 import requests
 
+from ent import utils
 from ent import consts
 from ent import apps
+from ent import sessions
+from ent.cache import Cache, Entry
+from ent.replay import Recorder
+from ent.metrics import Metrics, size
+from ent.throttle import RetryPolicy, TokenBucket
 
 class ENT:
     
     def __init__(self,
                  username: str,
                  password: str,
-                 login: bool = True) -> None:
+                 login: bool = True,
+                 cache: Cache = None,
+                 store: sessions.SessionStore = None,
+                 root: str = consts.root,
+                 decoder: Callable[[bytes], Any] = utils.loads,
+                 retry: RetryPolicy = None,
+                 limiter: TokenBucket = None,
+                 metrics: Metrics = None,
+                 capture: Recorder = None) -> None:
         '''
         Represents an ENT session.
+        
+        Arguments
+            username: ENT login.
+            password: ENT password.
+            login: Whether to login on creation (or restore
+                   the stored session, if any).
+            cache: Response cache to use (a new one by default).
+                   Can be shared between clients, entries are
+                   keyed per account.
+            store: Where to save and restore the session cookies.
+            root: Base url of the ENT.
+            decoder: JSON decoder of response bodies (orjson if
+                     installed, stdlib json otherwise).
+            retry: When to retry failed requests (a default
+                   RetryPolicy if not set).
+            limiter: Rate limiter of the requests. Can be shared
+                     between clients.
+            metrics: Collector of request metrics (off if not set).
+                     Can be shared between clients.
+            capture: Recorder of the traffic, to replay it later
+                     (see ent.replay).
         '''
         
         # Check credentials
         assert len(username) and len(password), 'Empty credentials'
         
         # Save credentials
+        self.root = root
+        self.username = username
         self.session = requests.Session()
         self.payload = {'email': username, 'password': password}
         
         self.apps = {}
-        self.cache = {}
+        self.users = apps.base.Users(self)
+        self.cache = Cache() if cache is None else cache
+        self.store = store
+        self.decoder = decoder
+        self.retry = RetryPolicy() if retry is None else retry
+        self.limiter = limiter
+        self.metrics = metrics
+        self.capture = capture
         
         # Build apps
         # TODO - Find a way to generate them dynamically
@@ -38,7 +86,7 @@ class ENT:
         self.userbook  = apps.userbook.Userbook_App(self)
         self.feed      = apps.feed.Feed_App(self)
         
-        if login: self.login()
+        if login and not self.restore(): self.login()
     
     def get(self,
                 path: str,
@@ -48,37 +96,132 @@ class ENT:
                 cache: bool = True,
                 complete_path = True,
                 dump: bool = False,
-                inject_token: bool = False # TODO
+                inject_token: bool = False, # TODO
+                stream: bool = False
                 ) -> requests.Response:
         '''
         Make a request to the target.
+        If stream is set, the body is not read (nor cached).
         '''
         
-        url = (consts.root if complete_path else '') + path
+        url = (self.root if complete_path else '') + path
         
-        key = f'{method}:{path}{data}///{headers}'
+        # Only GET requests are ever cached
+        ttl = self.cache.ttl(path) if cache and method == 'GET' and not stream else 0
         
         # Get from cache
-        if cache and key in self.cache:
-            return self.cache.get(key)
+        entry = None
+        if ttl:
+            key = self.cache.key(self.username, method, url, data, headers)
+            entry = self.cache.get(key)
+            
+            if entry and not entry.expired:
+                if self.metrics is not None: self.metrics.cache(path, 'hit')
+                return entry.to_response()
+            
+            # Expired, ask the server if it changed
+            if entry:
+                headers = entry.validators | (headers or {})
         
         # Inject XRSF
         if inject_token:
             
-            xsrf = self.session.cookies['XSRF-TOKEN']
-            end = {'X-XSRF-TOKEN': xsrf}
+            end = {'X-XSRF-TOKEN': self.xsrf}
             
             headers = end if headers is None else headers | end
         
         # Send the request
         if dump: data = json.dumps(data)
-        response = self.session.request(method, url, data = data, headers = headers)
+        response = self._send(method, path, url, data, headers, stream)
+        
+        if ttl and self.metrics is not None:
+            self.metrics.cache(path, 'revalidated' if entry and response.status_code == 304 else 'miss')
         
         if not response.ok:
-            raise ConnectionError('Failed to send request', key, 'Got response:', response.content, 'with code', response)
+            raise ConnectionError('Failed to send request', f'{method}:{path}', 'Got response:', response.content, 'with code', response)
+        
+        if entry and response.status_code == 304:
+            self.cache.refresh(key, entry, response, ttl)
+            return entry.to_response()
+        
+        if ttl:
+            self.cache.set(key, Entry.from_response(path, response, ttl, self.username))
+        
+        # Mutating calls make the cached data of their app stale
+        elif method != 'GET':
+            self.cache.invalidate(path.split('?')[0].strip('/').split('/')[0], self.username)
         
         return response
+    
+    def _send(self,
+              method: str,
+              path: str,
+              url: str,
+              data: Any,
+              headers: dict,
+              stream: bool) -> requests.Response:
+        '''
+        Send a request, waiting for the rate limiter and
+        retrying transient failures.
+        '''
+        
+        for attempt in itertools.count():
+            
+            if self.limiter is not None: self.limiter.acquire()
+            
+            start = time.perf_counter()
+            
+            try:
+                response = self.session.request(method, url, data = data,
+                                                headers = headers, stream = stream)
+                
+                elapsed = time.perf_counter() - start
+                
+                if self.metrics is not None:
+                    self.metrics.response(method, path, response, elapsed,
+                                          size(response.request.body), stream)
+                
+                if self.capture is not None:
+                    self.capture.record(self.root, response, elapsed, stream)
+                
+                if response.ok: return response
+                delay = self.retry.wait(method, attempt, response)
+                
+                if delay is None: return response
+                response.close()
+            
+            except (requests.ConnectionError, requests.Timeout):
+                if self.metrics is not None:
+                    self.metrics.request(method, path, 0, time.perf_counter() - start)
+                
+                delay = self.retry.wait(method, attempt)
+                if delay is None: raise
+            
+            if self.metrics is not None: self.metrics.retry(method, path)
+            time.sleep(delay)
+    
+    def decode(self, response: requests.Response) -> Any:
+        '''
+        Decode a JSON response body with the client decoder.
+        '''
+        
+        return self.decoder(response.content)
+    
+    def get_json(self, path: str, *args, **kwargs) -> Any:
+        '''
+        Make a request (see get) and decode its JSON response.
+        '''
+        
+        return self.decode(self.get(path, *args, **kwargs))
 
+    @property
+    def xsrf(self) -> str:
+        '''
+        The XSRF token of the session.
+        '''
+        
+        return self.session.cookies['XSRF-TOKEN']
+    
     def login(self) -> None:
         '''
         Attempts to login to the ENT.
@@ -90,5 +233,44 @@ class ENT:
         # Check if authentificated
         if not self.session.cookies.get('XSRF-TOKEN'):
             raise ConnectionRefusedError('Invalid credentials.')
+        
+        self.save_session()
+    
+    def save_session(self) -> None:
+        '''
+        Save the session cookies to the store.
+        '''
+        
+        if self.store is None: return
+        
+        cookies = sessions.export_cookies(self.session.cookies)
+        self.store.save(self.username, cookies)
+    
+    def restore(self) -> bool:
+        '''
+        Attempts to reuse the session saved in the store.
+        Returns whether the session is still valid.
+        '''
+        
+        if self.store is None: return False
+        
+        cookies = self.store.load(self.username)
+        if not cookies: return False
+        
+        sessions.import_cookies(self.session.cookies, cookies)
+        
+        # Cheap authenticated call, the account app gets its data for free
+        try:
+            if self.session.cookies.get('XSRF-TOKEN'):
+                self.account.refresh()
+                return True
+        
+        except (ConnectionError, ValueError):
+            pass
+        
+        # Session was rejected
+        self.session.cookies.clear()
+        self.store.delete(self.username)
+        return False
 
 # EOF
\ No newline at end of file
@@ -0,0 +1,257 @@
+'''
+Request metrics, exportable to Prometheus.
+'''
+
+import re
+import bisect
+import threading
+from functools import lru_cache
+from urllib.parse import urlencode
+from collections import Counter
+from dataclasses import dataclass, field
+
+import requests
+
+# Latency histogram upper bounds, in seconds
+buckets = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+# Path segments holding ids (numbers, hashes, uuids...)
+identifier = re.compile(r'\d+|[\da-fA-F-]{16,}|(?=.*\d)[\w-]{8,}')
+
+# Path segments holding an encoded folder path (e.g. zimbra/count/%2FInbox)
+folder = re.compile(r'.*%2F.*', re.IGNORECASE)
+
+
+@lru_cache(maxsize = 4096)
+def endpoint(path: str) -> str:
+    '''
+    Normalize a path into an endpoint name, without
+    query and with ids and folders replaced, e.g.
+    zimbra/message/{id} or zimbra/count/{folder}.
+    '''
+    
+    path = path.split('?')[0].strip('/')
+    
+    return '/'.join('{folder}' if folder.fullmatch(part)
+                    else '{id}' if identifier.fullmatch(part)
+                    else part
+                    for part in path.split('/'))
+
+def size(body: object) -> int:
+    '''
+    Get the length of a request body, if known.
+    '''
+    
+    # Form data
+    if isinstance(body, dict): return len(urlencode(body))
+    
+    try: return len(body)
+    except TypeError: return 0
+
+
+@dataclass
+class Series:
+    buckets: list[int]
+    count: int = 0
+    total: float = 0
+    sent: int = 0
+    received: int = 0
+    retries: int = 0
+    statuses: Counter = field(default_factory = Counter)
+    cache: Counter = field(default_factory = Counter)
+    
+    def quantile(self, q: float, bounds: tuple[float]) -> float | None:
+        '''
+        Estimate a latency quantile from the histogram.
+        '''
+        
+        if not self.count: return
+        
+        rank = q * self.count
+        seen, lower = 0, 0
+        
+        for bound, amount in zip(bounds, self.buckets):
+            if amount and seen + amount >= rank:
+                return lower + (bound - lower) * (rank - seen) / amount
+            
+            seen += amount
+            lower = bound
+        
+        # Slower than the last bucket
+        return bounds[-1]
+
+
+class Metrics:
+    
+    def __init__(self, bounds: tuple[float] = buckets) -> None:
+        '''
+        Represents a collector of per-endpoint request metrics:
+        latency histogram, statuses, bytes, retries and cache
+        outcomes. It is thread safe and can be shared between
+        clients.
+        
+        Arguments
+            bounds: Upper bounds of the latency histogram buckets.
+        '''
+        
+        self.bounds = tuple(bounds)
+        self.series: dict[tuple[str, str], Series] = {}
+        self.lock = threading.Lock()
+    
+    def _series(self, method: str, path: str) -> Series:
+        
+        key = (method, endpoint(path))
+        series = self.series.get(key)
+        
+        if series is None:
+            series = self.series[key] = Series([0] * (len(self.bounds) + 1))
+        
+        return series
+    
+    def request(self,
+                method: str,
+                path: str,
+                status: int,
+                elapsed: float,
+                sent: int = 0,
+                received: int = 0) -> None:
+        '''
+        Record a request sent to the server. Status is 0
+        if it failed without a response.
+        '''
+        
+        with self.lock:
+            series = self._series(method, path)
+            
+            series.count += 1
+            series.total += elapsed
+            series.buckets[bisect.bisect_left(self.bounds, elapsed)] += 1
+            series.statuses[status] += 1
+            series.sent += sent
+            series.received += received
+    
+    def response(self,
+                 method: str,
+                 path: str,
+                 response: requests.Response,
+                 elapsed: float,
+                 sent: int,
+                 streamed: bool = False) -> None:
+        '''
+        Record a request from its response. The size of
+        streamed bodies is taken from their headers.
+        '''
+        
+        received = (int(response.headers.get('Content-Length') or 0) if streamed
+                    else len(response.content))
+        
+        self.request(method, path, response.status_code, elapsed, sent, received)
+    
+    def retry(self, method: str, path: str) -> None:
+        '''
+        Record a retried request.
+        '''
+        
+        with self.lock:
+            self._series(method, path).retries += 1
+    
+    def cache(self, path: str, outcome: str) -> None:
+        '''
+        Record a cache lookup outcome (hit, miss or revalidated).
+        '''
+        
+        with self.lock:
+            self._series('GET', path).cache[outcome] += 1
+    
+    def reset(self) -> None:
+        '''
+        Forget all recorded metrics.
+        '''
+        
+        with self.lock:
+            self.series.clear()
+    
+    def snapshot(self) -> dict[str, dict]:
+        '''
+        Get the current metrics, keyed by 'METHOD endpoint'.
+        '''
+        
+        with self.lock:
+            return {
+                f'{method} {name}': dict(
+                    count = series.count,
+                    mean = series.total / series.count if series.count else None,
+                    p50 = series.quantile(.5, self.bounds),
+                    p90 = series.quantile(.9, self.bounds),
+                    p99 = series.quantile(.99, self.bounds),
+                    buckets = dict(zip((*self.bounds, float('inf')), series.buckets)),
+                    statuses = dict(series.statuses),
+                    sent = series.sent,
+                    received = series.received,
+                    retries = series.retries,
+                    cache = dict(series.cache)
+                )
+                for (method, name), series in sorted(self.series.items())
+            }
+    
+    def prometheus(self, prefix: str = 'ent') -> str:
+        '''
+        Export the metrics in the Prometheus text format.
+        '''
+        
+        def labels(**values) -> str:
+            return ','.join(f'{key}="{escape(value)}"' for key, value in values.items())
+        
+        def escape(value: object) -> str:
+            return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+        
+        families = {
+            'request_duration_seconds': ('histogram', 'Latency of the requests sent to the ENT.'),
+            'requests_total': ('counter', 'Requests sent to the ENT, by response status.'),
+            'request_bytes_total': ('counter', 'Bytes of request bodies.'),
+            'response_bytes_total': ('counter', 'Bytes of response bodies.'),
+            'retries_total': ('counter', 'Retried requests.'),
+            'cache_lookups_total': ('counter', 'Response cache lookups, by outcome.')
+        }
+        
+        samples = {name: [] for name in families}
+        
+        with self.lock:
+            for (method, name), series in sorted(self.series.items()):
+                base = labels(method = method, endpoint = name)
+                
+                if series.count:
+                    seen = 0
+                    for bound, amount in zip((*self.bounds, '+Inf'), series.buckets):
+                        seen += amount
+                        samples['request_duration_seconds'].append(
+                            f'{prefix}_request_duration_seconds_bucket{{{base},le="{bound}"}} {seen}')
+                    
+                    samples['request_duration_seconds'] += [
+                        f'{prefix}_request_duration_seconds_sum{{{base}}} {series.total}',
+                        f'{prefix}_request_duration_seconds_count{{{base}}} {series.count}'
+                    ]
+                    
+                    samples['request_bytes_total'].append(f'{prefix}_request_bytes_total{{{base}}} {series.sent}')
+                    samples['response_bytes_total'].append(f'{prefix}_response_bytes_total{{{base}}} {series.received}')
+                
+                for status, amount in sorted(series.statuses.items()):
+                    samples['requests_total'].append(
+                        f'{prefix}_requests_total{{{base},{labels(status = status)}}} {amount}')
+                
+                if series.retries:
+                    samples['retries_total'].append(f'{prefix}_retries_total{{{base}}} {series.retries}')
+                
+                for outcome, amount in sorted(series.cache.items()):
+                    samples['cache_lookups_total'].append(
+                        f'{prefix}_cache_lookups_total{{{base},{labels(outcome = outcome)}}} {amount}')
+        
+        lines = []
+        for name, (kind, help) in families.items():
+            lines += [f'# HELP {prefix}_{name} {help}',
+                      f'# TYPE {prefix}_{name} {kind}',
+                      *samples[name]]
+        
+        return '\n'.join(lines) + '\n'
+
+# EOF
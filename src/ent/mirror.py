@@ -0,0 +1,257 @@
+'''
+Local SQLite mirror of a mailbox.
+'''
+
+from __future__ import annotations
+
+import json
+import time
+import sqlite3
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+from ent.apps.mails import Folder, Mail
+
+if TYPE_CHECKING:
+    from ent.core import ENT as Core
+
+
+class MailMirror:
+    
+    schema = '''
+        CREATE TABLE IF NOT EXISTS folders (
+            id      INTEGER PRIMARY KEY,
+            path    TEXT UNIQUE,
+            name    TEXT,
+            parent  INTEGER,
+            unread  INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS mails (
+            id      INTEGER,
+            folder  TEXT,
+            date    INTEGER,
+            unread  INTEGER,
+            data    TEXT,
+            synced  REAL,
+            PRIMARY KEY (folder, id)
+        );
+        CREATE INDEX IF NOT EXISTS mails_date ON mails (folder, date);
+        CREATE TABLE IF NOT EXISTS bodies (
+            id      INTEGER PRIMARY KEY,
+            data    TEXT
+        );
+        CREATE TABLE IF NOT EXISTS state (
+            folder  TEXT PRIMARY KEY,
+            date    INTEGER,
+            id      INTEGER,
+            unread  INTEGER,
+            synced  REAL
+        );
+    '''
+    
+    def __init__(self, client: Core, path: str) -> None:
+        '''
+        Represents a local copy of the mail folders, mail
+        headers and (optionally) bodies of an account.
+
+        Arguments
+            client: ENT client to sync from.
+            path: Database file path.
+        '''
+        
+        self.client = client
+        self.db = sqlite3.connect(path)
+        
+        with self.db:
+            self.db.executescript(self.schema)
+    
+    def close(self) -> None:
+        '''
+        Close the database.
+        '''
+        
+        self.db.close()
+    
+    def sync(self,
+             folders: list[str] = None,
+             bodies: bool = False,
+             full: bool = False,
+             workers: int = 8) -> dict[str, int]:
+        '''
+        Fetch what changed since the last sync. Only mails
+        newer than each folder high-water mark are listed, and
+        unread flags are only refreshed when the folder unread
+        count changed.
+
+        Arguments
+            folders: Paths of the folders to sync (all by default).
+            bodies: Also fetch and store the content of new mails.
+            full: List whole folders and drop the mails that
+                  disappeared from the server.
+            workers: Maximum amount of parallel body fetches.
+
+        Returns the amount of new mails per folder path.
+        '''
+        
+        tree = self._sync_folders()
+        report = {}
+        
+        for folder in tree:
+            if folders is not None and folder.path not in folders: continue
+            
+            new = self._sync_folder(folder, full)
+            report[folder.path] = len(new)
+            
+            if bodies:
+                self._sync_bodies(new, workers)
+        
+        return report
+    
+    def _sync_folders(self) -> list[Folder]:
+        '''
+        Mirror the folder tree and drop the folders (and their
+        mails) that no longer exist.
+        '''
+        
+        flat: list[tuple[Folder, int]] = []
+        
+        def walk(folders: list[Folder], parent: int = None) -> None:
+            for folder in folders:
+                flat.append((folder, parent))
+                walk(folder.subfolders, folder.id)
+        
+        walk(self.client.mail.get_folders())
+        paths = [folder.path for folder, _ in flat]
+        
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO folders VALUES (?, ?, ?, ?, ?)',
+                                [(f.id, f.path, f.name, parent, f.unread) for f, parent in flat])
+            
+            marks = ','.join('?' * len(paths))
+            
+            for table in ('folders', 'mails', 'state'):
+                column = 'path' if table == 'folders' else 'folder'
+                self.db.execute(f'DELETE FROM {table} WHERE {column} NOT IN ({marks})', paths)
+            
+            self._collect_bodies()
+        
+        return [folder for folder, _ in flat]
+    
+    def _sync_folder(self, folder: Folder, full: bool) -> list[Mail]:
+        '''
+        Mirror the new mails of a folder.
+        '''
+        
+        now = time.time()
+        state = self.db.execute('SELECT date, id, unread FROM state WHERE folder = ?',
+                                (folder.path,)).fetchone()
+        
+        # Stop listing at the high-water mark (none for empty folders)
+        until = None
+        if state and state[0] is not None and not full:
+            mark = (state[0], state[1])
+            until = lambda mail: (mail.data['date'], mail.id) <= mark
+        
+        new = list(self.client.mail.iter_mails(folder = folder, until = until))
+        
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO mails VALUES (?, ?, ?, ?, ?, ?)',
+                                [(mail.id, folder.path, mail.data['date'], bool(mail.unread),
+                                  json.dumps(mail.data), now) for mail in new])
+            
+            if full:
+                self.db.execute('DELETE FROM mails WHERE folder = ? AND synced < ?',
+                                (folder.path, now))
+                self._collect_bodies()
+            
+            # Some mails were read or unread elsewhere
+            elif state and state[2] != folder.unread:
+                unread = [mail.id for mail in
+                          self.client.mail.iter_mails(unread = True, folder = folder)]
+                
+                marks = ','.join('?' * len(unread))
+                self.db.execute(f'UPDATE mails SET unread = id IN ({marks}) WHERE folder = ?',
+                                unread + [folder.path])
+            
+            # Move the high-water mark
+            top = self.db.execute('SELECT date, id FROM mails WHERE folder = ? '
+                                  'ORDER BY date DESC, id DESC LIMIT 1',
+                                  (folder.path,)).fetchone() or (None, None)
+            
+            self.db.execute('INSERT OR REPLACE INTO state VALUES (?, ?, ?, ?, ?)',
+                            (folder.path, *top, folder.unread, now))
+        
+        return new
+    
+    def _sync_bodies(self, mails: list[Mail], workers: int) -> None:
+        '''
+        Fetch and store the content of mails.
+        '''
+        
+        self.client.mail.fetch_contents(mails, workers)
+        
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO bodies VALUES (?, ?)',
+                                [(mail.id, json.dumps(mail.content_data))
+                                 for mail in mails if mail.content_data])
+    
+    def _collect_bodies(self) -> None:
+        '''
+        Drop bodies whose mail is gone.
+        '''
+        
+        self.db.execute('DELETE FROM bodies WHERE id NOT IN (SELECT id FROM mails)')
+    
+    def folders(self) -> list[Folder]:
+        '''
+        Get the mirrored folders, as a flat list.
+        '''
+        
+        return [Folder(parent = self.client.mail, id = id, path = path,
+                       name = name, unread = unread, subfolders = [])
+                for id, path, name, unread in
+                self.db.execute('SELECT id, path, name, unread FROM folders ORDER BY path')]
+    
+    def mails(self,
+              folder: Folder | str = None,
+              unread: bool = None,
+              since: datetime = None,
+              limit: int = None) -> list[Mail]:
+        '''
+        Query the mirrored mails, newest first. Mails whose body
+        was mirrored have their content available offline.
+        '''
+        
+        query = ('SELECT mails.data, mails.unread, bodies.data FROM mails '
+                 'LEFT JOIN bodies ON bodies.id = mails.id WHERE 1')
+        args = []
+        
+        if folder is not None:
+            query += ' AND folder = ?'
+            args.append(folder if isinstance(folder, str) else folder.path)
+        
+        if unread is not None:
+            query += ' AND unread = ?'
+            args.append(unread)
+        
+        if since is not None:
+            query += ' AND date >= ?'
+            args.append(since.timestamp() * 1000)
+        
+        query += ' ORDER BY date DESC, mails.id DESC'
+        
+        if limit is not None:
+            query += ' LIMIT ?'
+            args.append(limit)
+        
+        mails = []
+        for data, unread, body in self.db.execute(query, args):
+            mail = Mail.parse(json.loads(data), self.client)
+            mail.unread = bool(unread)
+            
+            if body: mail.content_data = json.loads(body)
+            mails.append(mail)
+        
+        return mails
+
+# EOF
\ No newline at end of file
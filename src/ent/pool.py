@@ -0,0 +1,296 @@
+'''
+Run operations across many ENT accounts at once.
+'''
+
+from __future__ import annotations
+
+import time
+import asyncio
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterable, Self
+
+from ent import utils
+from ent import sessions
+from ent.core import ENT
+from ent.cache import Cache
+from ent.throttle import TokenBucket
+
+
+@dataclass
+class Result:
+    username: str
+    value: Any = None
+    error: Exception = None
+    elapsed: float = 0
+    
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _call(username: str, client: ENT | Exception, operation: Callable,
+          args: tuple, kwargs: dict) -> Result:
+    '''
+    Run an operation on a client and wrap its outcome.
+    '''
+    
+    # Login failed
+    if isinstance(client, Exception):
+        return Result(username, error = client)
+    
+    start = time.perf_counter()
+    
+    try:
+        value = operation(client, *args, **kwargs)
+        return Result(username, value, elapsed = time.perf_counter() - start)
+    
+    except Exception as err:
+        return Result(username, error = err, elapsed = time.perf_counter() - start)
+
+# Per-process state of the process workers
+_worker: dict[str, Any] = {}
+
+def _init_worker(options: dict, rate: float, burst: int) -> None:
+    
+    _worker['clients'] = {}
+    _worker['options'] = options
+    _worker['limiter'] = None if rate is None else TokenBucket(rate, burst)
+
+def _run_worker(username: str, password: str, operation: Callable,
+                args: tuple, kwargs: dict) -> Result:
+    
+    clients = _worker['clients']
+    
+    if username not in clients:
+        try:
+            clients[username] = ENT(username, password, limiter = _worker['limiter'],
+                                    **_worker['options'])
+        
+        except Exception as err:
+            return Result(username, error = err)
+    
+    return _call(username, clients[username], operation, args, kwargs)
+
+
+class Pool:
+    
+    modes = ('threads', 'processes', 'asyncio')
+    
+    def __init__(self,
+                 accounts: dict[str, str] | Iterable[tuple[str, str]],
+                 workers: int = 16,
+                 mode: str = 'threads',
+                 rate: float = None,
+                 burst: int = None,
+                 store: sessions.SessionStore = None,
+                 cache: Cache = None,
+                 **options) -> None:
+        '''
+        Represents a set of ENT accounts to run operations on,
+        with bounded parallelism and a global rate limit.
+        
+        Arguments
+            accounts: Usernames and passwords.
+            workers: Maximum amount of accounts worked on at once.
+            mode: 'threads', 'processes' (CPU bound operations,
+                  which must then be picklable) or 'asyncio' (use
+                  astart and arun with async operations).
+            rate: Maximum requests per second, all accounts together.
+                  In processes mode, it is split between processes.
+            burst: Token bucket size (see TokenBucket).
+            store: Session store, so that sessions are restored
+                   instead of logging in again.
+            cache: Response cache shared by the clients. Not
+                   supported in processes mode (caches can not
+                   be pickled), where each worker process uses
+                   its own default cache.
+            options: Other client arguments (root, retry...).
+        '''
+        
+        assert mode in self.modes, f'Mode must be one of {self.modes}'
+        assert not (mode == 'processes' and cache is not None), \
+            'A cache can not be shared with worker processes'
+        
+        self.accounts = dict(accounts)
+        self.workers = workers
+        self.mode = mode
+        self.rate = rate
+        self.burst = burst
+        self.store = store
+        self.cache = cache
+        self.options = options
+        
+        self.limiter = None if rate is None else TokenBucket(rate, burst)
+        self.clients: dict[str, ENT | Exception] = {}
+        self.executor: ProcessPoolExecutor = None
+    
+    def __len__(self) -> int:
+        return len(self.accounts)
+    
+    def __enter__(self) -> Self:
+        self.start()
+        return self
+    
+    def __exit__(self, *_) -> None:
+        self.close()
+    
+    async def __aenter__(self) -> Self:
+        await self.astart()
+        return self
+    
+    async def __aexit__(self, *_) -> None:
+        await self.aclose()
+    
+    @property
+    def errors(self) -> dict[str, Exception]:
+        '''
+        Accounts that failed to login, and why.
+        '''
+        
+        return {username: client for username, client in self.clients.items()
+                if isinstance(client, Exception)}
+    
+    def _options(self) -> dict:
+        return dict(store = self.store, cache = self.cache, **self.options)
+    
+    def start(self) -> dict[str, Exception]:
+        '''
+        Login to (or restore) all accounts concurrently.
+        In processes mode, clients are built by the workers.
+        Returns the accounts that failed to login.
+        '''
+        
+        if self.mode == 'processes':
+            
+            # Each process gets its share of the global rate
+            share = None if self.rate is None else self.rate / self.workers
+            burst = None if self.burst is None else max(1, self.burst // self.workers)
+            
+            self.executor = ProcessPoolExecutor(self.workers, initializer = _init_worker,
+                                                initargs = (self._options(), share, burst))
+            return {}
+        
+        assert self.mode == 'threads', 'Use astart() in asyncio mode'
+        
+        todo = [username for username in self.accounts
+                if not isinstance(self.clients.get(username), ENT)]
+        
+        def login(username: str) -> ENT:
+            return ENT(username, self.accounts[username],
+                       limiter = self.limiter, **self._options())
+        
+        self.clients |= zip(todo, utils.bounded_map(login, todo, self.workers))
+        return self.errors
+    
+    def close(self) -> None:
+        '''
+        Stop the worker processes, if any.
+        '''
+        
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+    
+    def run(self, operation: Callable[..., Any], *args, **kwargs) -> dict[str, Result]:
+        '''
+        Call operation(client, *args, **kwargs) for every account.
+        Returns the result (or error) of each account.
+        '''
+        
+        if self.mode == 'processes':
+            if self.executor is None: self.start()
+            
+            futures = [self.executor.submit(_run_worker, username, password,
+                                            operation, args, kwargs)
+                       for username, password in self.accounts.items()]
+            
+            results = {}
+            
+            for username, future in zip(self.accounts, futures):
+                
+                # E.g. the returned value could not be pickled
+                try: results[username] = future.result()
+                except Exception as err: results[username] = Result(username, error = err)
+            
+            return results
+        
+        if not self.clients: self.start()
+        
+        results = utils.bounded_map(
+            lambda username: _call(username, self.clients[username], operation, args, kwargs),
+            self.accounts, self.workers
+        )
+        
+        return {result.username: result for result in results}
+    
+    async def astart(self) -> dict[str, Exception]:
+        '''
+        Login to (or restore) all accounts concurrently,
+        with async clients.
+        '''
+        
+        from ent.aio import AsyncENT
+        
+        assert self.mode == 'asyncio', 'Use start() in threads or processes mode'
+        
+        semaphore = asyncio.Semaphore(self.workers)
+        
+        async def login(username: str) -> AsyncENT | Exception:
+            async with semaphore:
+                client = None
+                
+                try:
+                    client = AsyncENT(username, self.accounts[username],
+                                      limiter = self.limiter, **self._options())
+                    await client.start()
+                    return client
+                
+                except Exception as err:
+                    if client is not None: await client.close()
+                    return err
+        
+        todo = [username for username in self.accounts
+                if username not in self.clients or username in self.errors]
+        
+        self.clients |= zip(todo, await asyncio.gather(*map(login, todo)))
+        return self.errors
+    
+    async def aclose(self) -> None:
+        '''
+        Close the async clients.
+        '''
+        
+        for client in self.clients.values():
+            if not isinstance(client, Exception): await client.close()
+        
+        self.clients.clear()
+    
+    async def arun(self, operation: Callable[..., Any], *args, **kwargs) -> dict[str, Result]:
+        '''
+        Await operation(client, *args, **kwargs) for every account.
+        Returns the result (or error) of each account.
+        '''
+        
+        if not self.clients: await self.astart()
+        
+        semaphore = asyncio.Semaphore(self.workers)
+        
+        async def call(username: str) -> Result:
+            client = self.clients[username]
+            if isinstance(client, Exception): return Result(username, error = client)
+            
+            async with semaphore:
+                start = time.perf_counter()
+                
+                try:
+                    value = await operation(client, *args, **kwargs)
+                    return Result(username, value, elapsed = time.perf_counter() - start)
+                
+                except Exception as err:
+                    return Result(username, error = err, elapsed = time.perf_counter() - start)
+        
+        results = await asyncio.gather(*map(call, self.accounts))
+        return {result.username: result for result in results}
+
+# EOF
@@ -0,0 +1,333 @@
+'''
+Capture of the ENT traffic, and offline replay.
+'''
+
+from __future__ import annotations
+
+import io
+import re
+import json
+import time
+import base64
+import threading
+from types import SimpleNamespace
+from typing import Callable, Iterator, TYPE_CHECKING
+from http.client import HTTPMessage
+from urllib.parse import parse_qsl, urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+from urllib3._collections import HTTPHeaderDict
+
+if TYPE_CHECKING:
+    from ent.core import ENT as Core
+
+# Headers and form fields never written to captures
+secret_headers = {'authorization', 'cookie', 'x-xsrf-token', 'proxy-authorization'}
+secret_fields = {'email', 'password', 'username', 'login'}
+
+# Headers describing the raw transfer, not the recorded body
+transfer_headers = {'content-encoding', 'transfer-encoding', 'content-length'}
+
+redacted = '<redacted>'
+cookie_value = re.compile(r'^([^=;]+)=[^;]*')
+
+
+def redact_body(body: object) -> str | None:
+    '''
+    Get a printable request body without credentials.
+    Streamed bodies (uploads) are not recorded.
+    '''
+    
+    if isinstance(body, bytes):
+        try: body = body.decode()
+        except UnicodeDecodeError: return
+    
+    if not isinstance(body, str): return
+    
+    # Form data (e.g. the login)
+    fields = parse_qsl(body, keep_blank_values = True)
+    if fields and '=' in body and not body.lstrip().startswith(('{', '[')):
+        return urlencode([(key, redacted if key.lower() in secret_fields else value)
+                          for key, value in fields])
+    
+    return body
+
+def encode_body(body: bytes) -> tuple[str, str]:
+    
+    try: return body.decode(), 'utf-8'
+    except UnicodeDecodeError: return base64.b64encode(body).decode(), 'base64'
+
+def decode_body(body: str, encoding: str) -> bytes:
+    return base64.b64decode(body) if encoding == 'base64' else body.encode()
+
+
+class Recorder:
+    
+    def __init__(self, path: str) -> None:
+        '''
+        Represents a capture of request/response pairs, written
+        to a JSON lines file. Credentials, cookies and XSRF
+        tokens are redacted; cookie names are kept so that
+        replayed logins still work.
+        
+        Arguments
+            path: File to write the capture to (overwritten).
+        '''
+        
+        self.path = path
+        self.file = None
+        self.root = None
+        self.start = None
+        self.lock = threading.Lock()
+    
+    def __enter__(self) -> Recorder:
+        return self
+    
+    def __exit__(self, *_) -> None:
+        self.close()
+    
+    def close(self) -> None:
+        
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+    
+    def record(self, root: str, response: requests.Response, elapsed: float,
+               streamed: bool = False) -> None:
+        '''
+        Record a response, with the redirects that led to it.
+        The body of a streamed response is recorded as it is
+        read, once it is exhausted or closed.
+        '''
+        
+        hops = [*response.history, response]
+        
+        # Redirects have their own timing, the rest is the final response
+        times = [hop.elapsed.total_seconds() for hop in response.history]
+        times.append(max(0, elapsed - sum(times)))
+        
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, 'w', encoding = 'utf-8')
+                self.root, self.start = root, time.time()
+                self.file.write(json.dumps({'version': 1, 'root': root}) + '\n')
+            
+            offset = round(time.time() - self.start, 6)
+        
+        if streamed:
+            hops.pop()
+            
+            def done(body: bytes) -> None:
+                self._write([self._exchange(root, response, times[-1], body, offset)])
+            
+            response.raw = Tee(response.raw, done)
+        
+        self._write([self._exchange(root, hop, duration, hop.content, offset)
+                     for hop, duration in zip(hops, times)])
+    
+    def _write(self, lines: list[dict]) -> None:
+        
+        with self.lock:
+            if self.file is None: return # Closed
+            
+            for line in lines:
+                self.file.write(json.dumps(line) + '\n')
+            
+            self.file.flush()
+    
+    def _exchange(self, root: str, hop: requests.Response, elapsed: float,
+                  content: bytes, offset: float) -> dict:
+        
+        request = hop.request
+        url = request.url.removeprefix(root)
+        
+        raw = getattr(hop.raw, 'headers', None)
+        pairs = list((raw or hop.headers).items())
+        
+        body, encoding = encode_body(content)
+        
+        return dict(
+            method = request.method,
+            url = url,
+            request = dict(
+                headers = {key: redacted if key.lower() in secret_headers else value
+                           for key, value in request.headers.items()},
+                body = redact_body(request.body)
+            ),
+            status = hop.status_code,
+            reason = hop.reason,
+            headers = [[key, cookie_value.sub(rf'\1={redacted}', value)
+                        if key.lower() == 'set-cookie' else value]
+                       for key, value in pairs if key.lower() not in transfer_headers],
+            body = body,
+            encoding = encoding,
+            elapsed = round(elapsed, 6),
+            offset = offset
+        )
+
+
+class Tee:
+    
+    def __init__(self, raw: HTTPResponse, done: Callable[[bytes], None]) -> None:
+        '''
+        Represents a streamed response body that keeps a copy
+        of what is read from it, and hands it to done once
+        exhausted or closed (partial reads are kept as is).
+        Other attributes are those of the wrapped response.
+        '''
+        
+        object.__setattr__(self, 'raw', raw)
+        object.__setattr__(self, 'done', done)
+        object.__setattr__(self, 'body', bytearray())
+    
+    def __getattr__(self, name: str) -> object:
+        return getattr(self.raw, name)
+    
+    def __setattr__(self, name: str, value: object) -> None:
+        setattr(self.raw, name, value)
+    
+    def __enter__(self) -> Tee:
+        return self
+    
+    def __exit__(self, *_) -> None:
+        self.close()
+    
+    def read(self, amt: int = None, decode_content: bool = None, **kwargs) -> bytes:
+        
+        data = self.raw.read(amt, decode_content = decode_content, **kwargs)
+        
+        if self.body is not None:
+            self.body += data
+            if not data or amt is None: self.finish()
+        
+        return data
+    
+    def readinto(self, buffer: bytearray) -> int:
+        
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+    
+    def stream(self, amt: int = 2 ** 16, decode_content: bool = None) -> Iterator[bytes]:
+        
+        while data := self.read(amt, decode_content = decode_content):
+            yield data
+    
+    def close(self) -> None:
+        
+        self.finish()
+        self.raw.close()
+    
+    def finish(self) -> None:
+        
+        if self.body is not None:
+            body = bytes(self.body)
+            object.__setattr__(self, 'body', None)
+            self.done(body)
+
+
+class ReplayAdapter(HTTPAdapter):
+    
+    def __init__(self, path: str, speed: float | None = 1) -> None:
+        '''
+        Represents a requests transport serving a capture made
+        by a Recorder. Requests are matched by method and url;
+        repeated requests get the recorded responses in order,
+        then start over.
+        
+        Arguments
+            path: Capture file.
+            speed: Latency factor (1 for the recorded latency,
+                   2 twice faster...), or None to answer at once.
+        '''
+        
+        super().__init__()
+        
+        self.speed = speed
+        self.exchanges: dict[tuple[str, str], list[dict]] = {}
+        self.served: dict[tuple[str, str], int] = {}
+        self.lock = threading.Lock()
+        
+        with open(path, encoding = 'utf-8') as file:
+            header = json.loads(next(file))
+            self.root: str = header['root']
+            
+            for line in file:
+                exchange = json.loads(line)
+                self.exchanges.setdefault((exchange['method'], exchange['url']), []).append(exchange)
+    
+    def __len__(self) -> int:
+        return sum(map(len, self.exchanges.values()))
+    
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        
+        key = (request.method, request.url.removeprefix(self.root))
+        
+        with self.lock:
+            recorded = self.exchanges.get(key)
+            
+            if not recorded:
+                return self._response(request, dict(status = 404, reason = 'Not Recorded',
+                                                    headers = [], body = '', encoding = 'utf-8'))
+            
+            index = self.served.get(key, 0)
+            self.served[key] = index + 1
+            exchange = recorded[index % len(recorded)]
+        
+        if self.speed and exchange['elapsed']:
+            time.sleep(exchange['elapsed'] / self.speed)
+        
+        return self._response(request, exchange)
+    
+    def _response(self, request: requests.PreparedRequest, exchange: dict) -> requests.Response:
+        
+        body = decode_body(exchange['body'], exchange['encoding'])
+        headers = HTTPHeaderDict(exchange['headers'])
+        headers['Content-Length'] = str(len(body))
+        
+        # Cookie extraction reads the headers of the http.client response
+        message = HTTPMessage()
+        for key, value in headers.items(): message[key] = value
+        
+        raw = HTTPResponse(body = io.BytesIO(body),
+                           headers = headers,
+                           status = exchange['status'],
+                           reason = exchange['reason'],
+                           preload_content = False,
+                           decode_content = False,
+                           original_response = SimpleNamespace(msg = message,
+                                                                isclosed = lambda: True))
+        
+        return self.build_response(request, raw)
+
+
+def client(path: str, speed: float | None = 1, **options) -> Core:
+    '''
+    Build an ENT client that replays a capture, logged in
+    if the capture holds a login.
+    
+    Arguments
+        path: Capture file.
+        speed: See ReplayAdapter.
+        options: Other client arguments (cache, metrics...).
+    '''
+    
+    from ent.core import ENT
+    
+    adapter = ReplayAdapter(path, speed)
+    
+    client = ENT('replay', 'replay', login = False, root = adapter.root, **options)
+    client.session.mount(adapter.root, adapter)
+    
+    if ('POST', 'auth/login') in adapter.exchanges:
+        client.login()
+    
+    else:
+        client.session.cookies.set('XSRF-TOKEN', redacted)
+    
+    return client
+
+# EOF
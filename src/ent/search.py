@@ -0,0 +1,165 @@
+'''
+Local full-text search over mails.
+'''
+
+from __future__ import annotations
+
+import re
+import json
+import zlib
+import math
+import unicodedata
+from collections import Counter
+from typing import TYPE_CHECKING
+
+from ent import utils
+
+if TYPE_CHECKING:
+    from ent.apps.mails import Mail
+
+word = re.compile(r'\w+')
+
+# Weight of a term occurrence in each mail field
+weights = {'subject': 3, 'users': 2, 'body': 1}
+
+
+def tokenize(text: str) -> list[str]:
+    '''
+    Split a text in lowercase, accent-free terms.
+    '''
+    
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    
+    return word.findall(text)
+
+
+class MailIndex:
+    
+    # BM25 parameters
+    k1 = 1.2
+    b = 0.75
+    
+    def __init__(self) -> None:
+        '''
+        Represents an inverted index over mail subjects,
+        bodies and participants names.
+        '''
+        
+        self.postings: dict[str, dict[int, float]] = {}
+        self.lengths: dict[int, float] = {}
+        self.terms: dict[int, list[str]] = {}
+        self.total = 0
+    
+    def __len__(self) -> int:
+        return len(self.lengths)
+    
+    def __contains__(self, id: int) -> bool:
+        return id in self.lengths
+    
+    def add(self, mail: Mail) -> None:
+        '''
+        Index a mail (or re-index it). Its body is only indexed
+        if its content was fetched.
+        '''
+        
+        self.remove(mail.id)
+        
+        users = [mail.user.sender, *mail.user.to, *mail.user.cc, *mail.user.bcc]
+        body = (mail.content_data or {}).get('body') or ''
+        
+        fields = {
+            'subject': mail.subject or '',
+            'users': ' '.join(user.name or '' for user in users if user),
+            'body': utils.strip_html(body)
+        }
+        
+        terms = Counter()
+        for field, text in fields.items():
+            for term in tokenize(text):
+                terms[term] += weights[field]
+        
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[mail.id] = tf
+        
+        self.terms[mail.id] = list(terms)
+        self.lengths[mail.id] = length = sum(terms.values())
+        self.total += length
+    
+    def update(self, mails: list[Mail]) -> None:
+        '''
+        Index many mails.
+        '''
+        
+        for mail in mails: self.add(mail)
+    
+    def remove(self, id: int) -> None:
+        '''
+        Remove a mail from the index.
+        '''
+        
+        if id not in self.lengths: return
+        
+        self.total -= self.lengths.pop(id)
+        
+        for term in self.terms.pop(id):
+            del self.postings[term][id]
+            if not self.postings[term]: del self.postings[term]
+    
+    def search(self, query: str, limit: int = 10) -> list[tuple[int, float]]:
+        '''
+        Get the ids of the mails best matching a query,
+        with their score, best first.
+        '''
+        
+        if not self.lengths: return []
+        
+        count = len(self.lengths)
+        average = self.total / count
+        scores = Counter()
+        
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs: continue
+            
+            idf = math.log(1 + (count - len(docs) + .5) / (len(docs) + .5))
+            
+            for id, tf in docs.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[id] / average)
+                scores[id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        
+        return scores.most_common(limit)
+    
+    def save(self, path: str) -> None:
+        '''
+        Save the index to a compressed file.
+        '''
+        
+        data = json.dumps({'postings': self.postings, 'lengths': self.lengths},
+                          separators = (',', ':'))
+        
+        with open(path, 'wb') as file:
+            file.write(zlib.compress(data.encode(), 6))
+    
+    @classmethod
+    def load(cls, path: str) -> MailIndex:
+        '''
+        Load an index saved with save().
+        '''
+        
+        with open(path, 'rb') as file:
+            data = json.loads(zlib.decompress(file.read()))
+        
+        index = cls()
+        index.postings = {term: {int(id): tf for id, tf in docs.items()}
+                          for term, docs in data['postings'].items()}
+        index.lengths = {int(id): length for id, length in data['lengths'].items()}
+        index.total = sum(index.lengths.values())
+        
+        for term, docs in index.postings.items():
+            for id in docs:
+                index.terms.setdefault(id, []).append(term)
+        
+        return index
+
+# EOF
\ No newline at end of file
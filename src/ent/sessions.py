@@ -0,0 +1,115 @@
+'''
+Persistence of authenticated sessions.
+'''
+
+import os
+import json
+import hashlib
+import tempfile
+
+from requests.cookies import RequestsCookieJar, create_cookie
+
+
+def export_cookies(jar: RequestsCookieJar) -> list[dict]:
+    '''
+    Dump a cookie jar to a list of serializable dicts.
+    '''
+    
+    return [
+        dict(name = cookie.name,
+             value = cookie.value,
+             domain = cookie.domain,
+             path = cookie.path,
+             expires = cookie.expires,
+             secure = cookie.secure,
+             rest = {'HttpOnly': None} if cookie.has_nonstandard_attr('HttpOnly') else {})
+        for cookie in jar
+    ]
+
+def import_cookies(jar: RequestsCookieJar, cookies: list[dict]) -> None:
+    '''
+    Load cookies dumped with export_cookies into a jar.
+    '''
+    
+    for data in cookies:
+        jar.set_cookie(create_cookie(**data))
+
+
+class SessionStore:
+    '''
+    Storage interface for session cookies, keyed by username.
+    '''
+    
+    def load(self, username: str) -> list[dict] | None:
+        '''
+        Get the stored cookies of an account.
+        '''
+        
+        raise NotImplementedError
+    
+    def save(self, username: str, cookies: list[dict]) -> None:
+        '''
+        Store the cookies of an account.
+        '''
+        
+        raise NotImplementedError
+    
+    def delete(self, username: str) -> None:
+        '''
+        Forget the session of an account.
+        '''
+        
+        raise NotImplementedError
+
+
+class FileStore(SessionStore):
+    
+    def __init__(self, path: str) -> None:
+        '''
+        Represents a session storage in a directory, one
+        file per account. Files are only readable by
+        their owner.
+        '''
+        
+        self.path = path
+        os.makedirs(path, exist_ok = True)
+    
+    def file(self, username: str) -> str:
+        '''
+        Get the path of the file of an account.
+        '''
+        
+        name = hashlib.sha1(username.encode()).hexdigest()
+        return os.path.join(self.path, name + '.json')
+    
+    def load(self, username: str) -> list[dict] | None:
+        
+        try:
+            with open(self.file(username)) as file:
+                return json.load(file)
+        
+        except (OSError, ValueError):
+            return
+    
+    def save(self, username: str, cookies: list[dict]) -> None:
+        
+        # Write to a temporary file then swap, so that concurrent
+        # workers never read half a session
+        fd, temp = tempfile.mkstemp(dir = self.path, suffix = '.tmp')
+        
+        try:
+            with os.fdopen(fd, 'w') as file:
+                json.dump(cookies, file)
+            
+            os.replace(temp, self.file(username))
+        
+        except BaseException:
+            os.remove(temp)
+            raise
+    
+    def delete(self, username: str) -> None:
+        
+        try: os.remove(self.file(username))
+        except FileNotFoundError: pass
+
+# EOF
\ No newline at end of file
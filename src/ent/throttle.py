@@ -0,0 +1,129 @@
+'''
+Retries and client-side rate limiting.
+'''
+
+import time
+import random
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+
+
+class RetryPolicy:
+    
+    def __init__(self,
+                 attempts: int = 3,
+                 backoff: float = .5,
+                 max_delay: float = 30,
+                 statuses: tuple[int] = (429, 500, 502, 503, 504),
+                 methods: tuple[str] = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')) -> None:
+        '''
+        Represents when and how long to wait before retrying
+        a failed request. Only idempotent methods are retried,
+        after a jittered exponential backoff or the delay the
+        server asked for with Retry-After.
+        
+        Arguments
+            attempts: Maximum amount of retries (0 disables them).
+            backoff: Base delay, doubled on each retry.
+            max_delay: Maximum delay. Requests the server asks
+                       to delay for longer are not retried.
+            statuses: Response codes worth retrying.
+            methods: Methods safe to send twice.
+        '''
+        
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.statuses = set(statuses)
+        self.methods = set(methods)
+    
+    def wait(self,
+             method: str,
+             attempt: int,
+             response: requests.Response = None) -> float | None:
+        '''
+        Get the delay before retrying a request that failed
+        with a response, or with no response at all (network
+        error). Returns None if it should not be retried.
+        '''
+        
+        if attempt >= self.attempts or method.upper() not in self.methods:
+            return
+        
+        if response is not None:
+            if response.status_code not in self.statuses: return
+            
+            delay = retry_after(response.headers.get('Retry-After'))
+            
+            if delay is not None:
+                return delay if delay <= self.max_delay else None
+        
+        # Full jitter, so that parallel clients spread their retries
+        return random.uniform(0, min(self.max_delay, self.backoff * 2 ** attempt))
+
+def retry_after(raw: str | None) -> float | None:
+    '''
+    Parse a Retry-After header (seconds or HTTP date).
+    '''
+    
+    if not raw: return
+    
+    try: return max(0, float(raw))
+    except ValueError: pass
+    
+    try:
+        date = parsedate_to_datetime(raw)
+        return max(0, (date - datetime.now(timezone.utc)).total_seconds())
+    
+    except (TypeError, ValueError):
+        pass
+
+
+class TokenBucket:
+    
+    def __init__(self, rate: float, burst: int = None) -> None:
+        '''
+        Represents a token bucket rate limiter. It is thread
+        safe and can be shared between clients (sync and async)
+        to limit their combined rate.
+        
+        Arguments
+            rate: Sustained amount of requests per second.
+            burst: Amount of requests that can be sent at once
+                   after idling (defaults to rate, at least 1).
+        '''
+        
+        self.rate = rate
+        self.burst = max(1, rate) if burst is None else burst
+        
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def reserve(self, tokens: float = 1) -> float:
+        '''
+        Take tokens from the bucket, going in debt if needed.
+        Returns how long to wait before using them.
+        '''
+        
+        with self.lock:
+            now = time.monotonic()
+            
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            
+            return max(0, -self.tokens / self.rate)
+    
+    def acquire(self, tokens: float = 1) -> None:
+        '''
+        Wait until tokens are available and take them.
+        '''
+        
+        delay = self.reserve(tokens)
+        if delay: time.sleep(delay)
+
+# EOF
@@ -0,0 +1,250 @@
+'''
+Streaming file transfers.
+'''
+
+from __future__ import annotations
+
+import os
+import hashlib
+from typing import IO, Callable, Iterator, TYPE_CHECKING
+
+from ent import utils
+
+if TYPE_CHECKING:
+    import requests
+    from ent.core import ENT as Core
+
+# Progress callback, called with (done, total) bytes. Total can be None.
+Progress = Callable[[int, int | None], None]
+
+chunk_size = 256 * 1024
+
+
+def target(path: str, name: str) -> str:
+    '''
+    Get the file path to download to. If path is a
+    directory, the file keeps its name.
+    '''
+    
+    return os.path.join(path, name) if os.path.isdir(path) else path
+
+def open_stream(client: Core, url: str, complete_path: bool = True) -> IO[bytes]:
+    '''
+    Open a remote file as a readable binary stream.
+    '''
+    
+    response = client.get(url, cache = False, complete_path = complete_path, stream = True)
+    
+    response.raw.decode_content = True
+    return response.raw
+
+def range_start(header: str | None) -> int | None:
+    '''
+    Get the first byte position of a Content-Range header.
+    '''
+    
+    try: return int(header.split()[1].split('-')[0])
+    except (AttributeError, IndexError, ValueError): return None
+
+def response_validator(response: requests.Response) -> str | None:
+    '''
+    Get the validator to resume a download with (If-Range
+    needs a strong ETag or a date).
+    '''
+    
+    etag = response.headers.get('ETag')
+    
+    if etag and not etag.startswith('W/'): return etag
+    return response.headers.get('Last-Modified')
+
+def resume_request(path: str, resume: bool = True) -> tuple[int, dict]:
+    '''
+    Get the offset to resume the download of a file at (0 to
+    start over) and the headers to request the rest with.
+    '''
+    
+    temp = path + '.part'
+    tag = temp + '.tag'
+    
+    offset = os.path.getsize(temp) if resume and os.path.exists(temp) else 0
+    validator = None
+    
+    if offset and os.path.exists(tag):
+        with open(tag) as file:
+            validator = file.read().strip()
+    
+    # Without a validator, the partial file may be from another version
+    if not validator: offset = 0
+    
+    # Ranges apply to the body as sent, so it must not be compressed
+    headers = {'Accept-Encoding': 'identity'}
+    
+    if offset:
+        headers |= {'Range': f'bytes={offset}-', 'If-Range': validator}
+    
+    return offset, headers
+
+def resume_response(path: str, offset: int, response: requests.Response, digest) -> int | None:
+    '''
+    Check a download response against the partial file, and
+    feed the digest with the bytes that are kept. Returns the
+    offset to write the body at, or None to start over.
+    '''
+    
+    temp = path + '.part'
+    tag = temp + '.tag'
+    
+    if response.status_code == 206:
+        
+        # Not the range we asked for, start over
+        if range_start(response.headers.get('Content-Range')) != offset: return
+    
+    # Server ignored the range (or the file changed), start over
+    else: offset = 0
+    
+    if offset:
+        with open(temp, 'rb') as file:
+            while chunk := file.read(chunk_size):
+                digest.update(chunk)
+    
+    else:
+        validator = response_validator(response)
+        
+        if validator:
+            with open(tag, 'w') as file: file.write(validator)
+        
+        elif os.path.exists(tag):
+            os.remove(tag)
+    
+    return offset
+
+def complete(path: str, digest) -> str:
+    '''
+    Move a fully downloaded file to its path. Returns the
+    hex digest of the file.
+    '''
+    
+    temp = path + '.part'
+    if os.path.exists(temp + '.tag'): os.remove(temp + '.tag')
+    
+    os.replace(temp, path)
+    return digest.hexdigest()
+
+def download(client: Core,
+             url: str,
+             path: str,
+             complete_path: bool = True,
+             resume: bool = True,
+             progress: Progress = None,
+             algorithm: str = 'sha256') -> str:
+    '''
+    Download a remote file chunk by chunk to a temporary
+    file, then move it to its path. An interrupted download
+    is resumed with a Range request if the server supports it
+    and the file did not change since (If-Range), and
+    restarted otherwise.
+
+    Returns the hex digest of the file.
+    '''
+    
+    digest = hashlib.new(algorithm)
+    offset, headers = resume_request(path, resume)
+    
+    try:
+        response = client.get(url, headers = headers, cache = False,
+                              complete_path = complete_path, stream = True)
+    
+    except ConnectionError as err:
+        
+        # Range not satisfiable, the partial file is stale or complete
+        if offset and getattr(err.args[-1], 'status_code', None) == 416:
+            return download(client, url, path, complete_path, False, progress, algorithm)
+        
+        raise
+    
+    with response:
+        offset = resume_response(path, offset, response, digest)
+        
+        if offset is None:
+            return download(client, url, path, complete_path, False, progress, algorithm)
+        
+        length = response.headers.get('Content-Length')
+        total = offset + int(length) if length else None
+        done = offset
+        
+        with open(path + '.part', 'ab' if offset else 'wb') as file:
+            for chunk in response.iter_content(chunk_size):
+                file.write(chunk)
+                digest.update(chunk)
+                
+                done += len(chunk)
+                if progress: progress(done, total)
+    
+    return complete(path, digest)
+
+
+class Multipart:
+    
+    def __init__(self,
+                 path: str,
+                 name: str = 'file',
+                 filename: str = None,
+                 content_type: str = 'application/octet-stream',
+                 fields: dict[str, str] = None,
+                 progress: Progress = None) -> None:
+        '''
+        Represents a multipart/form-data body holding a file,
+        generated chunk by chunk from the disk.
+        
+        Arguments
+            path: Path of the file to upload.
+            name: Name of the file field.
+            filename: Name of the file for the server.
+            content_type: MIME type of the file.
+            fields: Other form fields, sent after the file.
+            progress: Called with (sent, total) file bytes.
+        '''
+        
+        self.path = path
+        self.progress = progress
+        self.boundary = '-' * 27 + utils.gen_rack_boundary()
+        self.size = os.path.getsize(path)
+        
+        filename = (filename or utils.get_filename(path)).replace('"', '%22')
+        
+        self.head = (f'--{self.boundary}\r\n'
+                     f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: {content_type}\r\n\r\n').encode()
+        
+        self.tail = ''.join(f'\r\n--{self.boundary}\r\n'
+                            f'Content-Disposition: form-data; name="{key}"\r\n\r\n{value}'
+                            for key, value in (fields or {}).items())
+        
+        self.tail = (self.tail + f'\r\n--{self.boundary}--\r\n').encode()
+    
+    @property
+    def content_type(self) -> str:
+        '''
+        Content-Type header of the body.
+        '''
+        
+        return f'multipart/form-data; boundary={self.boundary}'
+    
+    def __len__(self) -> int:
+        return len(self.head) + self.size + len(self.tail)
+    
+    def __iter__(self) -> Iterator[bytes]:
+        
+        yield self.head
+        sent = 0
+        
+        with open(self.path, 'rb') as file:
+            while chunk := file.read(chunk_size):
+                yield chunk
+                
+                sent += len(chunk)
+                if self.progress: self.progress(sent, self.size)
+        
+        yield self.tail
+
+# EOF
\ No newline at end of file
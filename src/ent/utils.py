@@ -1,20 +1,51 @@
+import re
+import html
+import json
 import os.path
 from random import randint
 from datetime import datetime
+from typing import Any, Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+
+except ImportError:
+    orjson = None
+
+def loads(raw: bytes | str) -> Any:
+    '''
+    Decode a JSON document straight from bytes, with
+    orjson if it is installed or stdlib json otherwise.
+    '''
+    
+    if orjson is not None:
+        try: return orjson.loads(raw)
+        
+        # orjson is stricter (NaN, huge ints...), give stdlib a chance
+        except orjson.JSONDecodeError: pass
+    
+    return json.loads(raw)
 
 def try_parse_exercise_date(raw: str) -> datetime | None:
     
-    format_ = '%Y-%m-%dT%H:%M:%S.%f'
+    # ISO 8601, e.g. 2023-09-04T08:30:00.000
+    try: return datetime.fromisoformat(raw)
+    except (TypeError, ValueError): pass
+
+def try_parse_feed_date(raw: str | dict) -> datetime | None:
     
-    try: return datetime.strptime(raw, format_)
-    except: pass
+    # Extended JSON, e.g. {'$date': 1693816200000}
+    if isinstance(raw, dict): raw = raw.get('$date')
+    if isinstance(raw, int | float): return datetime.fromtimestamp(raw / 1000)
+    
+    return try_parse_exercise_date(raw)
 
 def try_parse_rack_date(raw: str) -> datetime | None:
     
-    format_ = '%Y-%m-%dT%H:%M%z'
-    
-    try: return datetime.strptime(raw, format_)
-    except: pass
+    # ISO 8601, e.g. 2023-09-04T08:30+0200
+    try: return datetime.fromisoformat(raw)
+    except (TypeError, ValueError): pass
 
 def gen_rack_boundary(length = 30) -> str:
     '''
@@ -36,12 +67,36 @@ def build_feed_filters(filters: dict[str, str | list[str]]) -> str:
     Build an appendable feed string filter. 
     '''
     
-    args = list(filters.items())
+    args = []
+    
+    for name, value in filters.items():
+        if not isinstance(value, list | tuple):
+            value = [value]
+        
+        args += [f'{name}={v}' for v in value]
+    
+    return '?' + '&'.join(args) if args else ''
+
+def strip_html(raw: str) -> str:
+    '''
+    Get the text of an HTML document.
+    '''
+    
+    raw = re.sub(r'(?is)<(script|style).*?</\1>', ' ', raw)
+    return html.unescape(re.sub(r'<[^>]+>', ' ', raw))
+
+def bounded_map(func: Callable, items: Iterable, workers: int = 8) -> list[Any | Exception]:
+    '''
+    Call a function on items with at most `workers` calls
+    running at once. Results keep the items order; failed
+    calls give their exception instead of aborting the batch.
+    '''
     
-    for i, arg in enumerate(args):
-        if not isinstance(arg, list | tuple):
-            args[i][1] = [arg]
+    def call(item):
+        try: return func(item)
+        except Exception as err: return err
     
-    return ''.join(f'&{name}={value}' for name, value in args)
+    with ThreadPoolExecutor(workers) as pool:
+        return list(pool.map(call, items))
 
 # EOF
\ No newline at end of file
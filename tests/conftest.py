@@ -0,0 +1,36 @@
+'''
+Shared fixtures: a local stub of the ENT (see benchmarks/server.py)
+and clients of it.
+'''
+
+import asyncio
+
+import pytest
+
+import ent
+from ent.cache import Cache
+from server import StubENT
+
+
+@pytest.fixture
+def stub():
+    with StubENT(size = 10, mailbox = 35) as stub:
+        yield stub
+
+@pytest.fixture
+def client(stub):
+    return ent.ENT('user@example.org', 'password', root = stub.root)
+
+@pytest.fixture
+def uncached(stub):
+    return ent.ENT('user@example.org', 'password', root = stub.root, cache = Cache(policy = {}))
+
+@pytest.fixture
+def run():
+    '''
+    Run a coroutine to completion (no pytest-asyncio needed).
+    '''
+    
+    return asyncio.run
+
+# EOF
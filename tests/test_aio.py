@@ -0,0 +1,180 @@
+'''
+Async client against the stub ENT.
+'''
+
+import os
+import warnings
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+from ent import aio
+from ent.aio import AsyncENT
+from ent.apps.base import User
+
+import payloads
+
+
+@pytest.fixture(autouse = True)
+def strict():
+    
+    # Un-awaited coroutines are bugs
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', RuntimeWarning)
+        yield
+
+def session(stub) -> AsyncENT:
+    return AsyncENT('user@example.org', 'password', root = stub.root)
+
+def test_login(stub, run):
+    
+    async def main():
+        async with session(stub) as client:
+            return client.xsrf, (await client.account.user).id
+    
+    assert run(main()) == ('token', payloads.uid(0))
+
+def test_get_mails(stub, run):
+    
+    async def main():
+        async with session(stub) as client:
+            mails = await client.mail.get_mails(limit = 20)
+            return mails, await client.mail.fetch(mails[4])
+    
+    mails, mail = run(main())
+    assert [mail.id for mail in mails] == list(range(20))
+    assert mail is mails[4] and mail.content_data['id'] == '4'
+
+@pytest.mark.parametrize('workers', [2, 8])
+def test_get_mails_stops_at_short_page(stub, run, workers):
+    pages = []
+    
+    async def main():
+        async with session(stub) as client:
+            get_json = client.get_json
+            
+            async def spy(path, *args, **kwargs):
+                if path.startswith('zimbra/list'): pages.append(path)
+                return await get_json(path, *args, **kwargs)
+            
+            client.get_json = spy
+            return await client.mail.get_mails(limit = 100, workers = workers)
+    
+    # The mailbox holds 35 mails, its 4th page is short
+    assert [mail.id for mail in run(main())] == list(range(35))
+    assert len(pages) == (4 if workers == 2 else 8)
+
+def test_get_mails_with_content(stub, run):
+    
+    async def main():
+        async with session(stub) as client:
+            folder = (await client.mail.get_folders())[0]
+            return await folder.get_mails(limit = 20, workers = 2, with_content = True)
+    
+    mails = run(main())
+    assert [mail.id for mail in mails] == list(range(20))
+    assert all(mail.content_data['id'] == str(mail.id) for mail in mails)
+
+def test_fetch_contents(stub, run):
+    
+    async def main():
+        async with session(stub) as client:
+            mails = await client.mail.get_mails(limit = 10)
+            return mails, await client.mail.fetch_contents(mails)
+    
+    mails, errors = run(main())
+    assert errors == {}
+    assert mails[4].content_data['id'] == '4'
+
+def test_iter_mails(stub, run):
+    
+    async def main():
+        async with session(stub) as client:
+            return [mail.id async for mail in client.mail.iter_mails(limit = 25)]
+    
+    assert run(main()) == list(range(25))
+
+def test_userbook_fetch_many(stub, run):
+    
+    async def main():
+        async with session(stub) as client:
+            users = [client.users.get('user-1', 'A'), client.users.get('user-1', 'A bis'),
+                     client.users.get('user-2', 'B'), client.users.get('ghost', 'C')]
+            return users, await client.userbook.fetch_many(users)
+    
+    users, errors = run(main())
+    assert list(errors) == ['ghost']
+    assert users[1].userbook.motto == 'Carpe diem'
+
+def test_records(stub, run):
+    sent = []
+    
+    async def main():
+        async with session(stub) as client:
+            async def send(mail): sent.append(mail)
+            client.mail.send = send
+            
+            mail = (await client.mail.get_mails(limit = 10))[3]
+            content, attachments = await mail.content, await mail.attachments
+            await mail.transfer(client.users.get(payloads.uid(1)))
+            
+            racks = await client.rack.get_rack()
+            return mail, content, attachments, racks, await client.users.get('user-1').book
+    
+    mail, content, attachments, racks, book = run(main())
+    
+    assert isinstance(mail, aio.Mail) and mail.content_data['id'] == '3'
+    assert content == mail.content_data['body'] and sent[0].content == content
+    assert isinstance(attachments[0], aio.Attachment) and attachments[0].name == 'compte_rendu.pdf'
+    assert isinstance(racks[0].file, aio.RacKFile) and racks[0].file.name
+    assert book.motto == 'Carpe diem'
+
+def test_matches_sync_client(stub, client, run):
+    
+    async def main():
+        async with session(stub) as client:
+            return await client.rack.get_rack(), await client.mail.get_folders()
+    
+    racks, folders = run(main())
+    assert [rack.id for rack in racks] == [rack.id for rack in client.rack.get_rack()]
+    assert [folder.path for folder in folders] == [folder.path for folder in client.mail.get_folders()]
+
+def test_folder_index(stub, run):
+    
+    async def main():
+        async with session(stub) as client:
+            index = await client.mail.get_folder_index()
+            return index, await index.refresh_unread()
+    
+    index, errors = run(main())
+    assert len(index) == stub.size and errors == {}
+
+def test_rack_deposit_many(stub, run, tmp_path):
+    new = tmp_path / 'notes.txt'
+    new.write_bytes(os.urandom(2000))
+    
+    # Named and sized like a file the first user already holds
+    known = tmp_path / 'devoir_0.pdf'
+    known.write_bytes(os.urandom(120000))
+    
+    users = [User(payloads.uid(i), payloads.names[i]) for i in (0, 1)]
+    
+    async def main():
+        async with session(stub) as client:
+            return (await client.rack.deposit_many([str(new), str(known), str(new)], users,
+                                                   workers = 2, skip_existing = True,
+                                                   verify_hash = False),
+                    await client.rack.deposit_many([str(known)], users[0], skip_existing = True))
+    
+    results, checked = run(main())
+    
+    assert sorted((os.path.basename(r.path), r.user.id, r.status) for r in results) == [
+        ('devoir_0.pdf', payloads.uid(0), 'skipped'), ('devoir_0.pdf', payloads.uid(1), 'sent'),
+        ('notes.txt', payloads.uid(0), 'sent'), ('notes.txt', payloads.uid(0), 'skipped'),
+        ('notes.txt', payloads.uid(1), 'sent'), ('notes.txt', payloads.uid(1), 'skipped')]
+    
+    # The stub does not serve rack files, so the check fails
+    assert [r.status for r in checked] == ['failed'] and isinstance(checked[0].error, ConnectionError)
+
+# EOF
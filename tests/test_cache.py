@@ -0,0 +1,150 @@
+'''
+Response cache and its backends.
+'''
+
+import time
+
+import pytest
+import requests
+
+import ent
+from ent.cache import Cache, Entry, MemoryBackend, SQLiteBackend
+
+import payloads
+
+
+def entry(path: str = 'rack/list', body: bytes = b'[]', ttl: float = 60, **kwargs) -> Entry:
+    return Entry(path, 'http://ent/' + path, 200, body, time.time() + ttl, **kwargs)
+
+@pytest.fixture(params = ['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory': return MemoryBackend(max_entries = 3)
+    return SQLiteBackend(str(tmp_path / 'cache.db'), max_entries = 3)
+
+def test_roundtrip(backend):
+    backend.set('a', entry(body = b'hello', account = 'me'))
+    
+    got = backend.get('a')
+    assert (got.body, got.account, got.path) == (b'hello', 'me', 'rack/list')
+    assert backend.get('b') is None
+
+def test_evicts_least_recently_used(backend):
+    for key in 'abc': backend.set(key, entry())
+    if isinstance(backend, SQLiteBackend): backend.touch = 0
+    
+    backend.get('a')
+    backend.set('d', entry())
+    
+    assert backend.get('b') is None and backend.get('a') is not None
+    assert len(backend) == 3
+
+def test_bounded_size():
+    backend = MemoryBackend(max_bytes = 800)
+    for key in 'abc': backend.set(key, entry(body = b'x' * 90))
+    
+    # Too big to be cached at all
+    backend.set('d', entry(body = b'x' * 101))
+    
+    assert backend.get('d') is None
+    assert len(backend) == 3 and backend.size == 270
+
+def test_invalidate_prefix_and_account(backend):
+    backend.set('a', entry('rack/list', account = 'me'))
+    backend.set('b', entry('rack/list', account = 'other'))
+    backend.set('c', entry('zimbra/list', account = 'me'))
+    
+    backend.invalidate('rack', 'me')
+    
+    assert backend.get('a') is None
+    assert backend.get('b') is not None and backend.get('c') is not None
+
+def test_sqlite_hits_do_not_write(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'cache.db'), touch = 60)
+    backend.set('a', entry())
+    
+    used = backend.db.execute('SELECT used FROM entries').fetchone()[0]
+    backend.get('a')
+    
+    assert backend.db.execute('SELECT used FROM entries').fetchone()[0] == used
+
+def test_expired_entries():
+    cache = Cache(policy = {'rack': 10})
+    cache.set('a', entry(ttl = -1))
+    
+    assert cache.get('a') is None and len(cache) == 0
+    
+    # Kept when they can be revalidated
+    cache = Cache(policy = {'rack': 10}, revalidate = True)
+    cache.set('a', entry(ttl = -1, headers = {'ETag': '"v1"'}))
+    
+    assert cache.get('a').validators == {'If-None-Match': '"v1"'}
+
+def test_refresh():
+    cache = Cache(policy = {'rack': 10}, revalidate = True)
+    cache.set('a', stale := entry(ttl = -1, headers = {'ETag': '"v1"'}))
+    
+    response = requests.Response()
+    response.status_code = 304
+    response.headers['ETag'] = '"v2"'
+    cache.refresh('a', stale, response, 10)
+    
+    assert not cache.get('a').expired
+    assert stale.validators == {'If-None-Match': '"v2"'}
+    assert cache.stats['revalidated'] == 1 and cache.stats['bytes_saved'] == 2
+
+def test_endpoints_without_validators():
+    cache = Cache(policy = {'rack': 10}, revalidate = True)
+    cache.set('a', entry(ttl = -1))
+    
+    assert cache.get('a') is None and cache.conditional == {'rack': False}
+
+def test_policy():
+    cache = Cache(policy = {'zimbra': 1, 'zimbra/message/': 2})
+    
+    assert cache.ttl('zimbra/message/12') == 2
+    assert cache.ttl('zimbra/list') == 1
+    assert cache.ttl('rack/list') == 0
+
+def test_cache_hits(stub, client):
+    first = client.rack.get_rack()
+    stub.size = 3
+    
+    # Served from the cache, not by the stub
+    assert len(client.rack.get_rack()) == len(first) == 10
+
+def test_uncached(stub, uncached):
+    uncached.rack.get_rack()
+    stub.size = 3
+    
+    assert len(uncached.rack.get_rack()) == 3 and len(uncached.cache) == 0
+
+def test_shared_backend(stub, tmp_path):
+    cache = Cache(backend = SQLiteBackend(str(tmp_path / 'cache.db')))
+    
+    first = ent.ENT('user@example.org', 'password', root = stub.root, cache = cache)
+    first.rack.get_rack()
+    stub.size = 3
+    
+    # Entries are per account
+    second = ent.ENT('other@example.org', 'password', root = stub.root, cache = cache)
+    assert len(second.rack.get_rack()) == 3 and len(first.rack.get_rack()) == 10
+
+def test_post_invalidates_app_cache(stub, client):
+    client.rack.get_rack()
+    stub.size = 3
+    
+    client.get('rack', 'POST', data = 'file')
+    assert len(client.rack.get_rack()) == 3
+
+def test_deposit_invalidates_rack_cache(stub, client, tmp_path):
+    path = tmp_path / 'devoir.pdf'
+    path.write_bytes(b'%PDF' + bytes(1000))
+    
+    client.rack.get_rack()
+    stub.size = 3
+    
+    # Posted to rack?thumbnail=...
+    client.rack.deposit(client.users.get(payloads.uid(1), payloads.names[1]), str(path))
+    assert len(client.rack.get_rack()) == 3
+
+# EOF
@@ -0,0 +1,68 @@
+'''
+Pluggable JSON decoding.
+'''
+
+import json
+import math
+import types
+
+import pytest
+
+import ent
+from ent import utils
+
+
+@pytest.fixture
+def strict(monkeypatch):
+    '''
+    Stand in for orjson, which rejects NaN.
+    '''
+    
+    def loads(raw):
+        if b'NaN' in raw: raise ValueError('NaN')
+        return json.loads(raw)
+    
+    monkeypatch.setattr(utils, 'orjson', types.SimpleNamespace(loads = loads, JSONDecodeError = ValueError))
+
+def test_stdlib(monkeypatch):
+    monkeypatch.setattr(utils, 'orjson', None)
+    assert utils.loads(b'{"a": [1, "\xc3\xa9"]}') == {'a': [1, 'é']}
+
+def test_falls_back_to_stdlib(strict):
+    assert utils.loads(b'[1]') == [1]
+    assert math.isnan(utils.loads(b'[NaN]')[0])
+
+def test_orjson():
+    pytest.importorskip('orjson')
+    assert utils.loads(b'{"a": 1}') == {'a': 1} and math.isnan(utils.loads(b'[NaN]')[0])
+
+def test_custom_decoder(stub):
+    bodies = []
+    
+    def decoder(raw: bytes):
+        bodies.append(raw)
+        return json.loads(raw)
+    
+    client = ent.ENT('user@example.org', 'password', root = stub.root, decoder = decoder)
+    client.rack.get_rack()
+    client.mail.get_mails(limit = 10)
+    
+    assert len(bodies) == 2 and all(isinstance(body, bytes) for body in bodies)
+
+def test_async_custom_decoder(stub, run):
+    pytest.importorskip('aiohttp')
+    from ent.aio import AsyncENT
+    
+    bodies = []
+    
+    async def main():
+        async with AsyncENT('user@example.org', 'password', root = stub.root,
+                            decoder = lambda raw: bodies.append(raw) or json.loads(raw)) as client:
+            return await client.rack.get_rack(), await client.mail.get_folders()
+    
+    racks, folders = run(main())
+    
+    assert len(racks) == stub.size and folders
+    assert len(bodies) == 2 and all(isinstance(body, bytes) for body in bodies)
+
+# EOF
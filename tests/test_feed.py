@@ -0,0 +1,123 @@
+'''
+Feed watcher.
+'''
+
+import pytest
+
+import ent
+from ent.apps.feed import FeedWatcher
+
+import payloads
+
+
+@pytest.fixture
+def publish(stub, monkeypatch):
+    '''
+    Hold back the 2 newest notifications of the stub
+    feed, then call the fixture to publish them.
+    '''
+    
+    notification = payloads.notification
+    monkeypatch.setattr(payloads, 'notification', lambda i: notification(i + 2))
+    
+    def publish():
+        monkeypatch.setattr(payloads, 'notification', notification)
+        stub.payloads.clear()
+    
+    return publish
+
+def poll(watcher: FeedWatcher) -> list[tuple[str, str]]:
+    '''
+    Poll all accounts now, get the new (username, item id) pairs.
+    '''
+    
+    for cursor in watcher.cursors: cursor.due = 0
+    return [(client.username, feed.id) for client, feed in watcher.poll()]
+
+def test_only_new_items(client, publish):
+    watcher = FeedWatcher(client)
+    
+    assert poll(watcher) == [] and poll(watcher) == []
+    publish()
+    
+    assert poll(watcher) == [('user@example.org', payloads.notification(i)['_id']) for i in (0, 1)]
+    assert poll(watcher) == []
+
+def test_deleted_items_do_not_resurface(client, monkeypatch, stub):
+    watcher = FeedWatcher(client)
+    poll(watcher)
+    
+    # The newest item is deleted, an older one slides into the window
+    notification = payloads.notification
+    monkeypatch.setattr(payloads, 'notification', lambda i: notification(i + 1))
+    stub.payloads.clear()
+    
+    assert poll(watcher) == []
+    assert watcher.cursors[0].mark == (notification(0)['date']['$date'] / 1000, notification(0)['_id'])
+
+def test_undated_items(client, publish, monkeypatch):
+    notification = payloads.notification
+    monkeypatch.setattr(payloads, 'notification', lambda i: notification(i + 2) | {'date': None})
+    
+    watcher = FeedWatcher(client)
+    poll(watcher)
+    
+    publish()
+    monkeypatch.setattr(payloads, 'notification', lambda i: notification(i) | {'date': None})
+    
+    assert poll(watcher) == [('user@example.org', notification(i)['_id']) for i in (0, 1)]
+    assert watcher.cursors[0].mark is None
+
+def test_existing_items(stub, client):
+    assert len(poll(FeedWatcher(client, skip_existing = False))) == stub.size
+
+def test_many_accounts(stub, client, publish):
+    other = ent.ENT('other@example.org', 'password', root = stub.root)
+    watcher = FeedWatcher([client, other])
+    
+    poll(watcher)
+    publish()
+    
+    news = sorted(username for username, _ in poll(watcher))
+    assert news == ['other@example.org'] * 2 + ['user@example.org'] * 2
+
+def test_adaptive_interval(client, publish, monkeypatch):
+    watcher = FeedWatcher(client, min_interval = 1, max_interval = 5, backoff = 2)
+    cursor = watcher.cursors[0]
+    
+    intervals = []
+    for _ in range(4):
+        poll(watcher)
+        intervals.append(cursor.interval)
+    
+    publish()
+    poll(watcher)
+    assert intervals + [cursor.interval] == [2, 4, 5, 5, 1]
+    
+    # Failed polls are idle polls
+    monkeypatch.setattr(client.feed, 'fetch', lambda **_: 1 / 0)
+    assert poll(watcher) == [] and cursor.interval == 2
+
+def test_async_watcher(stub, client, publish, run):
+    pytest.importorskip('aiohttp')
+    from ent import aio
+    
+    async def main():
+        async with aio.AsyncENT('user@example.org', 'password', root = stub.root) as other:
+            
+            # Sync and async clients have their own watcher
+            with pytest.raises(TypeError): FeedWatcher(other)
+            with pytest.raises(TypeError): aio.FeedWatcher(client)
+            
+            watcher = aio.FeedWatcher(other)
+            with pytest.raises(TypeError): iter(watcher)
+            
+            await watcher.poll()
+            publish()
+            
+            watcher.cursors[0].due = 0
+            return [feed.id for _, feed in await watcher.poll()]
+    
+    assert run(main()) == [payloads.notification(i)['_id'] for i in (0, 1)]
+
+# EOF
@@ -0,0 +1,143 @@
+'''
+Mail listing, iteration and contents, folder discovery.
+'''
+
+import time
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qs
+
+import pytest
+
+import ent
+from ent import consts
+from ent.cache import Cache
+from ent.metrics import Metrics
+
+import payloads
+
+
+@pytest.fixture
+def pages(uncached, monkeypatch):
+    '''
+    Record the mail list pages requested by the client.
+    '''
+    
+    requested = []
+    get = uncached.get
+    
+    def spy(path, *args, **kwargs):
+        if path.startswith('zimbra/list'):
+            requested.append(int(parse_qs(urlsplit(path).query)['page'][0]))
+        
+        return get(path, *args, **kwargs)
+    
+    monkeypatch.setattr(uncached, 'get', spy)
+    return requested
+
+@pytest.mark.parametrize('workers', [1, 2, 8])
+def test_get_mails(uncached, pages, workers):
+    mails = uncached.mail.get_mails(limit = 100, workers = workers)
+    
+    # The mailbox holds 35 mails, its 4th page is short
+    assert [mail.id for mail in mails] == list(range(35))
+    assert mails[0].subject == payloads.mail(0)['subject']
+    assert sorted(pages)[:4] == [0, 1, 2, 3] and len(pages) <= max(4, workers)
+
+def test_get_mails_limit(uncached, pages):
+    assert len(uncached.mail.get_mails(limit = 20, workers = 4)) == 20
+    assert sorted(pages) == [0, 1]
+
+def test_folder_get_mails(uncached):
+    folder = uncached.mail.get_folders()[0]
+    assert len(folder.get_mails(limit = 15, workers = 2)) == 20
+
+def test_iter_mails_is_lazy(uncached, pages):
+    mails = uncached.mail.iter_mails()
+    
+    assert [next(mails).id for _ in range(10)] == list(range(10)) and pages == [0]
+    assert next(mails).id == 10 and pages == [0, 1]
+
+def test_iter_mails_stops(uncached, pages):
+    since = datetime.fromtimestamp(payloads.mail(14)['date'] / 1000)
+    
+    assert len(list(uncached.mail.iter_mails(limit = 12))) == 12
+    assert [mail.id for mail in uncached.mail.iter_mails(until = lambda mail: mail.id == 3)] == [0, 1, 2]
+    assert [mail.id for mail in uncached.mail.iter_mails(since = since)] == list(range(15))
+    
+    # Out of mails, without requesting a 5th page
+    assert len(list(uncached.mail.iter_mails())) == 35 and 4 not in pages
+
+def test_get_mails_with_content(uncached):
+    mails = uncached.mail.get_mails(limit = 10, workers = 2, with_content = True)
+    assert all(mail.content_data['id'] == str(mail.id) for mail in mails)
+
+def test_fetch_contents_errors(uncached, monkeypatch):
+    mails = uncached.mail.get_mails(limit = 20)
+    assert uncached.mail.fetch_contents(mails[:5]) == {}
+    
+    get = uncached.get
+    
+    def flaky(path, *args, **kwargs):
+        if path.endswith(('/7', '/12')): raise ConnectionError('Failed to send request')
+        return get(path, *args, **kwargs)
+    
+    # Fetched mails are skipped, failures don't stop the others
+    monkeypatch.setattr(uncached, 'get', flaky)
+    errors = uncached.mail.fetch_contents(mails, workers = 4)
+    
+    assert list(errors) == [7, 12] and isinstance(errors[7], ConnectionError)
+    assert sum(mail.content_data is None for mail in mails) == 2
+
+def paths(folders):
+    for folder in folders:
+        yield folder.path
+        yield from paths(folder.subfolders)
+
+@pytest.mark.parametrize('chunk', [1, 7, 4096, 1 << 20])
+def test_scan_matches_full_page(uncached, monkeypatch, chunk):
+    page = uncached.get('zimbra/zimbra').text
+    monkeypatch.setattr(consts, 'mail_scan_chunk', chunk)
+    
+    assert list(paths(uncached.mail.get_folders())) == list(paths(uncached.mail._parse_folders(page)))
+
+def test_folders_are_cached(stub, client):
+    folders = client.mail.get_folders()
+    stub.size = 3
+    
+    assert client.mail.get_folders() is folders
+    assert len(list(paths(client.mail.get_folders(refresh = True)))) == 3
+
+def test_folders_are_revalidated(stub):
+    metrics = Metrics()
+    cache = Cache(policy = {'zimbra/zimbra': .2}, revalidate = True)
+    client = ent.ENT('user@example.org', 'password', root = stub.root, cache = cache, metrics = metrics)
+    
+    folders = client.mail.get_folders()
+    assert client.mail.get_folders() is folders
+    
+    time.sleep(.25)
+    assert client.mail.get_folders() is folders
+    
+    series = metrics.snapshot()['GET zimbra/zimbra']
+    assert series['cache'] == {'miss': 1, 'hit': 1, 'revalidated': 1}
+    assert series['statuses'] == {200: 1, 304: 1}
+    assert cache.conditional.get('zimbra/zimbra', True)
+
+def test_folder_index(client):
+    index = client.mail.get_folder_index()
+    folder = index['/Inbox/Dossier 1/Dossier 6']
+    
+    assert len(index) == 10
+    assert index[folder.id] is folder
+    assert folder.path in index and folder.id in index and '/Nope' not in index
+    assert [parent.path for parent in index.ancestors(folder)] == ['/Inbox', '/Inbox/Dossier 1']
+    assert index.parent(index['/Inbox']) is None
+
+def test_refresh_unread(client):
+    index = client.mail.get_folder_index()
+    for folder in index: folder.unread = -1
+    
+    assert index.refresh_unread() == {}
+    assert all(folder.unread >= 0 for folder in index)
+
+# EOF
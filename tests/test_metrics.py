@@ -0,0 +1,61 @@
+'''
+Request metrics.
+'''
+
+import ent
+from ent.metrics import Metrics, endpoint
+
+
+def test_endpoint_names():
+    assert endpoint('zimbra/message/123') == 'zimbra/message/{id}'
+    assert endpoint('/rack/get/0000000000000000000000000000000a?thumbnail=1') == 'rack/get/{id}'
+    assert endpoint('userbook/api/person?id=user-1') == 'userbook/api/person'
+    assert endpoint('zimbra/list') == 'zimbra/list'
+    assert endpoint('zimbra/count/%2FInbox%2FCours') == 'zimbra/count/{folder}'
+
+def test_snapshot(stub):
+    metrics = Metrics()
+    client = ent.ENT('user@example.org', 'password', root = stub.root, metrics = metrics)
+    
+    first = client.rack.get_rack()
+    assert client.rack.get_rack() == first
+    client.mail.get_mails(limit = 20)[0].fetch()
+    
+    stub.failures = 1
+    client.retry.backoff = .01
+    client.get('flaky')
+    
+    snapshot = metrics.snapshot()
+    
+    assert snapshot['POST auth/login']['count'] == 1
+    assert snapshot['GET rack/list']['cache'] == {'miss': 1, 'hit': 1}
+    assert snapshot['GET rack/list']['count'] == 1 and snapshot['GET rack/list']['received'] > 0
+    assert snapshot['GET zimbra/message/{id}']['statuses'] == {200: 1}
+    assert snapshot['GET flaky']['statuses'] == {503: 1, 200: 1}
+    assert snapshot['GET flaky']['retries'] == 1
+
+def test_one_series_for_all_folders(stub):
+    metrics = Metrics()
+    client = ent.ENT('user@example.org', 'password', root = stub.root, metrics = metrics)
+    index = client.mail.get_folder_index()
+    index.refresh_unread()
+    
+    counts = [name for name in metrics.snapshot() if 'zimbra/count' in name]
+    assert counts == ['GET zimbra/count/{folder}']
+    assert metrics.snapshot()[counts[0]]['count'] == len(index)
+
+def test_prometheus(stub):
+    metrics = Metrics()
+    client = ent.ENT('user@example.org', 'password', root = stub.root, metrics = metrics)
+    client.mail.get_mails(limit = 20)
+    
+    text = metrics.prometheus('prefix')
+    
+    assert 'prefix_requests_total{method="GET",endpoint="zimbra/list",status="200"} 2' in text
+    assert 'prefix_request_duration_seconds_count{method="GET",endpoint="zimbra/list"} 2' in text
+    assert '# TYPE prefix_request_duration_seconds histogram' in text
+    
+    metrics.reset()
+    assert metrics.snapshot() == {}
+
+# EOF
@@ -0,0 +1,77 @@
+'''
+Local mailbox mirror.
+'''
+
+import pytest
+
+from ent.mirror import MailMirror
+
+import payloads
+
+
+@pytest.fixture
+def mirror(uncached, tmp_path):
+    mirror = MailMirror(uncached, str(tmp_path / 'mirror.db'))
+    yield mirror
+    mirror.close()
+
+@pytest.fixture
+def newer(stub, monkeypatch):
+    '''
+    Make the stub mailbox hold 5 mails less, then call
+    the fixture to receive those 5 newer mails.
+    '''
+    
+    mail = payloads.mail
+    monkeypatch.setattr(payloads, 'mail', lambda i: mail(i + 5))
+    stub.mailbox -= 5
+    
+    def receive():
+        monkeypatch.setattr(payloads, 'mail', mail)
+        stub.mailbox += 5
+        stub.payloads.clear()
+    
+    return receive
+
+def test_sync(stub, mirror):
+    report = mirror.sync(bodies = True)
+    
+    assert len(report) == stub.size and set(report.values()) == {35}
+    assert [folder.path for folder in mirror.folders()][:2] == ['/Inbox', '/Inbox/Dossier 1']
+    
+    mails = mirror.mails('/Inbox', limit = 10)
+    assert [mail.id for mail in mails] == list(range(10))
+    assert mails[3].content_data['id'] == '3'
+    assert len(mirror.mails(unread = True)) == 12 * stub.size
+
+def test_incremental_sync(stub, mirror, newer):
+    assert mirror.sync(['/Inbox']) == {'/Inbox': 30}
+    assert mirror.sync(['/Inbox']) == {'/Inbox': 0}
+    
+    newer()
+    
+    assert mirror.sync(['/Inbox'], bodies = True) == {'/Inbox': 5}
+    assert [mail.id for mail in mirror.mails('/Inbox')] == list(range(35))
+    
+    # Only the new mails had their body fetched
+    assert [mail.id for mail in mirror.mails('/Inbox') if mail.content_data] == list(range(5))
+
+def test_sync_empty_then_filled(stub, mirror):
+    stub.mailbox = 0
+    assert mirror.sync(['/Inbox']) == {'/Inbox': 0}
+    
+    stub.mailbox = 35
+    stub.payloads.clear()
+    
+    assert mirror.sync(['/Inbox']) == {'/Inbox': 35}
+    assert mirror.sync(['/Inbox']) == {'/Inbox': 0}
+
+def test_full_sync_drops_gone_mails(stub, mirror):
+    mirror.sync(['/Inbox'])
+    stub.mailbox = 20
+    stub.payloads.clear()
+    
+    assert mirror.sync(['/Inbox'], full = True) == {'/Inbox': 20}
+    assert len(mirror.mails()) == 20
+
+# EOF
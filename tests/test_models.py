@@ -0,0 +1,65 @@
+'''
+Lazily decoded records.
+'''
+
+from datetime import datetime
+
+import pytest
+
+from ent.apps.mails import Mail
+from ent.apps.rack import RacKFile
+
+import payloads
+
+
+@pytest.fixture
+def mail(client):
+    return Mail.parse(payloads.mail(12), client)
+
+def test_fields_are_decoded_on_access(mail):
+    assert not hasattr(mail, '_user')
+    
+    assert mail.id == 12 and mail.unread
+    assert mail.date == datetime.fromtimestamp(payloads.mail(12)['date'] / 1000)
+    assert mail.user.to[1].name == payloads.names[4]
+    
+    # Decoded once, then kept
+    assert mail.user is mail.user
+    assert mail._user is mail.user
+
+def test_fields_are_assignable(mail):
+    mail.unread = False
+    mail.subject = 'Lu'
+    
+    assert (mail.unread, mail.subject) == (False, 'Lu')
+    assert mail.data['unread'] is True
+
+def test_records_are_slotted(mail):
+    with pytest.raises(AttributeError):
+        mail.typo = 1
+    
+    assert not hasattr(mail, '__dict__')
+
+def test_equality_and_repr(client, mail):
+    assert mail == Mail.parse(payloads.mail(12), client) != Mail.parse(payloads.mail(13), client)
+    assert repr(mail).startswith("Mail(id=12, date=datetime.datetime(")
+
+def test_app_records(client):
+    rack, = [rack for rack in client.rack.get_rack() if rack.name == 'devoir_3.pdf']
+    exercise = client.exercises.get()[1]
+    feed = client.feed.fetch()[2]
+    
+    assert rack.date.isoformat() == '2023-09-04T08:30:00+02:00'
+    assert (rack.file.size, rack.sender.name) == (120003, payloads.names[3])
+    assert exercise.date.created == datetime(2023, 9, 4, 8, 30)
+    assert (exercise.owner.id, exercise.result.score) == (payloads.uid(1), 12.5)
+    assert feed.sender.name == payloads.names[2]
+    assert feed.date == datetime.fromtimestamp(payloads.notification(2)['date']['$date'] / 1000)
+
+def test_rack_file_positional_fields():
+    file = RacKFile('rack/get/1', 'application/pdf', 120003, 'utf-8')
+    
+    assert (file.url, file.type, file.size, file.charset) == ('rack/get/1', 'application/pdf', 120003, 'utf-8')
+    assert file.client is None and file.name is None
+
+# EOF
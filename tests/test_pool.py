@@ -0,0 +1,65 @@
+'''
+Operations across many accounts.
+'''
+
+import threading
+
+import pytest
+
+from ent.cache import Cache
+from ent.pool import Pool
+
+accounts = {f'user{i}@example.org': 'password' for i in range(4)}
+
+
+def count_racks(client) -> int:
+    return len(client.rack.get_rack())
+
+def unpicklable(client) -> object:
+    return threading.Lock() if client.username.startswith('user0') else 1
+
+def test_threads(stub):
+    with Pool(accounts, workers = 2, root = stub.root) as pool:
+        results = pool.run(count_racks)
+    
+    assert pool.errors == {}
+    assert {username: result.value for username, result in results.items()} == dict.fromkeys(accounts, stub.size)
+
+def test_errors_are_per_account(stub):
+    with Pool(accounts, workers = 2, root = stub.root) as pool:
+        results = pool.run(lambda client: 1 / int(client.username[4]))
+    
+    assert not results['user0@example.org'].ok
+    assert isinstance(results['user0@example.org'].error, ZeroDivisionError)
+    assert results['user2@example.org'].value == .5
+
+def test_processes(stub):
+    with Pool(accounts, workers = 2, mode = 'processes', root = stub.root) as pool:
+        results = pool.run(count_racks)
+    
+    assert [result.value for result in results.values()] == [stub.size] * 4
+
+def test_processes_keep_other_results(stub):
+    with Pool(accounts, workers = 2, mode = 'processes', root = stub.root) as pool:
+        results = pool.run(unpicklable)
+    
+    assert not results['user0@example.org'].ok
+    assert [result.value for result in results.values()][1:] == [1, 1, 1]
+
+def test_processes_reject_cache():
+    with pytest.raises(AssertionError):
+        Pool(accounts, mode = 'processes', cache = Cache())
+
+def test_asyncio(stub, run):
+    pytest.importorskip('aiohttp')
+    
+    async def racks(client):
+        return len(await client.rack.get_rack())
+    
+    async def main():
+        async with Pool(accounts, workers = 2, mode = 'asyncio', root = stub.root) as pool:
+            return await pool.arun(racks)
+    
+    assert [result.value for result in run(main()).values()] == [stub.size] * 4
+
+# EOF
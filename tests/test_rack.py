@@ -0,0 +1,60 @@
+'''
+Rack deposits.
+'''
+
+import os
+
+import pytest
+
+from ent.apps.base import User
+
+import payloads
+
+
+@pytest.fixture
+def files(tmp_path):
+    '''
+    A new file, and one with the name and size of a file
+    the stub rack already holds for the first user.
+    '''
+    
+    new = tmp_path / 'notes.txt'
+    new.write_bytes(os.urandom(2000))
+    
+    known = tmp_path / 'devoir_0.pdf'
+    known.write_bytes(os.urandom(120000))
+    
+    return str(new), str(known)
+
+def statuses(results) -> list[tuple[str, str, str]]:
+    return sorted((os.path.basename(r.path), r.user.id, r.status) for r in results)
+
+def test_deposit_many(client, files):
+    users = [User(payloads.uid(i), payloads.names[i]) for i in (0, 1)]
+    
+    # The same file twice is only sent once
+    results = client.rack.deposit_many([*files, files[0]], users)
+    
+    assert statuses(results).count(('notes.txt', payloads.uid(0), 'skipped')) == 1
+    assert {result.status for result in results} == {'sent', 'skipped'}
+
+def test_deposit_many_skip_existing(client, files):
+    users = [User(payloads.uid(i), payloads.names[i]) for i in (0, 1)]
+    results = client.rack.deposit_many(files, users, skip_existing = True, verify_hash = False)
+    
+    assert statuses(results) == [('devoir_0.pdf', payloads.uid(0), 'skipped'),
+                                 ('devoir_0.pdf', payloads.uid(1), 'sent'),
+                                 ('notes.txt', payloads.uid(0), 'sent'),
+                                 ('notes.txt', payloads.uid(1), 'sent')]
+
+def test_deposit_many_failed_hash_check(client, files):
+    users = [User(payloads.uid(0), payloads.names[0])]
+    
+    # The stub does not serve rack files, so the check fails
+    results = client.rack.deposit_many(files, users, skip_existing = True)
+    
+    assert statuses(results) == [('devoir_0.pdf', payloads.uid(0), 'failed'),
+                                 ('notes.txt', payloads.uid(0), 'sent')]
+    assert isinstance(results[0].error or results[1].error, ConnectionError)
+
+# EOF
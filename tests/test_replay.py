@@ -0,0 +1,59 @@
+'''
+Traffic capture and offline replay.
+'''
+
+import ent
+from ent import replay, transfer
+from ent.cache import Cache
+
+
+def capture(stub, path: str) -> dict:
+    with replay.Recorder(path) as recorder:
+        client = ent.ENT('user@example.org', 'password', root = stub.root,
+                         cache = Cache(policy = {}), capture = recorder)
+        
+        mails = client.mail.get_mails(limit = 20)
+        mails[0].fetch()
+        
+        with transfer.open_stream(client, 'files/5000') as stream:
+            file = stream.read()
+        
+        return dict(mails = [mail.id for mail in mails],
+                    content = mails[0].content_data,
+                    folders = [folder.path for folder in client.mail.get_folders()],
+                    file = file)
+
+def test_capture_is_redacted(stub, tmp_path):
+    capture(stub, tmp_path / 'session.jsonl')
+    text = (tmp_path / 'session.jsonl').read_text()
+    
+    assert 'password' in text # The field name
+    assert 'user%40example.org' not in text and '=token' not in text
+
+def test_replay(stub, tmp_path):
+    recorded = capture(stub, tmp_path / 'session.jsonl')
+    stub.stop()
+    
+    client = replay.client(tmp_path / 'session.jsonl', speed = None, cache = Cache(policy = {}))
+    
+    assert client.xsrf == replay.redacted
+    mails = client.mail.get_mails(limit = 20)
+    mails[0].fetch()
+    
+    assert [mail.id for mail in mails] == recorded['mails']
+    assert mails[0].content_data == recorded['content']
+    assert [folder.path for folder in client.mail.get_folders()] == recorded['folders']
+    
+    with transfer.open_stream(client, 'files/5000') as stream:
+        assert stream.read() == recorded['file']
+
+def test_unknown_requests(stub, tmp_path):
+    capture(stub, tmp_path / 'session.jsonl')
+    adapter = replay.ReplayAdapter(tmp_path / 'session.jsonl')
+    
+    client = replay.client(tmp_path / 'session.jsonl', speed = None)
+    response = client.session.get(adapter.root + 'rack/list')
+    
+    assert (response.status_code, response.reason) == (404, 'Not Recorded')
+
+# EOF
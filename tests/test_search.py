@@ -0,0 +1,52 @@
+'''
+Local full-text search over mails.
+'''
+
+import pytest
+
+from ent.search import MailIndex, tokenize
+
+import payloads
+
+
+@pytest.fixture
+def index(uncached):
+    mails = uncached.mail.get_mails(limit = 30)
+    uncached.mail.fetch_contents(mails[:3])
+    
+    index = MailIndex()
+    index.update(mails)
+    return index
+
+def test_tokenize():
+    assert tokenize('Élève n°12, COMPTE-rendu') == ['eleve', 'n', '12', 'compte', 'rendu']
+
+def test_search(index):
+    assert len(index) == 30
+    assert index.search('conseil 12')[0][0] == 12
+    
+    # Accents are folded, the names of all participants are indexed
+    hits = {id for id, _ in index.search('DUPONT eleve', limit = 30)}
+    assert hits and all(payloads.names[0] in dict(payloads.mail(id)['displayNames']).values()
+                        for id in hits)
+
+def test_bodies_only_when_fetched(index):
+    assert sorted(id for id, _ in index.search('veuillez')) == [0, 1, 2]
+
+def test_remove(index):
+    index.remove(12)
+    
+    assert 12 not in index and len(index) == 29
+    assert all(id != 12 for id, _ in index.search('12 conseil'))
+    assert index.search('nope') == []
+
+def test_save_and_load(index, tmp_path):
+    index.save(str(tmp_path / 'index'))
+    loaded = MailIndex.load(str(tmp_path / 'index'))
+    
+    assert loaded.search('compte rendu 7') == index.search('compte rendu 7')
+    
+    loaded.remove(7)
+    assert len(loaded) == 29
+
+# EOF
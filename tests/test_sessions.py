@@ -0,0 +1,53 @@
+'''
+Session persistence.
+'''
+
+import pytest
+
+import ent
+from ent.sessions import FileStore
+
+import payloads
+
+
+@pytest.fixture
+def logins(monkeypatch):
+    '''
+    Count the logins of all clients.
+    '''
+    
+    calls = []
+    login = ent.ENT.login
+    
+    monkeypatch.setattr(ent.ENT, 'login', lambda client: calls.append(client) or login(client))
+    return calls
+
+def test_login_restores_stored_session(stub, tmp_path, logins):
+    store = FileStore(str(tmp_path))
+    
+    ent.ENT('user@example.org', 'password', root = stub.root, store = store)
+    client = ent.ENT('user@example.org', 'password', root = stub.root, store = store)
+    
+    assert len(logins) == 1
+    assert client.session.cookies['XSRF-TOKEN'] == 'token'
+    assert client.account.user.name == payloads.names[0]
+
+def test_sessions_are_per_account(stub, tmp_path, logins):
+    store = FileStore(str(tmp_path))
+    
+    ent.ENT('user@example.org', 'password', root = stub.root, store = store)
+    ent.ENT('other@example.org', 'password', root = stub.root, store = store)
+    
+    assert len(logins) == 2 and len(list(tmp_path.iterdir())) == 2
+
+def test_rejected_session_logs_in(stub, tmp_path, logins):
+    store = FileStore(str(tmp_path))
+    store.save('user@example.org', [dict(name = 'session', value = 'expired')])
+    
+    client = ent.ENT('user@example.org', 'password', root = stub.root, store = store)
+    
+    assert len(logins) == 1
+    assert [cookie['name'] for cookie in store.load('user@example.org')] == ['XSRF-TOKEN']
+    assert client.session.cookies['XSRF-TOKEN'] == 'token'
+
+# EOF
@@ -0,0 +1,86 @@
+'''
+Retry policy and rate limiting.
+'''
+
+import time
+
+import pytest
+import requests
+
+import ent
+from ent.cache import Cache
+from ent.throttle import RetryPolicy, TokenBucket, retry_after
+
+
+def response(status: int, **headers) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers)
+    return response
+
+def test_retry_policy():
+    policy = RetryPolicy(attempts = 2, backoff = 1, max_delay = 10)
+    
+    assert 0 <= policy.wait('GET', 0, response(503)) <= 1
+    assert 0 <= policy.wait('GET', 1) <= 2
+    
+    assert policy.wait('GET', 2, response(503)) is None # Out of attempts
+    assert policy.wait('POST', 0, response(503)) is None # Not idempotent
+    assert policy.wait('GET', 0, response(404)) is None
+
+def test_retry_after():
+    policy = RetryPolicy(max_delay = 10)
+    
+    assert policy.wait('GET', 0, response(429, **{'Retry-After': '3'})) == 3
+    assert policy.wait('GET', 0, response(429, **{'Retry-After': '60'})) is None
+    
+    assert retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+    assert retry_after('soon') is None
+
+def test_token_bucket():
+    bucket = TokenBucket(rate = 100, burst = 5)
+    
+    start = time.perf_counter()
+    for _ in range(15): bucket.acquire()
+    
+    # The burst is free, the rest waits for the rate
+    assert .08 <= time.perf_counter() - start < .5
+
+def test_retries_transient_failures(stub, uncached):
+    stub.failures = 2
+    uncached.retry.backoff = .01
+    
+    assert uncached.get_json('flaky') == {'ok': True}
+
+def test_gives_up_after_retries(stub, uncached):
+    stub.failures = 10
+    uncached.retry.backoff = .01
+    
+    with pytest.raises(ConnectionError):
+        uncached.get('flaky')
+    
+    assert stub.failures == 10 - 1 - uncached.retry.attempts
+
+def test_rate_limited_client(stub):
+    client = ent.ENT('user@example.org', 'password', root = stub.root, cache = Cache(policy = {}),
+                     limiter = TokenBucket(rate = 50, burst = 1))
+    
+    start = time.perf_counter()
+    for _ in range(6): client.rack.get_rack()
+    
+    assert time.perf_counter() - start >= .08
+
+def test_async_retries(stub, run):
+    pytest.importorskip('aiohttp')
+    from ent.aio import AsyncENT
+    
+    stub.failures = 2
+    
+    async def main():
+        async with AsyncENT('user@example.org', 'password', root = stub.root,
+                            retry = RetryPolicy(backoff = .01)) as client:
+            return await client.get_json('flaky', cache = False)
+    
+    assert run(main()) == {'ok': True}
+
+# EOF
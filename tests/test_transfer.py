@@ -0,0 +1,115 @@
+'''
+Streamed and resumable downloads, streamed uploads.
+'''
+
+import os
+import email
+import hashlib
+from email import policy
+
+import pytest
+
+from ent import transfer
+
+size = 100_000
+
+
+@pytest.fixture
+def target(tmp_path):
+    return tmp_path / 'file.bin'
+
+def digest(stub) -> str:
+    return hashlib.sha256(stub.payload('file', size, stub.version)).hexdigest()
+
+def partial(target, data: bytes, tag: str = None) -> None:
+    target.with_name('file.bin.part').write_bytes(data)
+    if tag: target.with_name('file.bin.part.tag').write_text(tag)
+
+def test_download(stub, uncached, target):
+    assert transfer.download(uncached, f'files/{size}', str(target)) == digest(stub)
+    assert target.read_bytes() == stub.payload('file', size, 1)
+    assert list(target.parent.iterdir()) == [target]
+
+def test_resume(stub, uncached, target):
+    partial(target, stub.payload('file', size, 1)[:30_000], f'"file-{size}-1"')
+    
+    done = []
+    assert transfer.download(uncached, f'files/{size}', str(target),
+                             progress = lambda *args: done.append(args)) == digest(stub)
+    
+    # Only the missing bytes were sent
+    assert done[-1] == (size, size) and done[0][0] > 30_000
+
+def test_restart_when_file_changed(stub, uncached, target):
+    partial(target, stub.payload('file', size, 1)[:30_000], f'"file-{size}-1"')
+    stub.version = 2
+    
+    assert transfer.download(uncached, f'files/{size}', str(target)) == digest(stub)
+
+def test_restart_when_range_not_satisfiable(stub, uncached, target):
+    partial(target, stub.payload('file', size, 1) + b'extra', f'"file-{size}-1"')
+    assert transfer.download(uncached, f'files/{size}', str(target)) == digest(stub)
+
+def test_restart_without_validator(stub, uncached, target):
+    partial(target, stub.payload('file', size, 1)[:30_000])
+    assert transfer.download(uncached, f'files/{size}', str(target)) == digest(stub)
+
+def test_no_resume(stub, uncached, target):
+    partial(target, b'x' * 500)
+    assert transfer.download(uncached, f'files/{size}', str(target), resume = False) == digest(stub)
+
+def test_open_stream(stub, uncached):
+    with transfer.open_stream(uncached, f'files/{size}') as stream:
+        assert stream.read() == stub.payload('file', size, 1)
+
+def test_async_download(stub, target, run):
+    pytest.importorskip('aiohttp')
+    from ent import aio
+    
+    partial(target, stub.payload('file', size, 1)[:30_000], f'"file-{size}-1"')
+    
+    async def main():
+        async with aio.AsyncENT('user@example.org', 'password', root = stub.root) as client:
+            done = []
+            attachment = aio.Attachment(client, 1, f'files/{size}', 'file.bin', None, size)
+            
+            sha = await attachment.download(str(target.parent), progress = lambda *args: done.append(args))
+            
+            # Absolute url, like rack files
+            async with aio.RacKFile(stub.root + f'files/{size}', client = client).open() as stream:
+                return sha, done, await stream.read()
+    
+    sha, done, data = run(main())
+    
+    assert sha == digest(stub) and target.read_bytes() == data == stub.payload('file', size, 1)
+    assert done[-1] == (size, size) and done[0][0] > 30_000
+
+def test_multipart_framing(tmp_path):
+    path = tmp_path / 'devoir "final".pdf'
+    path.write_bytes(content := b'%PDF\r\n--\x00\xff' + os.urandom(600_000))
+    
+    sent = []
+    body = transfer.Multipart(str(path), content_type = 'application/pdf', fields = {'users': 'a,b'},
+                              progress = lambda *args: sent.append(args))
+    raw = b''.join(body)
+    
+    assert len(raw) == len(body) and sent[-1] == (len(content), len(content))
+    
+    head = f'Content-Type: {body.content_type}\r\n\r\n'.encode()
+    file, users = email.message_from_bytes(head + raw, policy = policy.HTTP).iter_parts()
+    
+    assert file.get_filename() == 'devoir %22final%22.pdf' and file.get_content_type() == 'application/pdf'
+    assert file.get_payload(decode = True) == content
+    assert users.get_param('name', header = 'content-disposition') == 'users'
+    assert users.get_payload() == 'a,b'
+
+def test_deposit_progress(client, tmp_path):
+    path = tmp_path / 'notes.txt'
+    path.write_bytes(os.urandom(300_000))
+    
+    sent = []
+    client.rack.deposit([client.account.user], str(path), progress = lambda *args: sent.append(args))
+    
+    assert sent[-1] == (300_000, 300_000)
+
+# EOF
@@ -0,0 +1,69 @@
+'''
+Userbook resolution.
+'''
+
+import pytest
+
+from ent.apps.base import User
+
+
+@pytest.fixture
+def fetched(client, monkeypatch):
+    '''
+    Record the userbook ids requested by the client.
+    '''
+    
+    requested = []
+    get = client.get
+    
+    def spy(path, *args, **kwargs):
+        if path.startswith('userbook'): requested.append(path.split('id=')[1])
+        return get(path, *args, **kwargs)
+    
+    monkeypatch.setattr(client, 'get', spy)
+    return requested
+
+def test_fetch_many(client, fetched):
+    users = [User('user-1', 'A'), User('user-1', 'A bis'), User('user-2', 'B'), User('ghost', 'C')]
+    
+    assert list(client.userbook.fetch_many(users)) == ['ghost']
+    assert sorted(fetched) == ['ghost', 'user-1', 'user-2']
+    
+    assert users[1].userbook.motto == 'Carpe diem'
+    assert users[0].userbook is users[1].userbook
+    assert users[3].userbook is None
+
+def test_cached_for_ttl(client, fetched):
+    client.userbook.fetch(User('user-1', 'A'))
+    
+    assert client.userbook.fetch(User('user-1', 'A')).userbook.motto == 'Carpe diem'
+    assert client.userbook.fetch_many([User('user-1', 'A')]) == {}
+    assert fetched == ['user-1']
+    
+    client.userbook.ttl = 0
+    client.userbook.fetch(User('user-1', 'A'))
+    assert fetched == ['user-1'] * 2
+
+def test_bounded_cache(client, fetched):
+    client.userbook.max_entries = 2
+    
+    for id in ('user-1', 'user-2'): client.userbook.fetch(User(id))
+    client.userbook.fetch(User('user-1'))
+    client.userbook.fetch(User('user-3'))
+    
+    # user-2 was the least recently used
+    assert list(client.userbook.books) == ['user-1', 'user-3']
+    assert fetched == ['user-1', 'user-2', 'user-3']
+
+def test_expired_entries_are_dropped(client):
+    client.userbook.fetch(User('user-1'))
+    client.userbook.fetch(User('user-2'))
+    
+    client.userbook.ttl = 0
+    assert client.userbook.cached('user-2') is None
+    assert list(client.userbook.books) == ['user-1']
+    
+    client.userbook.fetch(User('user-3'))
+    assert len(client.userbook.books) == 0
+
+# EOF
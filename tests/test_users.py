@@ -0,0 +1,45 @@
+'''
+Per-client identity map of users.
+'''
+
+import gc
+
+import payloads
+
+
+def test_one_instance_per_id(client):
+    mails = client.mail.get_mails(limit = 20)
+    racks = client.rack.get_rack()
+    
+    # All of them are the account user
+    assert mails[0].user.sender is mails[7].user.to[0] is mails[14].user.to[0]
+    assert racks[0].sender is mails[0].user.sender
+    assert racks[0].receiver is client.account.user
+    assert mails[0].user.sender.client is client
+
+def test_fields_are_merged(client):
+    user = client.users.get('user-1', 'A', type = 'Student')
+    
+    assert client.users.get('user-1', None, type = None) is user
+    assert (user.name, user.type) == ('A', 'Student')
+    
+    client.users.get('user-1', 'A bis')
+    assert user.name == 'A bis'
+
+def test_unused_users_are_dropped(client):
+    client.users.get('user-1', 'A')
+    gc.collect()
+    
+    assert len(client.users) == 0
+    assert client.users.get(None, 'A') is not client.users.get(None, 'A')
+
+def test_userbook_is_shared(client):
+    user = client.users.get('user-1', 'A')
+    
+    assert client.users.get('user-1').book.motto == 'Carpe diem'
+    assert user.userbook is not None
+
+def test_clients_have_their_own_users(stub, client, uncached):
+    assert client.users.get(payloads.uid(1)) is not uncached.users.get(payloads.uid(1))
+
+# EOF